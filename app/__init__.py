@@ -24,12 +24,31 @@ def create_app(config_class=Config):
         app.logger.error(f"Erreur lors de la création du dossier d'uploads: {e}")
     # ✅ --- Fin de la configuration ---
 
+    # Cache disque des tuiles vectorielles de la carte
+    app.config.setdefault('TILE_CACHE_FOLDER', os.path.join(app.instance_path, 'tiles'))
+
     # Connect the database and migration tool
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # Instrumentation SQL / requêtes (métriques Prometheus, requêtes lentes, Server-Timing)
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # Invalidation des caches entre workers (LISTEN/NOTIFY sur le canal gef_changes)
+    from .notify import init_notify
+    init_notify(app)
+
     # Register your routes
     from .routes import main_bp
     app.register_blueprint(main_bp)
 
+    # Commandes CLI "flask gef ..."
+    from .cli import gef_cli
+    app.cli.add_command(gef_cli)
+
+    # Préchargement des données de référence (wilayas, communes, équipements, agréments)
+    from .refdata import warm_reference_data
+    warm_reference_data(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,290 @@
+# app/async_api.py
+import asyncio
+import importlib.util
+import json
+import logging
+import re
+import time
+from urllib.parse import parse_qs
+
+from sqlalchemy.dialects.postgresql import psycopg as psycopg_dialect
+from sqlalchemy.engine import make_url
+from werkzeug.http import http_date, quote_etag
+from werkzeug.sansio.http import is_resource_modified
+
+from .details import GEF_DETAILS_SQL, GEF_UPDATED_AT_SQL, gef_etag
+from .notify import NOTIFY_CHANNEL, MAX_RECONNECT_DELAY
+from .refdata import REFERENCE_STATEMENTS, build_reference_data
+from .search import search_gefs_statement, search_gefs_page
+
+# API en lecture seule servie par asyncio, à côté de l'application Flask
+# (voir asgi.py) : /api/gefs, /api/gef/<numero> et /api/communes/<wilaya_code>.
+# Une requête en attente de Postgres ne bloque pas de worker : un processus
+# sert des milliers de lectures simultanées avec un pool psycopg asynchrone
+# distinct du pool SQLAlchemy. Les requêtes SQL sont celles des vues Flask
+# (mêmes modèles, mêmes instructions compilées), les réponses sont identiques.
+# Toute autre URL ou méthode est transmise à l'application Flask.
+
+logger = logging.getLogger(__name__)
+
+_DIALECT = psycopg_dialect.dialect()
+
+ROUTES = [
+    (re.compile(r'^/api/gefs$'), 'gefs'),
+    (re.compile(r'^/api/gef/(\d+)$'), 'gef'),
+    (re.compile(r'^/api/communes/(\d+)$'), 'communes'),
+]
+
+
+def compile_statement(stmt, **params):
+    """Instruction SQLAlchemy -> (SQL au format psycopg, paramètres)."""
+    compiled = stmt.compile(dialect=_DIALECT)
+    return str(compiled), {**compiled.params, **params}
+
+
+GEF_DETAILS_QUERY, _ = compile_statement(GEF_DETAILS_SQL)
+GEF_UPDATED_AT_QUERY, _ = compile_statement(GEF_UPDATED_AT_SQL)
+REFERENCE_QUERIES = {name: compile_statement(stmt) for name, stmt in REFERENCE_STATEMENTS.items()}
+
+
+class Request:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = parse_qs(scope.get('query_string', b'').decode('utf-8', 'replace'))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+
+    def arg(self, name, type=None):
+        value = self.args.get(name, [None])[0]
+        if value is not None and type is not None:
+            try:
+                return type(value)
+            except ValueError:
+                return None
+        return value
+
+    def is_modified(self, etag=None, last_modified=None):
+        return is_resource_modified(
+            http_if_none_match=self.headers.get('if-none-match'),
+            http_if_modified_since=self.headers.get('if-modified-since'),
+            etag=etag, last_modified=last_modified,
+        )
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=None):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.status = status
+        self.headers = {'Content-Type': content_type, **(headers or {})}
+
+    async def send(self, send, head=False):
+        headers = {**self.headers, 'Content-Length': str(len(self.body))}
+        if self.status == 304:
+            headers.pop('Content-Type')
+            headers.pop('Content-Length')
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()],
+        })
+        body = b'' if head or self.status == 304 else self.body
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def json_response(data, status=200, headers=None):
+    return Response(json.dumps(data), status=status, headers=headers)
+
+
+def conditional(request, response, etag, last_modified=None):
+    response.headers['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if not request.is_modified(etag, last_modified):
+        response.status = 304
+    return response
+
+
+class AsyncReadAPI:
+    """Application ASGI de l'API en lecture, sur psycopg (AsyncConnectionPool)."""
+
+    def __init__(self, config, fallback=None):
+        from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+        self.config = config
+        self.fallback = fallback
+        self.pool_timeout_error = PoolTimeout
+        self.conninfo = make_url(config['SQLALCHEMY_DATABASE_URI']).set(drivername='postgresql') \
+            .render_as_string(hide_password=False)
+        # Mêmes réglages de session que le pool synchrone, transactions en lecture seule
+        options = config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('connect_args', {}).get('options', '')
+        self.connect_kwargs = {
+            'autocommit': True,
+            'options': f"{options} -c default_transaction_read_only=on".strip(),
+        }
+        self.pool = AsyncConnectionPool(
+            self.conninfo,
+            min_size=config.get('ASYNC_API_POOL_MIN', 1),
+            max_size=config.get('ASYNC_API_POOL_MAX', 20),
+            timeout=config.get('DB_POOL_TIMEOUT', 30),
+            kwargs=self.connect_kwargs,
+            open=False,
+        )
+        self._refdata = None
+        self._refdata_generation = 0
+        self._refdata_lock = None
+        self._listener = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, name in ROUTES:
+                match = pattern.match(scope['path'])
+                if match:
+                    request = Request(scope)
+                    response = await self.dispatch(name, request, *match.groups())
+                    return await response.send(send, head=request.method == 'HEAD')
+        if self.fallback is None:
+            return await json_response({"error": "Not Found"}, 404).send(send)
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        self._refdata_lock = asyncio.Lock()
+        await self.pool.open(wait=True)
+        if self.config.get('CACHE_NOTIFY_ENABLED', True):
+            self._listener = asyncio.create_task(self.listen())
+
+    async def shutdown(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self.pool.close()
+
+    async def dispatch(self, name, request, *args):
+        try:
+            if name == 'gefs':
+                return await self.get_gefs(request)
+            elif name == 'gef':
+                return await self.get_gef_details(request, int(args[0]))
+            return await self.get_communes_by_wilaya(request, int(args[0]))
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+        except self.pool_timeout_error:
+            # Toutes les connexions du pool sont occupées : le client réessaiera
+            return json_response({"error": "Service surchargé, réessayez"}, 503, {'Retry-After': '1'})
+        except Exception as e:
+            logger.exception("Erreur API asynchrone pour %s", request.path)
+            return json_response({"error": str(e)}, 500)
+
+    async def fetch(self, query, params=None):
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchall()
+
+    # --- Points d'accès (mêmes réponses que les vues Flask) ---
+
+    async def get_gefs(self, request):
+        stmt, limit = search_gefs_statement(
+            q=request.arg('q'), after=request.arg('after'), limit=request.arg('limit', type=int)
+        )
+        rows = await self.fetch(*compile_statement(stmt))
+        gefs, next_cursor = search_gefs_page(rows, limit)
+        return json_response({"gefs": gefs, "next": next_cursor})
+
+    async def get_gef_details(self, request, gef_numero):
+        params = {'numero': gef_numero}
+        # GET conditionnel : la lecture de updated_at suffit pour répondre 304
+        if 'if-none-match' in request.headers or 'if-modified-since' in request.headers:
+            rows = await self.fetch(GEF_UPDATED_AT_QUERY, params)
+            if rows and not request.is_modified(gef_etag(gef_numero, rows[0][0]), rows[0][0]):
+                return self._gef_response(request, gef_numero, rows[0][0])
+
+        rows = await self.fetch(GEF_DETAILS_QUERY, params)
+        if not rows:
+            return json_response({"error": f"GEF N°{gef_numero} introuvable"}, 404)
+        document, updated_at = rows[0]
+        return self._gef_response(request, gef_numero, updated_at, document)
+
+    def _gef_response(self, request, gef_numero, updated_at, document=''):
+        response = Response(document, headers={'Cache-Control': 'no-cache'})
+        return conditional(request, response, gef_etag(gef_numero, updated_at), updated_at)
+
+    async def get_communes_by_wilaya(self, request, wilaya_code):
+        refdata = await self.get_reference_data()
+        communes_list = [{'code': c.code_commu, 'nom': c.nom_commun} for c in refdata.communes_for(wilaya_code)]
+        max_age = self.config.get('REFDATA_HTTP_MAX_AGE', 86400)
+        response = json_response(communes_list, headers={'Cache-Control': f'public, max-age={max_age}'})
+        return conditional(request, response, f"{refdata.version}-{wilaya_code}")
+
+    # --- Données de référence ---
+    # Même instantané (et même version / ETag) que refdata.py ; les quatre
+    # tables sont lues en parallèle sur des connexions distinctes du pool.
+
+    async def get_reference_data(self):
+        entry = self._refdata
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        async with self._refdata_lock:
+            entry = self._refdata
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            generation = self._refdata_generation
+            results = await asyncio.gather(*(self.fetch(*query) for query in REFERENCE_QUERIES.values()))
+            refdata = build_reference_data(dict(zip(REFERENCE_QUERIES, results)))
+            if generation == self._refdata_generation:
+                self._refdata = (time.monotonic() + self.config.get('REFDATA_TTL', 3600), refdata)
+            return refdata
+
+    def invalidate_reference_data(self):
+        self._refdata_generation += 1
+        self._refdata = None
+
+    async def listen(self):
+        # Écoute de gef_changes (voir notify.py) : seules les données de
+        # référence sont en cache ici, les fiches GEF sont lues à chaque appel.
+        import psycopg
+
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, **self.connect_kwargs) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # Notifications éventuellement perdues pendant la déconnexion
+                    self.invalidate_reference_data()
+                    delay = 1
+                    async for notification in conn.notifies():
+                        if notification.payload.startswith('ref:'):
+                            self.invalidate_reference_data()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Écoute de %s interrompue (%s), reconnexion dans %ss", NOTIFY_CHANNEL, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def create_async_api(config, fallback=None):
+    """Application ASGI de l'API en lecture ; `fallback` (ASGI) reçoit les autres requêtes."""
+    # Vérification sans import : le paquet n'est chargé qu'à l'ouverture du pool
+    if importlib.util.find_spec('psycopg_pool') is None:
+        raise RuntimeError("L'API asynchrone nécessite le paquet 'psycopg-pool' (pip install psycopg-pool).")
+    return AsyncReadAPI(config, fallback)
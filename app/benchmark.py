@@ -0,0 +1,233 @@
+# app/benchmark.py
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy import event
+
+from .models import db, Gef, Wilaya, Commune, Personnel, Agrement, Telephone, GefEquipement, GefAgrement
+
+# Benchmarks des pages et API principales via le client de test Flask :
+# latence (min / moyenne / p50 / p95 / p99 / max) et nombre de requêtes SQL
+# par appel. Les résultats sont écrits en JSON pour comparer les exécutions.
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Compte les requêtes SQL émises par le moteur pendant un appel."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def _sample_parameters(rng):
+    """Valeurs réelles tirées de la base, pour des requêtes représentatives."""
+    numeros = [n for (n,) in db.session.query(Gef.numero).order_by(sa.func.random()).limit(200)]
+    if not numeros:
+        raise RuntimeError("Aucun GEF en base : lancez d'abord 'flask gef seed'.")
+    wilayas = [c for (c,) in db.session.query(Wilaya.code)]
+    communes = [c for (c,) in db.session.query(Commune.code_commu).order_by(sa.func.random()).limit(100)]
+    agrements = [i for (i,) in db.session.query(Agrement.id)]
+    noms = [n for (n,) in db.session.query(Personnel.nom).distinct().limit(100)]
+    gef_noms = [n for (n,) in db.session.query(Gef.n_p).filter(Gef.numero.in_(numeros[:50]))]
+    db.session.rollback()
+    return {
+        'numeros': numeros, 'wilayas': wilayas or [None], 'communes': communes or [None],
+        'agrements': agrements or [None], 'personnel_noms': noms or ['a'], 'gef_noms': gef_noms or ['a'],
+    }
+
+
+def _update_form(numero):
+    """Formulaire d'édition identique aux données actuelles (mise à jour « à vide »)."""
+    gef = db.session.query(Gef).filter_by(numero=numero).one()
+    personnels = db.session.query(Personnel).filter_by(n_gef=numero).all()
+    telephones = db.session.query(Telephone).filter_by(n_gef=numero).all()
+    equipements = db.session.query(GefEquipement).filter_by(n_gef=numero).all()
+    agrements = db.session.query(GefAgrement).filter_by(gef_n=numero).all()
+    form = {
+        'n_p': gef.n_p, 'email': gef.email or '', 'adresse': gef.adresse or '',
+        'commune_c': str(gef.commune_c or ''), 'statut_bureau': gef.statut_bureau or '',
+        'situation': gef.situation or '', 'observations': gef.observations or '',
+        'nim': str(gef.nim or ''), 'nif': str(gef.nif or ''),
+        'date_obt': gef.date_obt.isoformat() if gef.date_obt else '',
+        'date_naiss': gef.date_naiss.isoformat() if gef.date_naiss else '',
+        'personnel_id': [str(p.id_personnel) for p in personnels],
+        'personnel_nom': [p.nom for p in personnels],
+        'personnel_prenom': [p.prenom for p in personnels],
+        'personnel_profile': [p.profile or '' for p in personnels],
+        'telephone_id': [str(t.id) for t in telephones],
+        'telephone_type': [t.type_tel or '' for t in telephones],
+        'telephone_numero': [t.num for t in telephones],
+        'equipement_id': [str(e.id_type) for e in equipements],
+        'equipement_quantite': [str(e.quantite) for e in equipements],
+        'agrement_ids': [str(a.agrement_id) for a in agrements],
+        # Doublon éventuel déjà présent en base : l'enregistrement ne doit pas être refusé
+        'confirm_duplicates': '1',
+    }
+    db.session.rollback()
+    return form
+
+
+def build_scenarios(params, rng):
+    """Scénarios : nom -> préparation(client) renvoyant l'appel à mesurer.
+
+    La préparation (tirage des paramètres, lecture de l'ETag ou du formulaire
+    courant) n'est pas chronométrée.
+    """
+    pick = rng.choice
+
+    def get(url):
+        return lambda client: (lambda: client.get(url()))
+
+    def filter_url(**args):
+        query = '&'.join(f"{key}={value}" for key, value in args.items() if value is not None)
+        return f"/gef/filter?{query}"
+
+    def update(client):
+        numero = pick(params['numeros'])
+        form = _update_form(numero)
+        return lambda: client.post(f"/gef/update/{numero}", data=form)
+
+    def duplicates(client):
+        # Vérification des doublons seule (mesurée à part de update_gef, qui la saute)
+        numero = pick(params['numeros'])
+        form = {**_update_form(numero), 'exclude': str(numero)}
+        return lambda: client.post('/api/gefs/duplicates', data=form)
+
+    def details_conditional(client):
+        url = f"/api/gef/{pick(params['numeros'])}"
+        etag = client.get(url).headers.get('ETag')
+        return lambda: client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+    return {
+        'dashboard': get(lambda: '/'),
+        'filter_gefs.all': get(lambda: filter_url()),
+        'filter_gefs.wilaya': get(lambda: filter_url(wilaya=pick(params['wilayas']))),
+        'filter_gefs.commune_situation': get(lambda: filter_url(commune=pick(params['communes']), situation='actif')),
+        'filter_gefs.agrement_wilaya': get(
+            lambda: filter_url(wilaya=pick(params['wilayas']), agrements=pick(params['agrements']))),
+        'filter_gefs.personnel_nom': get(lambda: filter_url(personnel_nom=pick(params['personnel_noms'])[:4])),
+        'filter_gefs.q': get(lambda: filter_url(q=pick(params['gef_noms']).split()[0])),
+        'filter_gefs.deep_page': get(lambda: filter_url(sort='-nom', page=rng.randint(5, 40))),
+        'api_gefs.prefix': get(lambda: f"/api/gefs?q={pick(params['gef_noms'])[:3]}"),
+        'api_gefs.numero': get(lambda: f"/api/gefs?q={str(pick(params['numeros']))[:2]}"),
+        'api_gef_details': get(lambda: f"/api/gef/{pick(params['numeros'])}"),
+        'api_gef_details.conditional': details_conditional,
+        'edit_gef': get(lambda: f"/gef/edit/{pick(params['numeros'])}"),
+        'update_gef': update,
+        'api_gefs_duplicates': duplicates,
+    }
+
+
+def run_benchmarks(iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, only=None, seed=1, echo=print):
+    """Exécute les scénarios et retourne un dict de résultats sérialisable en JSON."""
+    rng = random.Random(seed)
+    app = current_app._get_current_object()
+    engine = db.engine
+    params = _sample_parameters(rng)
+    scenarios = build_scenarios(params, rng)
+    if only:
+        scenarios = {name: prepare for name, prepare in scenarios.items() if any(name.startswith(o) for o in only)}
+
+    results = {}
+    client = app.test_client()
+    for name, prepare in scenarios.items():
+        for _ in range(warmup):
+            prepare(client)().get_data()
+        latencies, queries, statuses = [], [], {}
+        for _ in range(iterations):
+            call = prepare(client)
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                response = call()
+                # Les réponses en flux ne sont consommées qu'ici
+                response.get_data()
+                elapsed = time.perf_counter() - start
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        results[name] = {
+            'iterations': iterations,
+            'latency_ms': {
+                'min': round(min(latencies), 3),
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(_percentile(latencies, 0.50), 3),
+                'p95': round(_percentile(latencies, 0.95), 3),
+                'p99': round(_percentile(latencies, 0.99), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+            'status': statuses,
+        }
+        echo(f"{name:32} p50 {results[name]['latency_ms']['p50']:9.2f} ms  "
+             f"p95 {results[name]['latency_ms']['p95']:9.2f} ms  requêtes {results[name]['queries']['mean']:6.1f}")
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlalchemy': sa.__version__,
+            'database': engine.dialect.name,
+            'server_version': '.'.join(str(v) for v in engine.dialect.server_version_info or ()),
+        },
+        'dataset': dataset_summary(),
+        'settings': {'iterations': iterations, 'warmup': warmup, 'seed': seed},
+        'scenarios': results,
+    }
+
+
+def dataset_summary():
+    counts = db.session.execute(sa.text("""
+        SELECT (SELECT count(*) FROM wilaya) AS wilayas, (SELECT count(*) FROM commune) AS communes,
+               (SELECT count(*) FROM gef) AS gefs, (SELECT count(*) FROM personnel) AS personnel,
+               (SELECT count(*) FROM telephones) AS telephones
+    """)).mappings().one()
+    db.session.rollback()
+    return dict(counts)
+
+
+def write_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def compare_results(previous_path, results, echo=print):
+    """Affiche l'évolution du p50/p95 et du nombre de requêtes par rapport à une exécution précédente."""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f).get('scenarios', {})
+    for name, current in results['scenarios'].items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        deltas = []
+        for key in ('p50', 'p95'):
+            old, new = before['latency_ms'][key], current['latency_ms'][key]
+            deltas.append(f"{key} {old:.2f} -> {new:.2f} ms ({(new - old) / old * 100 if old else 0:+.0f} %)")
+        deltas.append(f"requêtes {before['queries']['mean']} -> {current['queries']['mean']}")
+        echo(f"{name:32} " + '  '.join(deltas))
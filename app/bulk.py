@@ -0,0 +1,231 @@
+# app/bulk.py
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .coverage import commune_codes, refresh_coverage, invalidate_coverage
+from .details import invalidate_gef_details
+from .filters import filter_conditions
+from .models import db, Gef
+from .photos import delete_photo
+from .spatial import invalidate_tiles
+from .stats import invalidate_dashboard_counts
+
+# Opérations groupées sur un ensemble de GEFs (critères de /gef/filter ou liste
+# de numéros). Les GEFs ciblés sont lus une fois, puis chaque opération tient
+# en quelques instructions ensemblistes (= ANY(:numeros)) dans une transaction.
+
+SITUATIONS = ('actif', 'mise en dispo', 'suspendu')
+STATUTS_BUREAU = ('Prop', 'Loc')
+
+OPERATIONS = {
+    'situation': "Changer la situation",
+    'statut_bureau': "Changer le statut du bureau",
+    'commune': "Changer la commune",
+    'add_agrement': "Ajouter un agrément",
+    'remove_agrement': "Retirer un agrément",
+    'add_equipement': "Ajouter un équipement",
+    'remove_equipement': "Retirer un équipement",
+    'delete': "Supprimer les GEFs",
+}
+
+# Au-delà, le cache des fiches est vidé en entier plutôt que GEF par GEF
+PER_GEF_INVALIDATION_MAX = 200
+
+TARGETS_SQL = text("""
+    SELECT numero, commune_c, photo_filename, ST_X(geom) AS lon, ST_Y(geom) AS lat
+    FROM gef WHERE numero = ANY(:numeros)
+""")
+
+UPDATE_GEF_SQL = """
+    UPDATE gef SET {column} = :value, updated_at = now()
+    WHERE numero = ANY(:numeros) AND {column} IS DISTINCT FROM :value
+    RETURNING numero
+"""
+
+ADD_AGREMENT_SQL = text("""
+    INSERT INTO gef_agrements (gef_n, agrement_id, date_obtention)
+    SELECT n, :value, :date_obtention FROM unnest(:numeros) AS n
+    ON CONFLICT (gef_n, agrement_id) DO NOTHING
+    RETURNING gef_n
+""")
+
+REMOVE_AGREMENT_SQL = text("""
+    DELETE FROM gef_agrements WHERE gef_n = ANY(:numeros) AND agrement_id = :value
+    RETURNING gef_n
+""")
+
+ADD_EQUIPEMENT_SQL = text("""
+    INSERT INTO gef_equipement (n_gef, id_type, quantite)
+    SELECT n, :value, :quantite FROM unnest(:numeros) AS n
+    ON CONFLICT (n_gef, id_type) DO NOTHING
+    RETURNING n_gef
+""")
+
+REMOVE_EQUIPEMENT_SQL = text("""
+    DELETE FROM gef_equipement WHERE n_gef = ANY(:numeros) AND id_type = :value
+    RETURNING n_gef
+""")
+
+# Les GEFs dont un enfant a changé : updated_at sert d'ETag à /api/gef/<numero>
+TOUCH_GEF_SQL = text("UPDATE gef SET updated_at = now() WHERE numero = ANY(:numeros)")
+
+DELETE_CHILDREN_SQL = [
+    ('personnel', text("DELETE FROM personnel WHERE n_gef = ANY(:numeros)")),
+    ('telephones', text("DELETE FROM telephones WHERE n_gef = ANY(:numeros)")),
+    ('gef_equipement', text("DELETE FROM gef_equipement WHERE n_gef = ANY(:numeros)")),
+    ('gef_agrements', text("DELETE FROM gef_agrements WHERE gef_n = ANY(:numeros)")),
+]
+DELETE_GEF_SQL = text("DELETE FROM gef WHERE numero = ANY(:numeros)")
+
+REFERENCE_EXISTS_SQL = {
+    'commune': text("SELECT 1 FROM commune WHERE code_commu = :value"),
+    'agrement': text("SELECT 1 FROM agrements WHERE id = :value"),
+    'equipement': text("SELECT 1 FROM type_equipement WHERE id_type = :value"),
+}
+
+
+def _numeros_param(stmt):
+    return stmt.bindparams(bindparam('numeros', type_=ARRAY(Integer)))
+
+
+def select_numeros(numeros=None, criteria=None):
+    """Numéros ciblés : liste explicite (numéros existants) ou critères de /gef/filter.
+
+    Sans liste ni critère, rien n'est ciblé : une opération ne porte jamais sur
+    tout le registre par omission.
+    """
+    if numeros:
+        stmt = select(Gef.numero).where(Gef.numero.in_(numeros))
+    elif criteria and any(criteria.values()):
+        stmt = select(Gef.numero).where(*filter_conditions(criteria))
+    else:
+        return []
+    return list(db.session.execute(stmt.order_by(Gef.numero)).scalars())
+
+
+def _int_value(value, label):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} : identifiant entier attendu")
+
+
+def _check_reference(kind, value):
+    if db.session.execute(REFERENCE_EXISTS_SQL[kind], {'value': value}).first() is None:
+        raise ValueError(f"{kind.capitalize()} inconnu(e) : {value}")
+
+
+def _returned(result):
+    return sorted({row[0] for row in result})
+
+
+def validate_operation(operation, value=None, options=None):
+    """Vérifie l'opération et sa valeur (y compris l'existence de la référence) ; retourne la valeur normalisée."""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Opération inconnue : {operation}")
+    options = options or {}
+    if operation in ('situation', 'statut_bureau'):
+        allowed = SITUATIONS if operation == 'situation' else STATUTS_BUREAU
+        if value not in allowed:
+            raise ValueError(f"Valeur invalide : {value} (attendu : {', '.join(allowed)})")
+    elif operation == 'commune':
+        value = _int_value(value, "Commune")
+        _check_reference('commune', value)
+    elif operation in ('add_agrement', 'remove_agrement'):
+        value = _int_value(value, "Agrément")
+        _check_reference('agrement', value)
+    elif operation in ('add_equipement', 'remove_equipement'):
+        value = _int_value(value, "Équipement")
+        _check_reference('equipement', value)
+        if operation == 'add_equipement':
+            _int_value(options.get('quantite') or 1, "Quantité")
+    return value
+
+
+def run_bulk_operation(operation, numeros, value=None, options=None, dry_run=False):
+    """Applique `operation` aux GEFs `numeros`, en une transaction.
+
+    La valeur est validée avant tout, y compris en simulation (`dry_run`).
+    Retourne un résumé : {'operation', 'matched', 'affected': {table: lignes}, 'dry_run'}.
+    """
+    options = options or {}
+    value = validate_operation(operation, value, options)
+    summary = {'operation': operation, 'matched': len(numeros), 'affected': {}, 'dry_run': dry_run}
+    if not numeros or dry_run:
+        return summary
+
+    params = {'numeros': list(numeros)}
+    try:
+        targets = db.session.execute(_numeros_param(TARGETS_SQL), params).all()
+        communes = commune_codes(*(t.commune_c for t in targets))
+        changed = []
+
+        if operation in ('situation', 'statut_bureau'):
+            stmt = _numeros_param(text(UPDATE_GEF_SQL.format(column=operation)))
+            changed = _returned(db.session.execute(stmt, {**params, 'value': value}))
+            summary['affected']['gef'] = len(changed)
+
+        elif operation == 'commune':
+            stmt = _numeros_param(text(UPDATE_GEF_SQL.format(column='commune_c')))
+            changed = _returned(db.session.execute(stmt, {**params, 'value': value}))
+            communes = commune_codes(*communes, value)
+            summary['affected']['gef'] = len(changed)
+
+        elif operation in ('add_agrement', 'remove_agrement'):
+            if operation == 'add_agrement':
+                stmt = ADD_AGREMENT_SQL
+                params['date_obtention'] = options.get('date_obtention') or None
+            else:
+                stmt = REMOVE_AGREMENT_SQL
+            changed = _returned(db.session.execute(_numeros_param(stmt), {**params, 'value': value}))
+            summary['affected']['gef_agrements'] = len(changed)
+
+        elif operation in ('add_equipement', 'remove_equipement'):
+            if operation == 'add_equipement':
+                stmt = ADD_EQUIPEMENT_SQL
+                params['quantite'] = max(1, _int_value(options.get('quantite') or 1, "Quantité"))
+            else:
+                stmt = REMOVE_EQUIPEMENT_SQL
+            changed = _returned(db.session.execute(_numeros_param(stmt), {**params, 'value': value}))
+            summary['affected']['gef_equipement'] = len(changed)
+
+        else:  # delete
+            for table, stmt in DELETE_CHILDREN_SQL:
+                summary['affected'][table] = db.session.execute(_numeros_param(stmt), params).rowcount
+            summary['affected']['gef'] = db.session.execute(_numeros_param(DELETE_GEF_SQL), params).rowcount
+            changed = list(params['numeros'])
+
+        if operation.startswith(('add_', 'remove_')) and changed:
+            db.session.execute(_numeros_param(TOUCH_GEF_SQL), {'numeros': changed})
+        if changed:
+            refresh_coverage(communes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    summary['changed'] = len(changed)
+    if changed:
+        _after_commit(operation, changed, targets)
+    return summary
+
+
+def _after_commit(operation, changed, targets):
+    invalidate_coverage()
+    invalidate_dashboard_counts()
+    if len(changed) > PER_GEF_INVALIDATION_MAX:
+        invalidate_gef_details()
+    else:
+        for numero in changed:
+            invalidate_gef_details(numero)
+
+    # Les tuiles portent le nom et la situation des GEFs
+    if operation in ('situation', 'delete'):
+        changed_set = set(changed)
+        invalidate_tiles(*((t.lon, t.lat) for t in targets if t.numero in changed_set and t.lon is not None))
+
+    if operation == 'delete':
+        # Fichiers photo supprimés une fois la transaction validée (sauf s'ils sont partagés)
+        for photo in {t.photo_filename for t in targets if t.photo_filename}:
+            delete_photo(photo)
@@ -0,0 +1,41 @@
+# app/cache.py
+import threading
+import time
+
+
+class TTLCache:
+    """Cache mémoire thread-safe dont les entrées expirent après `ttl` secondes.
+
+    Un compteur de génération empêche qu'une valeur calculée avant une
+    invalidation soit réinsérée après celle-ci.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._data = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation:
+                expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+                self._data[key] = (expires_at, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
@@ -0,0 +1,160 @@
+# app/children.py
+from sqlalchemy import delete, insert, select, update
+
+from .models import db, Personnel, Telephone, GefEquipement, GefAgrement
+
+# Synchronisation des listes enfants d'un GEF (personnel, téléphones,
+# équipements, agréments) : on compare la saisie aux lignes existantes et on
+# n'applique que les insertions, modifications et suppressions nécessaires,
+# chacune en une seule instruction groupée.
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _apply(model, inserts, updates, delete_condition=None):
+    if delete_condition is not None:
+        db.session.execute(delete(model).where(delete_condition), execution_options={'synchronize_session': False})
+    if updates:
+        # UPDATE groupé par clé primaire (executemany)
+        db.session.execute(update(model), updates)
+    if inserts:
+        db.session.execute(insert(model), inserts)
+
+
+def _sync_by_id(model, pk, fields, fk, gef_numero, submitted):
+    """Synchronise une table enfant à clé technique (personnel, téléphones).
+
+    `submitted` : liste de dicts {'id': <id ou None>, <champ>: <valeur>, ...}.
+    Les lignes sont d'abord appariées par identifiant, puis par contenu
+    identique ; les lignes existantes restantes sont réutilisées (UPDATE) avant
+    toute insertion, pour ne pas consommer de nouvelles clés.
+    """
+    pk_col, fk_col = getattr(model, pk), getattr(model, fk)
+    rows = db.session.execute(
+        select(pk_col, *(getattr(model, f) for f in fields)).where(fk_col == gef_numero)
+    )
+    unmatched = {row[0]: tuple(row[1:]) for row in rows}
+
+    updates, pending = [], []
+    for item in submitted:
+        values = tuple(item[f] for f in fields)
+        row_id = item.get('id')
+        if row_id in unmatched:
+            if unmatched.pop(row_id) != values:
+                updates.append({pk: row_id, **dict(zip(fields, values))})
+        else:
+            pending.append(values)
+
+    remaining = []
+    for values in pending:
+        same = next((row_id for row_id, old in unmatched.items() if old == values), None)
+        if same is None:
+            remaining.append(values)
+        else:
+            del unmatched[same]
+
+    leftover_ids = list(unmatched)
+    for row_id, values in zip(leftover_ids, remaining):
+        updates.append({pk: row_id, **dict(zip(fields, values))})
+    delete_ids = leftover_ids[len(remaining):]
+    inserts = [{fk: gef_numero, **dict(zip(fields, values))} for values in remaining[len(leftover_ids):]]
+
+    _apply(model, inserts, updates, pk_col.in_(delete_ids) if delete_ids else None)
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(delete_ids)}
+
+
+def sync_personnel(gef_numero, submitted):
+    return _sync_by_id(Personnel, 'id_personnel', ('nom', 'prenom', 'profile'), 'n_gef', gef_numero, submitted)
+
+
+def sync_telephones(gef_numero, submitted):
+    return _sync_by_id(Telephone, 'id', ('type_tel', 'num'), 'n_gef', gef_numero, submitted)
+
+
+def sync_equipements(gef_numero, quantities):
+    """`quantities` : {id_type: quantite}. La clé (n_gef, id_type) identifie la ligne."""
+    current = dict(db.session.execute(
+        select(GefEquipement.id_type, GefEquipement.quantite).where(GefEquipement.n_gef == gef_numero)
+    ).all())
+    removed = [id_type for id_type in current if id_type not in quantities]
+    updates = [
+        {'n_gef': gef_numero, 'id_type': id_type, 'quantite': quantite}
+        for id_type, quantite in quantities.items()
+        if id_type in current and current[id_type] != quantite
+    ]
+    inserts = [
+        {'n_gef': gef_numero, 'id_type': id_type, 'quantite': quantite}
+        for id_type, quantite in quantities.items() if id_type not in current
+    ]
+    delete_condition = None
+    if removed:
+        delete_condition = (GefEquipement.n_gef == gef_numero) & GefEquipement.id_type.in_(removed)
+    _apply(GefEquipement, inserts, updates, delete_condition)
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(removed)}
+
+
+def sync_agrements(gef_numero, agrement_ids):
+    """Conserve les liens existants (et leurs colonnes annexes), supprime les retirés et les doublons."""
+    wanted = set(agrement_ids)
+    kept, delete_ids = set(), []
+    rows = db.session.execute(
+        select(GefAgrement.id, GefAgrement.agrement_id).where(GefAgrement.gef_n == gef_numero).order_by(GefAgrement.id)
+    )
+    for row_id, agrement_id in rows:
+        if agrement_id in wanted and agrement_id not in kept:
+            kept.add(agrement_id)
+        else:
+            delete_ids.append(row_id)
+    inserts = []
+    for agrement_id in agrement_ids:
+        if agrement_id not in kept:
+            kept.add(agrement_id)
+            inserts.append({'gef_n': gef_numero, 'agrement_id': agrement_id})
+    _apply(GefAgrement, inserts, [], GefAgrement.id.in_(delete_ids) if delete_ids else None)
+    return {'inserted': len(inserts), 'updated': 0, 'deleted': len(delete_ids)}
+
+
+def children_from_form(form):
+    """Lit les listes enfants du formulaire d'édition (les champs *_id sont optionnels)."""
+    noms = form.getlist('personnel_nom')
+    personnel_ids = form.getlist('personnel_id')
+    if len(personnel_ids) != len(noms):
+        personnel_ids = [None] * len(noms)
+    personnel = [
+        {'id': _parse_id(row_id), 'nom': nom, 'prenom': prenom, 'profile': profile}
+        for row_id, nom, prenom, profile in zip(
+            personnel_ids, noms, form.getlist('personnel_prenom'), form.getlist('personnel_profile'))
+    ]
+
+    numeros = form.getlist('telephone_numero')
+    telephone_ids = form.getlist('telephone_id')
+    if len(telephone_ids) != len(numeros):
+        telephone_ids = [None] * len(numeros)
+    telephones = [
+        {'id': _parse_id(row_id), 'type_tel': type_tel, 'num': num}
+        for row_id, type_tel, num in zip(telephone_ids, form.getlist('telephone_type'), numeros)
+    ]
+
+    # Un même type d'équipement saisi deux fois : quantités cumulées (clé primaire)
+    equipements = {}
+    for id_type, quantite in zip(form.getlist('equipement_id'), form.getlist('equipement_quantite')):
+        id_type, quantite = int(id_type), int(quantite or 1)
+        equipements[id_type] = equipements.get(id_type, 0) + quantite
+
+    agrements = [int(agrement_id) for agrement_id in form.getlist('agrement_ids')]
+    return personnel, telephones, equipements, agrements
+
+
+def sync_gef_children(gef_numero, form):
+    personnel, telephones, equipements, agrements = children_from_form(form)
+    return {
+        'personnel': sync_personnel(gef_numero, personnel),
+        'telephones': sync_telephones(gef_numero, telephones),
+        'equipements': sync_equipements(gef_numero, equipements),
+        'agrements': sync_agrements(gef_numero, agrements),
+    }
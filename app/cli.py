@@ -0,0 +1,204 @@
+# app/cli.py
+import json
+import os
+import signal
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.datastructures import FileStorage
+
+from .benchmark import run_benchmarks, write_results, compare_results, DEFAULT_ITERATIONS, DEFAULT_WARMUP
+from .commune_match import check_communes, assign_communes, write_report, load_boundaries, ASSIGN_MODES
+from .coverage import refresh_coverage, invalidate_coverage
+from .duplicates import find_duplicate_pairs, write_duplicates_report, DEFAULT_MIN_SCORE
+from .importer import import_gefs
+from .jobs import JobWorker, submit_job, JOB_TYPES
+from .models import db
+from .query_plans import run_plan_checks
+from .spatial import clear_tile_cache
+from .sync import build_snapshot, snapshot_path
+from .synthetic import generate_dataset, DEFAULT_GEFS, DEFAULT_WILAYAS, DEFAULT_COMMUNES
+
+# Commandes "flask gef ..." (à côté de "flask db ..." de Flask-Migrate)
+gef_cli = AppGroup('gef', help="Commandes d'administration des GEFs.")
+
+
+@gef_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help="Nombre de GEFs par transaction.")
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+              help="Rapport des lignes rejetées (par défaut : <fichier>.errors.csv).")
+@click.option('--delimiter', default=',', show_default=True, help="Séparateur CSV.")
+@click.option('--restart', is_flag=True, help="Ignore la progression enregistrée et repart du début.")
+def import_command(path, batch_size, errors_path, delimiter, restart):
+    """Importe un registre de GEFs (CSV ou XLSX) avec téléphones, personnel, équipements et agréments."""
+    try:
+        report = import_gefs(path, batch_size=batch_size, errors_path=errors_path,
+                             resume=not restart, delimiter=delimiter, echo=click.echo)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if report.imported:
+        refresh_coverage()
+        db.session.commit()
+        invalidate_coverage()
+        clear_tile_cache()
+    click.echo(f"Terminé : {report.imported} GEF(s) importé(s), {report.failed} ligne(s) rejetée(s), "
+               f"{report.skipped} ligne(s) déjà traitée(s).")
+
+
+@gef_cli.command('coverage')
+def coverage_command():
+    """Recalcule entièrement les statistiques de couverture (tables coverage_*)."""
+    refresh_coverage()
+    db.session.commit()
+    invalidate_coverage()
+    click.echo("Statistiques de couverture recalculées.")
+
+
+@gef_cli.command('seed')
+@click.option('--gefs', default=DEFAULT_GEFS, show_default=True, help="Nombre de GEFs à générer.")
+@click.option('--wilayas', default=DEFAULT_WILAYAS, show_default=True,
+              help="Wilayas créées si la table est vide.")
+@click.option('--communes', default=DEFAULT_COMMUNES, show_default=True,
+              help="Communes créées si la table est vide.")
+@click.option('--seed', default=42, show_default=True, help="Graine du générateur (jeu reproductible).")
+@click.option('--batch-size', default=5000, show_default=True, help="Nombre de GEFs par transaction.")
+@click.option('--reset', is_flag=True, help="Supprime d'abord tous les GEFs existants.")
+def seed_command(gefs, wilayas, communes, seed, batch_size, reset):
+    """Génère un jeu de données synthétique (GEFs, personnel, téléphones, équipements, agréments)."""
+    if reset:
+        click.confirm("Tous les GEFs existants seront supprimés. Continuer ?", abort=True)
+    created = generate_dataset(gefs=gefs, wilayas=wilayas, communes=communes, seed=seed,
+                               batch_size=batch_size, reset=reset, echo=click.echo)
+    click.echo(f"Terminé : {created} GEF(s) générés.")
+
+
+@gef_cli.command('bench')
+@click.option('--iterations', default=DEFAULT_ITERATIONS, show_default=True, help="Appels mesurés par scénario.")
+@click.option('--warmup', default=DEFAULT_WARMUP, show_default=True, help="Appels de chauffe non mesurés.")
+@click.option('--only', multiple=True, help="Préfixe de scénario à exécuter (répétable), ex. filter_gefs.")
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Fichier JSON de résultats (par défaut : instance/benchmarks/bench-<date>.json).")
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False),
+              help="Résultats précédents à comparer.")
+def bench_command(iterations, warmup, only, output, compare_path):
+    """Mesure latence et nombre de requêtes SQL des pages et API principales."""
+    try:
+        results = run_benchmarks(iterations=iterations, warmup=warmup, only=only, echo=click.echo)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if output is None:
+        folder = os.path.join(current_app.instance_path, 'benchmarks')
+        os.makedirs(folder, exist_ok=True)
+        output = os.path.join(folder, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    write_results(results, output)
+    click.echo(f"Résultats écrits dans {output}")
+    if compare_path:
+        compare_results(compare_path, results, echo=click.echo)
+
+
+@gef_cli.command('plans')
+@click.option('--only', multiple=True, help="Préfixe de requête à contrôler (répétable), ex. edit_gef.")
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Plans et mesures en JSON (par défaut : instance/plans/plans-<date>.json).")
+@click.option('--no-analyze', is_flag=True, help="Ne met pas à jour les statistiques (ANALYZE) avant le contrôle.")
+def plans_command(only, output, no_analyze):
+    """Contrôle les plans des requêtes fréquentes (EXPLAIN ANALYZE) : échoue sur Seq Scan ou coût hors budget."""
+    try:
+        results = run_plan_checks(only=only, analyze=not no_analyze, echo=click.echo)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if output is None:
+        folder = os.path.join(current_app.instance_path, 'plans')
+        os.makedirs(folder, exist_ok=True)
+        output = os.path.join(folder, f"plans-{datetime.now():%Y%m%d-%H%M%S}.json")
+    write_results(results, output)
+    click.echo(f"Plans écrits dans {output}")
+    if results['failures']:
+        raise click.ClickException(f"{len(results['failures'])} plan(s) en régression : {', '.join(results['failures'])}")
+
+
+@gef_cli.command('snapshot')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Fichier à écrire (par défaut : celui servi par /api/sync/snapshot).")
+def snapshot_command(output):
+    """Construit l'instantané complet compressé servi aux clients hors ligne."""
+    path = output or snapshot_path()
+    cursor, count = build_snapshot(path)
+    click.echo(f"Instantané de {count} GEF(s) écrit dans {path} (curseur {cursor}).")
+
+
+@gef_cli.command('commune-boundaries')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--code-property', default='code_commu', show_default=True,
+              help="Propriété GeoJSON portant le code de la commune.")
+def commune_boundaries_command(path, code_property):
+    """Charge les limites communales (GeoJSON, WGS 84) dans commune.geom."""
+    updated, unknown = load_boundaries(path, code_property=code_property)
+    click.echo(f"{updated} commune(s) mises à jour.")
+    if unknown:
+        click.echo(f"Codes absents de la table commune : {', '.join(map(str, unknown))}")
+
+
+@gef_cli.command('commune-check')
+@click.option('--wilaya', type=int, help="Limite la vérification à une wilaya.")
+@click.option('--assign', type=click.Choice(ASSIGN_MODES),
+              help="Met à jour commune_c : 'missing' (vides seulement) ou 'all' (corrige aussi les divergences).")
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False),
+              help="Rapport CSV (par défaut : instance/reports/communes-<date>.csv).")
+def commune_check_command(wilaya, assign, report_path):
+    """Compare commune_c à la commune contenant la position du GEF (jointure spatiale)."""
+    if assign:
+        assigned = assign_communes(assign, wilaya)
+        click.echo(f"{len(assigned)} GEF(s) rattaché(s) à la commune de leur position.")
+    summary, rows = check_communes(wilaya)
+    click.echo(f"Conformes : {summary['ok']}, divergents : {summary['mismatch']}, sans commune : {summary['missing']}, "
+               f"hors communes connues : {summary['outside']}, sans position : {summary['sans_geom']}.")
+    click.echo(f"Rapport écrit dans {write_report(rows, report_path)}")
+
+
+@gef_cli.command('duplicates')
+@click.option('--min-score', default=DEFAULT_MIN_SCORE, show_default=True, help="Score minimal d'une paire (0 à 1).")
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False),
+              help="Rapport CSV (par défaut : instance/reports/doublons-<date>.csv).")
+def duplicates_command(min_score, report_path):
+    """Recherche les GEFs probablement saisis en double (NIF, NIM, téléphone, nom proche)."""
+    pairs = find_duplicate_pairs(min_score)
+    click.echo(f"{len(pairs)} paire(s) de doublons probables.")
+    click.echo(f"Rapport écrit dans {write_duplicates_report(pairs, report_path)}")
+
+
+@gef_cli.command('worker')
+@click.option('--threads', type=int, help="Tâches exécutées en parallèle (par défaut : JOB_WORKERS).")
+@click.option('--once', is_flag=True, help="S'arrête dès que la file est vide.")
+def worker_command(threads, once):
+    """Exécute les tâches de fond en file (exports, photos, imports, rapports)."""
+    worker = JobWorker(current_app._get_current_object(), threads=threads, echo=click.echo)
+    # SIGTERM (arrêt du service) : les tâches en cours sont remises en file
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    click.echo(f"Worker {worker.worker_id} : {worker.threads} thread(s).")
+    worker.run(once=once)
+
+
+@gef_cli.command('job-submit')
+@click.argument('kind', type=click.Choice(list(JOB_TYPES)))
+@click.option('--params', default='{}', help="Paramètres JSON, ex. '{\"format\": \"xlsx\"}'.")
+@click.option('--file', 'input_path', type=click.Path(exists=True, dir_okay=False),
+              help="Fichier d'entrée (import).")
+def job_submit_command(kind, params, input_path):
+    """Met une tâche de fond en file."""
+    try:
+        params = json.loads(params)
+    except ValueError as e:
+        raise click.ClickException(f"Paramètres JSON invalides : {e}")
+    try:
+        if input_path:
+            with open(input_path, 'rb') as f:
+                job = submit_job(kind, params, FileStorage(f, filename=os.path.basename(input_path)))
+        else:
+            job = submit_job(kind, params)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Tâche {job.id} ({kind}) en file.")
@@ -0,0 +1,213 @@
+# app/commune_match.py
+import csv
+import json
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .coverage import commune_codes, refresh_coverage, invalidate_coverage, cached_coverage
+from .details import invalidate_gef_details
+from .models import db
+
+# Rattachement spatial des GEFs à leur commune : jointure point-dans-polygone
+# entre gef.geom et commune.geom (index GiST des deux côtés), en une requête.
+# Sert à vérifier ou corriger commune_c (saisi à la main) et à compter les
+# GEFs par polygone communal sans dépendre de commune_c.
+
+# Statuts d'un GEF géolocalisé
+STATUS_OK = 'ok'                # commune_c correspond au polygone
+STATUS_MISMATCH = 'mismatch'    # commune_c différent du polygone
+STATUS_MISSING = 'missing'      # commune_c vide, polygone trouvé
+STATUS_OUTSIDE = 'outside'      # point hors de toute commune connue
+
+ASSIGN_MODES = ('missing', 'all')
+
+# Pour chaque GEF géolocalisé, la commune dont le polygone contient le point.
+# ST_Intersects (et non ST_Contains) : un point sur une limite commune est
+# rattaché à la commune de plus petit code plutôt qu'à aucune.
+LOCATED_CTE = """
+    located AS (
+        SELECT g.numero, g.n_p, g.situation, g.commune_c, m.code_commu AS commune_geom
+        FROM gef g
+        LEFT JOIN LATERAL (
+            SELECT c.code_commu FROM commune c
+            WHERE c.geom IS NOT NULL AND ST_Intersects(c.geom, g.geom)
+            ORDER BY c.code_commu
+            LIMIT 1
+        ) m ON true
+        WHERE g.geom IS NOT NULL {scope}
+    ),
+    checked AS (
+        SELECT located.*,
+               CASE
+                   WHEN commune_geom IS NULL THEN 'outside'
+                   WHEN commune_c IS NULL THEN 'missing'
+                   WHEN commune_c <> commune_geom THEN 'mismatch'
+                   ELSE 'ok'
+               END AS status
+        FROM located
+    )
+"""
+
+# Portée : GEFs dont la commune saisie ou l'emprise des communes de la wilaya concerne la wilaya
+WILAYA_SCOPE = """
+    AND (g.commune_c IN (SELECT code_commu FROM commune WHERE code_wilaya = :wilaya)
+         OR g.geom && (SELECT ST_Extent(geom) FROM commune WHERE code_wilaya = :wilaya))
+"""
+
+CHECK_SUMMARY_SQL = """
+    WITH {located}
+    SELECT status, count(*) AS gef_count FROM checked GROUP BY status
+"""
+
+CHECK_ROWS_SQL = """
+    WITH {located}
+    SELECT c.numero, c.n_p, c.commune_c, c.commune_geom, c.status,
+           saisie.nom_commun AS nom_commune_saisie, spatiale.nom_commun AS nom_commune_spatiale
+    FROM checked c
+    LEFT JOIN commune saisie ON saisie.code_commu = c.commune_c
+    LEFT JOIN commune spatiale ON spatiale.code_commu = c.commune_geom
+    WHERE c.status <> 'ok'
+    ORDER BY c.status, c.numero
+"""
+
+ASSIGN_SQL = """
+    WITH {located},
+    updated AS (
+        UPDATE gef SET commune_c = checked.commune_geom, updated_at = now()
+        FROM checked
+        WHERE gef.numero = checked.numero AND checked.status IN :statuses
+        RETURNING gef.numero, checked.commune_c AS old_commune, checked.commune_geom AS new_commune
+    )
+    SELECT * FROM updated
+"""
+
+UNLOCATED_COUNT_SQL = text("SELECT count(*) FROM gef WHERE geom IS NULL")
+
+# Polygones réparés si besoin et toujours stockés en MULTIPOLYGON
+BOUNDARY_UPDATE_SQL = text("""
+    UPDATE commune
+    SET geom = ST_Multi(ST_CollectionExtract(ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(:geometry), 4326)), 3))
+    WHERE code_commu = :code
+""")
+
+# GEFs par polygone communal (même jointure spatiale, indépendante de commune_c)
+POLYGON_COVERAGE_SQL = """
+    WITH {located}
+    SELECT c.code_commu AS code, c.nom_commun, c.code_wilaya,
+           count(l.numero) AS gef_count,
+           count(l.numero) FILTER (WHERE l.situation = 'actif') AS gef_actif_count,
+           count(l.numero) FILTER (WHERE l.commune_c IS DISTINCT FROM c.code_commu) AS gef_commune_differente
+    FROM commune c
+    LEFT JOIN checked l ON l.commune_geom = c.code_commu
+    WHERE c.geom IS NOT NULL {wilaya_filter}
+    GROUP BY c.code_commu, c.nom_commun, c.code_wilaya
+    ORDER BY c.code_wilaya, c.nom_commun
+"""
+
+
+def _statement(sql, wilaya=None, **parts):
+    scope = WILAYA_SCOPE if wilaya else ''
+    return text(sql.format(located=LOCATED_CTE.format(scope=scope), **parts))
+
+
+def check_communes(wilaya=None):
+    """Compare commune_c à la commune trouvée par jointure spatiale.
+
+    Retourne (résumé {statut: nombre, 'sans_geom': n}, lignes non conformes).
+    """
+    params = {'wilaya': wilaya}
+    summary = {STATUS_OK: 0, STATUS_MISMATCH: 0, STATUS_MISSING: 0, STATUS_OUTSIDE: 0}
+    for status, count in db.session.execute(_statement(CHECK_SUMMARY_SQL, wilaya), params):
+        summary[status] = count
+    summary['sans_geom'] = db.session.execute(UNLOCATED_COUNT_SQL).scalar()
+    rows = [dict(row) for row in db.session.execute(_statement(CHECK_ROWS_SQL, wilaya), params).mappings()]
+    return summary, rows
+
+
+def write_report(rows, path=None):
+    """Rapport CSV des GEFs non conformes ; retourne le chemin écrit."""
+    if path is None:
+        folder = os.path.join(current_app.instance_path, 'reports')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"communes-{datetime.now():%Y%m%d-%H%M%S}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['numero', 'nom', 'statut', 'commune_saisie', 'nom_commune_saisie',
+                         'commune_spatiale', 'nom_commune_spatiale'])
+        for row in rows:
+            writer.writerow([
+                row['numero'], row['n_p'], row['status'], row['commune_c'] or '', row['nom_commune_saisie'] or '',
+                row['commune_geom'] or '', row['nom_commune_spatiale'] or '',
+            ])
+    return path
+
+
+def assign_communes(mode='missing', wilaya=None):
+    """Renseigne commune_c d'après la position, en une instruction UPDATE.
+
+    mode 'missing' : seulement les commune_c vides ; 'all' : corrige aussi les
+    divergences. Les GEFs hors de toute commune ne sont pas modifiés.
+    Retourne la liste des (numero, ancienne commune, nouvelle commune).
+    """
+    if mode not in ASSIGN_MODES:
+        raise ValueError(f"Mode inconnu : {mode} (attendu : {', '.join(ASSIGN_MODES)})")
+    statuses = [STATUS_MISSING] if mode == 'missing' else [STATUS_MISSING, STATUS_MISMATCH]
+    stmt = _statement(ASSIGN_SQL, wilaya).bindparams(bindparam('statuses', expanding=True))
+    try:
+        changes = db.session.execute(stmt, {'wilaya': wilaya, 'statuses': statuses}).all()
+        # Statistiques des communes quittées et des communes d'arrivée
+        refresh_coverage(commune_codes(*(c.old_commune for c in changes), *(c.new_commune for c in changes)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if changes:
+        invalidate_coverage()
+        invalidate_gef_details()
+    return [(c.numero, c.old_commune, c.new_commune) for c in changes]
+
+
+def _load_polygon_coverage(wilaya):
+    stmt = _statement(POLYGON_COVERAGE_SQL, wilaya, wilaya_filter='AND c.code_wilaya = :wilaya' if wilaya else '')
+    return [dict(row) for row in db.session.execute(stmt, {'wilaya': wilaya}).mappings()]
+
+
+def get_polygon_coverage(wilaya=None):
+    """GEFs par polygone communal, mis en cache avec les autres statistiques de couverture."""
+    return cached_coverage(('polygons', wilaya), lambda: _load_polygon_coverage(wilaya))
+
+
+def load_boundaries(path, code_property='code_commu'):
+    """Charge les limites communales d'un fichier GeoJSON (FeatureCollection, WGS 84).
+
+    Retourne (communes mises à jour, codes du fichier absents de la table commune).
+    """
+    with open(path, encoding='utf-8') as f:
+        features = json.load(f).get('features', [])
+    rows = []
+    for feature in features:
+        code = (feature.get('properties') or {}).get(code_property)
+        if code in (None, '') or not feature.get('geometry'):
+            continue
+        rows.append({'code': int(code), 'geometry': json.dumps(feature['geometry'])})
+    if not rows:
+        return 0, []
+
+    known = set(db.session.execute(
+        text("SELECT code_commu FROM commune WHERE code_commu = ANY(:codes)").bindparams(
+            bindparam('codes', type_=ARRAY(Integer))),
+        {'codes': [row['code'] for row in rows]}
+    ).scalars())
+    try:
+        db.session.execute(BOUNDARY_UPDATE_SQL, [row for row in rows if row['code'] in known])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_coverage()
+    return len(known), sorted({row['code'] for row in rows} - known)
@@ -0,0 +1,221 @@
+# app/coverage.py
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .cache import TTLCache
+from .models import db
+
+# Statistiques de couverture pré-agrégées par commune (tables coverage_*).
+# Après chaque écriture, seules les lignes des communes concernées sont
+# recalculées, dans la transaction de l'écriture ; les lectures (API, dashboard)
+# ne portent que sur ces tables de synthèse, jamais sur gef et ses enfants.
+
+REFRESH_COMMUNE_SQL = """
+    INSERT INTO coverage_commune (code_commune, code_wilaya, gef_count, gef_actif_count, personnel_count, refreshed_at)
+    SELECT c.code_commu, c.code_wilaya,
+           count(g.numero),
+           count(g.numero) FILTER (WHERE g.situation = 'actif'),
+           coalesce(sum(p.personnel_count), 0),
+           now()
+    FROM commune c
+    LEFT JOIN gef g ON g.commune_c = c.code_commu
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS personnel_count FROM personnel WHERE personnel.n_gef = g.numero
+    ) p ON true
+    WHERE {scope}
+    GROUP BY c.code_commu, c.code_wilaya
+    ON CONFLICT (code_commune) DO UPDATE SET
+        code_wilaya = EXCLUDED.code_wilaya,
+        gef_count = EXCLUDED.gef_count,
+        gef_actif_count = EXCLUDED.gef_actif_count,
+        personnel_count = EXCLUDED.personnel_count,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+REFRESH_AGREMENT_SQL = """
+    INSERT INTO coverage_agrement (code_commune, agrement_id, code_wilaya, gef_count, gef_actif_count)
+    SELECT c.code_commu, ga.agrement_id, c.code_wilaya,
+           count(DISTINCT g.numero),
+           count(DISTINCT g.numero) FILTER (WHERE g.situation = 'actif')
+    FROM gef g
+    JOIN commune c ON c.code_commu = g.commune_c
+    JOIN gef_agrements ga ON ga.gef_n = g.numero
+    WHERE ga.agrement_id IS NOT NULL AND {scope}
+    GROUP BY c.code_commu, ga.agrement_id, c.code_wilaya
+    ON CONFLICT (code_commune, agrement_id) DO UPDATE SET
+        code_wilaya = EXCLUDED.code_wilaya,
+        gef_count = EXCLUDED.gef_count,
+        gef_actif_count = EXCLUDED.gef_actif_count
+"""
+
+REFRESH_EQUIPEMENT_SQL = """
+    INSERT INTO coverage_equipement (code_commune, id_type, code_wilaya, gef_count, quantite)
+    SELECT c.code_commu, ge.id_type, c.code_wilaya,
+           count(*),
+           coalesce(sum(ge.quantite), 0)
+    FROM gef g
+    JOIN commune c ON c.code_commu = g.commune_c
+    JOIN gef_equipement ge ON ge.n_gef = g.numero
+    WHERE {scope}
+    GROUP BY c.code_commu, ge.id_type, c.code_wilaya
+    ON CONFLICT (code_commune, id_type) DO UPDATE SET
+        code_wilaya = EXCLUDED.code_wilaya,
+        gef_count = EXCLUDED.gef_count,
+        quantite = EXCLUDED.quantite
+"""
+
+# Verrou des communes recalculées, pris avant l'agrégation : deux écritures
+# concurrentes sur une même commune sont sérialisées, et la seconde agrège
+# après le commit de la première (nouvel instantané à chaque instruction en
+# READ COMMITTED). FOR NO KEY UPDATE ne bloque pas les contrôles de clés
+# étrangères (FOR KEY SHARE) des insertions de GEFs ; l'ordre évite les interblocages.
+LOCK_COMMUNES_SQL = """
+    SELECT code_commu FROM commune c WHERE {scope} ORDER BY code_commu FOR NO KEY UPDATE
+"""
+
+# --- Lectures (tables de synthèse uniquement) ---
+
+WILAYA_TOTALS_SQL = text("""
+    SELECT w.code, w.nom_wilaya,
+           sum(cc.gef_count)::integer AS gef_count,
+           sum(cc.gef_actif_count)::integer AS gef_actif_count,
+           sum(cc.personnel_count)::integer AS personnel_count,
+           count(*) AS commune_count,
+           count(*) FILTER (WHERE cc.gef_actif_count > 0) AS communes_couvertes
+    FROM coverage_commune cc
+    JOIN wilaya w ON w.code = cc.code_wilaya
+    GROUP BY w.code, w.nom_wilaya
+    ORDER BY w.code
+""")
+
+COMMUNE_TOTALS_SQL = text("""
+    SELECT c.code_commu AS code, c.nom_commun,
+           cc.gef_count, cc.gef_actif_count, cc.personnel_count
+    FROM coverage_commune cc
+    JOIN commune c ON c.code_commu = cc.code_commune
+    WHERE cc.code_wilaya = :wilaya
+    ORDER BY c.nom_commun
+""")
+
+AGREMENT_TOTALS_SQL = """
+    SELECT a.id, a.nom,
+           coalesce(sum(ca.gef_count), 0)::integer AS gef_count,
+           coalesce(sum(ca.gef_actif_count), 0)::integer AS gef_actif_count
+    FROM agrements a
+    LEFT JOIN coverage_agrement ca ON ca.agrement_id = a.id {wilaya}
+    GROUP BY a.id, a.nom
+    ORDER BY a.nom
+"""
+
+EQUIPEMENT_TOTALS_SQL = """
+    SELECT t.id_type, t.nom_type,
+           coalesce(sum(ce.gef_count), 0)::integer AS gef_count,
+           coalesce(sum(ce.quantite), 0)::integer AS quantite
+    FROM type_equipement t
+    LEFT JOIN coverage_equipement ce ON ce.id_type = t.id_type {wilaya}
+    GROUP BY t.id_type, t.nom_type
+    ORDER BY t.nom_type
+"""
+
+COVERAGE_GAPS_SQL = text("""
+    SELECT c.code_commu AS code, c.nom_commun, cc.code_wilaya, cc.gef_count
+    FROM coverage_commune cc
+    JOIN commune c ON c.code_commu = cc.code_commune
+    WHERE cc.gef_actif_count = 0 AND (CAST(:wilaya AS integer) IS NULL OR cc.code_wilaya = :wilaya)
+    ORDER BY cc.code_wilaya, c.nom_commun
+""")
+
+_coverage_cache = TTLCache()
+
+
+def commune_codes(*values):
+    """Codes de communes distincts (entiers), en ignorant les valeurs vides."""
+    codes = set()
+    for value in values:
+        if value in (None, ''):
+            continue
+        codes.add(int(value))
+    return sorted(codes)
+
+
+def refresh_coverage(communes=None):
+    """Recalcule les statistiques des communes données, ou de toutes si `communes` est None.
+
+    À appeler avant le commit de l'écriture : le recalcul fait partie de la même
+    transaction. Le cache de lecture doit être vidé après le commit
+    (invalidate_coverage).
+    """
+    if communes is not None and not communes:
+        return
+    # Les écritures ORM en attente doivent être visibles des requêtes d'agrégation
+    db.session.flush()
+
+    if communes is None:
+        params = {}
+        scopes = {'commune': 'true', 'gef': 'true'}
+        delete_scope = ''
+    else:
+        params = {'codes': list(communes)}
+        scopes = {'commune': 'c.code_commu = ANY(:codes)', 'gef': 'g.commune_c = ANY(:codes)'}
+        delete_scope = ' WHERE code_commune = ANY(:codes)'
+
+    def statement(sql):
+        stmt = text(sql)
+        if 'codes' in params:
+            stmt = stmt.bindparams(bindparam('codes', type_=ARRAY(Integer)))
+        return stmt
+
+    db.session.execute(statement(LOCK_COMMUNES_SQL.format(scope=scopes['commune'])), params)
+    # Les paires (commune, agrément / équipement) disparues sont supprimées,
+    # les autres sont réinsérées ou mises à jour
+    db.session.execute(statement('DELETE FROM coverage_agrement' + delete_scope), params)
+    db.session.execute(statement('DELETE FROM coverage_equipement' + delete_scope), params)
+    db.session.execute(statement(REFRESH_COMMUNE_SQL.format(scope=scopes['commune'])), params)
+    db.session.execute(statement(REFRESH_AGREMENT_SQL.format(scope=scopes['gef'])), params)
+    db.session.execute(statement(REFRESH_EQUIPEMENT_SQL.format(scope=scopes['gef'])), params)
+
+
+def _load_coverage(wilaya):
+    params = {'wilaya': wilaya}
+    wilaya_join = 'AND ca.code_wilaya = :wilaya' if wilaya else ''
+    equipement_join = 'AND ce.code_wilaya = :wilaya' if wilaya else ''
+    if wilaya:
+        zones = db.session.execute(COMMUNE_TOTALS_SQL, params).mappings().all()
+    else:
+        zones = db.session.execute(WILAYA_TOTALS_SQL).mappings().all()
+    agrements = db.session.execute(text(AGREMENT_TOTALS_SQL.format(wilaya=wilaya_join)), params).mappings().all()
+    equipements = db.session.execute(text(EQUIPEMENT_TOTALS_SQL.format(wilaya=equipement_join)), params).mappings().all()
+    gaps = db.session.execute(COVERAGE_GAPS_SQL, params).mappings().all()
+
+    totals = {
+        'gef_count': sum(row['gef_count'] for row in zones),
+        'gef_actif_count': sum(row['gef_actif_count'] for row in zones),
+        'personnel_count': sum(row['personnel_count'] for row in zones),
+        'communes_sans_gef_actif': len(gaps),
+    }
+    return {
+        'wilaya': wilaya,
+        'totals': totals,
+        'zones': [dict(row) for row in zones],
+        'agrements': [dict(row) for row in agrements],
+        'equipements': [dict(row) for row in equipements],
+        'communes_sans_gef_actif': [dict(row) for row in gaps],
+    }
+
+
+def cached_coverage(key, loader):
+    """Statistique mise en cache jusqu'à la prochaine écriture (invalidate_coverage) ou COVERAGE_STATS_TTL."""
+    ttl = current_app.config.get('COVERAGE_STATS_TTL', 300)
+    return _coverage_cache.get(key, loader, ttl=ttl)
+
+
+def get_coverage(wilaya=None):
+    """Statistiques de couverture (nationales, ou par commune pour une wilaya), mises en cache."""
+    return cached_coverage(('coverage', wilaya), lambda: _load_coverage(wilaya))
+
+
+def invalidate_coverage():
+    # Appelé après le commit d'une écriture qui a rafraîchi les statistiques
+    _coverage_cache.invalidate()
@@ -0,0 +1,233 @@
+# app/details.py
+import hashlib
+
+from flask import current_app
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .cache import TTLCache
+from .filters import filter_conditions
+from .models import db, Gef
+
+# Document complet d'un GEF construit par Postgres en un seul aller-retour :
+# chaque liste enfant est agrégée en JSON par une sous-requête corrélée.
+# Le document est renvoyé sous forme de texte (décodé selon l'encodage client
+# de la connexion) et transmis tel quel au client, sans re-sérialisation.
+GEF_DETAILS_SQL = text("""
+    SELECT
+        json_build_object(
+            'gef', json_build_object(
+                'numero', g.numero,
+                'nom', g.n_p,
+                'email', g.email,
+                'adresse', g.adresse,
+                'statut_bureau', g.statut_bureau,
+                'situation', g.situation,
+                'observations', g.observations,
+                'date_obt', TO_CHAR(g.date_obt, 'YYYY-MM-DD'),
+                'date_naiss', TO_CHAR(g.date_naiss, 'YYYY-MM-DD'),
+                'nim', g.nim,
+                'nif', g.nif,
+                'commune_adresse', c_adresse.nom_commun,
+                'wilaya_adresse', w_adresse.nom_wilaya,
+                'commune_naissance', c_naiss.nom_commun,
+                'wilaya_naissance', w_naiss.nom_wilaya,
+                'photo_filename', g.photo_filename
+            ),
+            'employees', COALESCE((
+                SELECT json_agg(json_build_object('nom', p.nom, 'prenom', p.prenom, 'profile', p.profile)
+                                ORDER BY p.nom, p.prenom)
+                FROM personnel p WHERE p.n_gef = g.numero
+            ), '[]'::json),
+            'telephones', COALESCE((
+                SELECT json_agg(json_build_object('type', t.type_tel, 'numero', t.num)
+                                ORDER BY t.type_tel)
+                FROM telephones t WHERE t.n_gef = g.numero
+            ), '[]'::json),
+            'equipments', COALESCE((
+                SELECT json_agg(json_build_object('nom', te.nom_type, 'quantite', ge.quantite)
+                                ORDER BY te.nom_type)
+                FROM gef_equipement ge JOIN type_equipement te ON ge.id_type = te.id_type
+                WHERE ge.n_gef = g.numero
+            ), '[]'::json),
+            'agrements', COALESCE((
+                SELECT json_agg(json_build_object('nom', a.nom, 'date', TO_CHAR(ga.date_obtention, 'YYYY-MM-DD'))
+                                ORDER BY a.nom)
+                FROM gef_agrements ga JOIN agrements a ON ga.agrement_id = a.id
+                WHERE ga.gef_n = g.numero
+            ), '[]'::json)
+        )::text AS document,
+        g.updated_at
+    FROM gef g
+    LEFT JOIN commune c_adresse ON g.commune_c = c_adresse.code_commu
+    LEFT JOIN wilaya w_adresse ON c_adresse.code_wilaya = w_adresse.code
+    LEFT JOIN commune c_naiss ON g.lieu_naiss_cc = c_naiss.code_commu
+    LEFT JOIN wilaya w_naiss ON g.lieu_naiss_wc = w_naiss.code
+    WHERE g.numero = :numero
+""")
+
+GEF_UPDATED_AT_SQL = text("SELECT updated_at FROM gef WHERE numero = :numero")
+
+# Documents mis en cache par GEF ; toute écriture (y compris depuis un autre
+# worker, via LISTEN/NOTIFY : voir notify.py) évince l'entrée concernée.
+_details_cache = TTLCache()
+
+
+def _load_gef_details(gef_numero):
+    row = db.session.execute(GEF_DETAILS_SQL, {'numero': gef_numero}).first()
+    if row is None:
+        return None, None
+    return row.document, row.updated_at
+
+
+def load_gef_details(gef_numero):
+    """Retourne (document JSON texte, updated_at) ou (None, None) si le GEF n'existe pas."""
+    ttl = current_app.config.get('DETAILS_CACHE_TTL', 300)
+    document, updated_at = _details_cache.get(gef_numero, lambda: _load_gef_details(gef_numero), ttl=ttl)
+    if document is None:
+        # Un GEF absent n'est pas mis en cache (il peut être créé juste après)
+        _details_cache.invalidate(gef_numero)
+    return document, updated_at
+
+
+def invalidate_gef_details(gef_numero=None):
+    # Sans numéro : tous les documents (ex. renommage d'une commune ou d'un agrément)
+    _details_cache.invalidate(gef_numero)
+
+
+def get_gef_updated_at(gef_numero):
+    return db.session.execute(GEF_UPDATED_AT_SQL, {'numero': gef_numero}).scalar()
+
+
+def gef_etag(gef_numero, updated_at):
+    return hashlib.md5(f"{gef_numero}:{updated_at.isoformat()}".encode()).hexdigest()
+
+
+# --- Documents par lots ---
+# Même forme de document que /api/gef/<numero>, pour une liste de GEFs, en une
+# seule requête : chaque table enfant est lue une fois pour tout le lot
+# (n_gef = ANY(:numeros)) et agrégée par GEF, quelle que soit la taille du lot.
+
+BATCH_DEFAULT_MAX = 200
+
+# Attributs de l'objet 'gef' : clé JSON -> expression SQL
+GEF_DOCUMENT_FIELDS = {
+    'numero': 'g.numero',
+    'nom': 'g.n_p',
+    'email': 'g.email',
+    'adresse': 'g.adresse',
+    'statut_bureau': 'g.statut_bureau',
+    'situation': 'g.situation',
+    'observations': 'g.observations',
+    'date_obt': "TO_CHAR(g.date_obt, 'YYYY-MM-DD')",
+    'date_naiss': "TO_CHAR(g.date_naiss, 'YYYY-MM-DD')",
+    'nim': 'g.nim',
+    'nif': 'g.nif',
+    'commune_adresse': 'c_adresse.nom_commun',
+    'wilaya_adresse': 'w_adresse.nom_wilaya',
+    'commune_naissance': 'c_naiss.nom_commun',
+    'wilaya_naissance': 'w_naiss.nom_wilaya',
+    'photo_filename': 'g.photo_filename',
+}
+
+# Listes enfants : clé JSON -> agrégat par GEF sur tout le lot
+CHILD_SECTIONS = {
+    'employees': """
+        SELECT p.n_gef, json_agg(json_build_object('nom', p.nom, 'prenom', p.prenom, 'profile', p.profile)
+                                 ORDER BY p.nom, p.prenom) AS items
+        FROM personnel p WHERE p.n_gef = ANY(:numeros) GROUP BY p.n_gef""",
+    'telephones': """
+        SELECT t.n_gef, json_agg(json_build_object('type', t.type_tel, 'numero', t.num)
+                                 ORDER BY t.type_tel) AS items
+        FROM telephones t WHERE t.n_gef = ANY(:numeros) GROUP BY t.n_gef""",
+    'equipments': """
+        SELECT ge.n_gef, json_agg(json_build_object('nom', te.nom_type, 'quantite', ge.quantite)
+                                  ORDER BY te.nom_type) AS items
+        FROM gef_equipement ge JOIN type_equipement te ON ge.id_type = te.id_type
+        WHERE ge.n_gef = ANY(:numeros) GROUP BY ge.n_gef""",
+    'agrements': """
+        SELECT ga.gef_n AS n_gef, json_agg(json_build_object('nom', a.nom, 'date', TO_CHAR(ga.date_obtention, 'YYYY-MM-DD'))
+                                           ORDER BY a.nom) AS items
+        FROM gef_agrements ga JOIN agrements a ON ga.agrement_id = a.id
+        WHERE ga.gef_n = ANY(:numeros) GROUP BY ga.gef_n""",
+}
+DOCUMENT_SECTIONS = ('gef',) + tuple(CHILD_SECTIONS)
+
+
+def parse_fields(value):
+    """`fields` -> (sections, attributs de 'gef') ; None = tout.
+
+    Exemple : "gef.numero,gef.nom,employees" -> ({'gef', 'employees'}, ['numero', 'nom']).
+    """
+    if not value:
+        return set(DOCUMENT_SECTIONS), list(GEF_DOCUMENT_FIELDS)
+    items = value if isinstance(value, (list, tuple)) else value.split(',')
+    sections, gef_fields = set(), []
+    for item in (str(i).strip() for i in items):
+        if not item:
+            continue
+        section, _, attribute = item.partition('.')
+        if section not in DOCUMENT_SECTIONS or (attribute and section != 'gef'):
+            raise ValueError(f"Champ inconnu : {item}")
+        if attribute:
+            if attribute not in GEF_DOCUMENT_FIELDS:
+                raise ValueError(f"Champ inconnu : {item}")
+            if attribute not in gef_fields:
+                gef_fields.append(attribute)
+        sections.add(section)
+    if 'gef' in sections and not gef_fields:
+        gef_fields = list(GEF_DOCUMENT_FIELDS)
+    if not sections:
+        raise ValueError("Aucun champ demandé")
+    return sections, gef_fields
+
+
+def _batch_sql(sections, gef_fields):
+    ctes, joins, members = [], [], ["'numero', g.numero"]
+    if 'gef' in sections:
+        pairs = ', '.join(f"'{key}', {GEF_DOCUMENT_FIELDS[key]}" for key in gef_fields)
+        members.append(f"'gef', json_build_object({pairs})")
+    for name, sql in CHILD_SECTIONS.items():
+        if name in sections:
+            ctes.append(f"{name} AS ({sql})")
+            joins.append(f"LEFT JOIN {name} ON {name}.n_gef = g.numero")
+            members.append(f"'{name}', COALESCE({name}.items, '[]'::json)")
+    return text(f"""
+        {'WITH ' + ', '.join(ctes) if ctes else ''}
+        SELECT g.numero, json_build_object({', '.join(members)})::text AS document
+        FROM gef g
+        LEFT JOIN commune c_adresse ON g.commune_c = c_adresse.code_commu
+        LEFT JOIN wilaya w_adresse ON c_adresse.code_wilaya = w_adresse.code
+        LEFT JOIN commune c_naiss ON g.lieu_naiss_cc = c_naiss.code_commu
+        LEFT JOIN wilaya w_naiss ON g.lieu_naiss_wc = w_naiss.code
+        {' '.join(joins)}
+        WHERE g.numero = ANY(:numeros)
+    """).bindparams(bindparam('numeros', type_=ARRAY(Integer)))
+
+
+def load_gef_documents(numeros, fields=None):
+    """Documents JSON (texte) des GEFs demandés, dans l'ordre de `numeros`.
+
+    Retourne (liste de (numero, document), numéros introuvables).
+    """
+    sections, gef_fields = parse_fields(fields)
+    numeros = list(dict.fromkeys(numeros))
+    if not numeros:
+        return [], []
+    rows = db.session.execute(_batch_sql(sections, gef_fields), {'numeros': numeros})
+    documents = {row.numero: row.document for row in rows}
+    found = [(numero, documents[numero]) for numero in numeros if numero in documents]
+    missing = [numero for numero in numeros if numero not in documents]
+    return found, missing
+
+
+def filtered_numeros(criteria, limit):
+    """Numéros des GEFs correspondant aux critères de /gef/filter (au plus `limit`).
+
+    Retourne (numéros, tronqué).
+    """
+    numeros = list(db.session.execute(
+        select(Gef.numero).where(*filter_conditions(criteria)).order_by(Gef.numero).limit(limit + 1)
+    ).scalars())
+    return numeros[:limit], len(numeros) > limit
@@ -0,0 +1,239 @@
+# app/duplicates.py
+import csv
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer, String
+
+from .models import db
+
+# Détection des GEFs en double (même personne saisie deux fois, orthographe du
+# nom différente). Comparer toutes les paires est en O(n²) : on ne compare que
+# les GEFs partageant une clé de blocage indexée (migration « duplicate
+# blocking keys ») :
+#   nif, nim          égalité (index ix_gef_nif, ix_gef_nim)
+#   telephone         numéro normalisé gef_phone_key(num) (ix_telephones_phone_key)
+#   nom               trigrammes de gef_name_key(n_p), opérateur % (ix_gef_name_key_trgm)
+#   commune           même commune_c, noms moins proches admis (ix_gef_commune_c)
+# puis chaque paire candidate reçoit un score pondéré par ses indices.
+
+# Poids des indices : le score d'une paire est leur somme, plafonnée à 1
+WEIGHTS = {
+    'nom': 0.5,         # multiplié par la similarité des noms (0 à 1)
+    'nif': 0.5,
+    'nim': 0.5,
+    'telephone': 0.35,
+    'email': 0.3,
+    'commune': 0.1,
+}
+DEFAULT_MIN_SCORE = 0.5
+
+# Similarité minimale des noms : sur tout le registre, et au sein d'une même commune
+NAME_THRESHOLD = 0.6
+COMMUNE_NAME_THRESHOLD = 0.4
+
+# Une valeur partagée par plus de GEFs n'est pas discriminante (nif 0, standard
+# téléphonique commun...) : le bloc est ignoré
+EXACT_BLOCK_MAX = 20
+COMMUNE_BLOCK_MAX = 500
+
+# Paires évaluées par requête de score (rapport complet)
+SCORE_BATCH = 5000
+CHECK_MAX_RESULTS = 10
+
+SET_NAME_THRESHOLD_SQL = text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)")
+
+# Paires candidates (a < b) par bloc, sur tout le registre
+BLOCK_SQL = {
+    'nif': text("""
+        SELECT a.numero, b.numero FROM gef a
+        JOIN gef b ON b.nif = a.nif AND b.numero > a.numero
+        WHERE a.nif IN (SELECT nif FROM gef WHERE nif IS NOT NULL GROUP BY nif
+                        HAVING count(*) BETWEEN 2 AND :max_block)
+    """),
+    'nim': text("""
+        SELECT a.numero, b.numero FROM gef a
+        JOIN gef b ON b.nim = a.nim AND b.numero > a.numero
+        WHERE a.nim IN (SELECT nim FROM gef WHERE nim IS NOT NULL GROUP BY nim
+                        HAVING count(*) BETWEEN 2 AND :max_block)
+    """),
+    'telephone': text("""
+        WITH phone_keys AS (
+            SELECT DISTINCT gef_phone_key(num) AS phone_key, n_gef FROM telephones
+            WHERE gef_phone_key(num) IS NOT NULL AND n_gef IS NOT NULL
+        ),
+        blocks AS (
+            SELECT phone_key FROM phone_keys GROUP BY phone_key HAVING count(*) BETWEEN 2 AND :max_block
+        )
+        SELECT DISTINCT a.n_gef, b.n_gef FROM phone_keys a
+        JOIN phone_keys b ON b.phone_key = a.phone_key AND b.n_gef > a.n_gef
+        WHERE a.phone_key IN (SELECT phone_key FROM blocks)
+    """),
+    # Seuil de % fixé par SET_NAME_THRESHOLD_SQL
+    'nom': text("""
+        SELECT a.numero, b.numero FROM gef a
+        JOIN gef b ON gef_name_key(b.n_p) % gef_name_key(a.n_p) AND b.numero > a.numero
+    """),
+    'commune': text("""
+        SELECT a.numero, b.numero FROM gef a
+        JOIN gef b ON b.commune_c = a.commune_c AND b.numero > a.numero
+        WHERE a.commune_c IN (SELECT commune_c FROM gef WHERE commune_c IS NOT NULL GROUP BY commune_c
+                              HAVING count(*) BETWEEN 2 AND :max_commune_block)
+          AND similarity(gef_name_key(a.n_p), gef_name_key(b.n_p)) >= :commune_threshold
+    """),
+}
+
+# Indices de chaque paire candidate (le téléphone vient du bloc lui-même)
+PAIR_FEATURES_SQL = text("""
+    SELECT p.a, p.b, ga.n_p AS nom_a, gb.n_p AS nom_b,
+           similarity(gef_name_key(ga.n_p), gef_name_key(gb.n_p)) AS nom,
+           COALESCE(ga.nif = gb.nif, false) AS nif,
+           COALESCE(ga.nim = gb.nim, false) AS nim,
+           COALESCE(lower(ga.email) = lower(gb.email), false) AS email,
+           COALESCE(ga.commune_c = gb.commune_c, false) AS commune
+    FROM unnest(:a, :b) AS p(a, b)
+    JOIN gef ga ON ga.numero = p.a
+    JOIN gef gb ON gb.numero = p.b
+""").bindparams(bindparam('a', type_=ARRAY(Integer)), bindparam('b', type_=ARRAY(Integer)))
+
+# Vérification d'une fiche avant enregistrement : mêmes blocs, ancrés sur les valeurs saisies
+CHECK_SQL = text("""
+    WITH phone_keys AS (
+        SELECT DISTINCT gef_phone_key(p) AS phone_key FROM unnest(:phones) AS p
+        WHERE gef_phone_key(p) IS NOT NULL
+    ),
+    candidates AS (
+        SELECT numero FROM gef WHERE nif = :nif
+        UNION SELECT numero FROM gef WHERE nim = :nim
+        UNION SELECT numero FROM gef WHERE gef_name_key(n_p) % gef_name_key(:n_p)
+        UNION SELECT numero FROM gef WHERE commune_c = :commune_c
+                                       AND similarity(gef_name_key(n_p), gef_name_key(:n_p)) >= :commune_threshold
+        UNION SELECT n_gef FROM telephones WHERE gef_phone_key(num) IN (SELECT phone_key FROM phone_keys)
+    )
+    SELECT g.numero, g.n_p, c.nom_commun,
+           similarity(gef_name_key(g.n_p), gef_name_key(:n_p)) AS nom,
+           COALESCE(g.nif = :nif, false) AS nif,
+           COALESCE(g.nim = :nim, false) AS nim,
+           COALESCE(lower(g.email) = lower(:email), false) AS email,
+           COALESCE(g.commune_c = :commune_c, false) AS commune,
+           EXISTS (SELECT 1 FROM telephones t WHERE t.n_gef = g.numero
+                   AND gef_phone_key(t.num) IN (SELECT phone_key FROM phone_keys)) AS telephone
+    FROM candidates k
+    JOIN gef g ON g.numero = k.numero
+    LEFT JOIN commune c ON c.code_commu = g.commune_c
+    WHERE g.numero IS DISTINCT FROM :exclude
+""").bindparams(bindparam('phones', type_=ARRAY(String)))
+
+FEATURES = ('nom', 'nif', 'nim', 'telephone', 'email', 'commune')
+
+
+def score_features(features):
+    """Indices d'une paire -> (score, liste des indices relevés)."""
+    score = WEIGHTS['nom'] * float(features.get('nom') or 0)
+    reasons = []
+    if (features.get('nom') or 0) >= COMMUNE_NAME_THRESHOLD:
+        reasons.append(f"nom {float(features['nom']):.2f}")
+    for key in FEATURES[1:]:
+        if features.get(key):
+            score += WEIGHTS[key]
+            reasons.append(key)
+    return round(min(score, 1.0), 3), reasons
+
+
+def _set_name_threshold():
+    db.session.execute(SET_NAME_THRESHOLD_SQL, {'threshold': str(NAME_THRESHOLD)})
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def check_gef_duplicates(n_p, nif=None, nim=None, email=None, commune_c=None, phones=(), exclude=None,
+                         min_score=DEFAULT_MIN_SCORE):
+    """GEFs existants ressemblant à la fiche saisie, du plus probable au moins probable.
+
+    Chaque bloc est lu par index : la vérification reste rapide quelle que soit
+    la taille du registre. `exclude` : numéro du GEF modifié.
+    """
+    _set_name_threshold()
+    rows = db.session.execute(CHECK_SQL, {
+        'n_p': n_p or '', 'nif': _int_or_none(nif), 'nim': _int_or_none(nim), 'email': email or None,
+        'commune_c': _int_or_none(commune_c), 'phones': [p for p in phones if p],
+        'exclude': _int_or_none(exclude), 'commune_threshold': COMMUNE_NAME_THRESHOLD,
+    }).mappings()
+    results = []
+    for row in rows:
+        score, reasons = score_features(row)
+        if score >= min_score:
+            results.append({'numero': row['numero'], 'nom': row['n_p'], 'commune': row['nom_commun'],
+                            'score': score, 'reasons': reasons})
+    results.sort(key=lambda r: (-r['score'], r['numero']))
+    return results[:CHECK_MAX_RESULTS]
+
+
+def duplicates_from_form(form, exclude=None):
+    """check_gef_duplicates() sur les champs du formulaire d'ajout / de modification."""
+    return check_gef_duplicates(
+        form.get('n_p'), nif=form.get('nif'), nim=form.get('nim'), email=form.get('email'),
+        commune_c=form.get('commune_c'), phones=form.getlist('telephone_numero'), exclude=exclude
+    )
+
+
+def describe_duplicates(duplicates):
+    return ', '.join(f"N°{d['numero']} {d['nom']} ({', '.join(d['reasons'])})" for d in duplicates)
+
+
+def candidate_pairs():
+    """Paires candidates de tous les blocs : {(a, b): ensemble des blocs}."""
+    _set_name_threshold()
+    params = {'max_block': EXACT_BLOCK_MAX, 'max_commune_block': COMMUNE_BLOCK_MAX,
+              'commune_threshold': COMMUNE_NAME_THRESHOLD}
+    pairs = {}
+    for block, stmt in BLOCK_SQL.items():
+        for a, b in db.session.execute(stmt, params):
+            pairs.setdefault((a, b), set()).add(block)
+    return pairs
+
+
+def find_duplicate_pairs(min_score=DEFAULT_MIN_SCORE, progress=None):
+    """Rapport complet : paires de GEFs probablement en double, triées par score décroissant.
+
+    `progress(done, total)` est appelé après chaque lot de paires évaluées.
+    """
+    pairs = candidate_pairs()
+    keys = sorted(pairs)
+    results = []
+    for start in range(0, len(keys), SCORE_BATCH):
+        batch = keys[start:start + SCORE_BATCH]
+        rows = db.session.execute(PAIR_FEATURES_SQL, {'a': [a for a, _ in batch], 'b': [b for _, b in batch]})
+        for row in rows.mappings():
+            features = dict(row, telephone='telephone' in pairs[(row['a'], row['b'])])
+            score, reasons = score_features(features)
+            if score >= min_score:
+                results.append({'a': row['a'], 'nom_a': row['nom_a'], 'b': row['b'], 'nom_b': row['nom_b'],
+                                'score': score, 'reasons': reasons})
+        if progress is not None:
+            progress(min(start + SCORE_BATCH, len(keys)), len(keys))
+    results.sort(key=lambda r: (-r['score'], r['a'], r['b']))
+    return results
+
+
+def write_duplicates_report(pairs, path=None):
+    """Rapport CSV des paires de doublons probables ; retourne le chemin écrit."""
+    if path is None:
+        folder = os.path.join(current_app.instance_path, 'reports')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"doublons-{datetime.now():%Y%m%d-%H%M%S}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['score', 'numero_1', 'nom_1', 'numero_2', 'nom_2', 'indices'])
+        for pair in pairs:
+            writer.writerow([pair['score'], pair['a'], pair['nom_a'], pair['b'], pair['nom_b'],
+                             '; '.join(pair['reasons'])])
+    return path
@@ -0,0 +1,158 @@
+# app/export.py
+import csv
+import io
+import json
+import tempfile
+from datetime import date
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from .filters import filter_conditions
+from .models import db, Gef, Commune, Wilaya, Telephone, Personnel, GefEquipement, TypeEquipement, GefAgrement, Agrement
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+# Taille des lots lus depuis le curseur serveur
+EXPORT_BATCH_SIZE = 1000
+
+# Mêmes colonnes et même format de listes que l'import (flask gef import) :
+# un fichier exporté peut être ré-importé tel quel.
+EXPORT_COLUMNS = [
+    'numero', 'n_p', 'email', 'adresse', 'statut_bureau', 'situation', 'nim', 'nif',
+    'date_obt', 'date_naiss', 'observations', 'commune_c', 'commune', 'wilaya', 'nom_wilaya',
+    'lon', 'lat', 'telephones', 'personnel', 'equipements', 'agrements',
+]
+LIST_JOIN = literal('; ')
+
+
+def _child_list(expression, order_by, *where, from_=None):
+    stmt = select(func.string_agg(expression, aggregate_order_by(LIST_JOIN, order_by)))
+    if from_ is not None:
+        stmt = stmt.select_from(from_)
+    return stmt.where(*where).scalar_subquery()
+
+
+def export_statement(criteria, with_geojson=False):
+    """Une ligne par GEF : les listes enfants sont agrégées par Postgres (string_agg)."""
+    telephones = _child_list(
+        func.concat_ws(':', Telephone.type_tel, Telephone.num), Telephone.type_tel,
+        Telephone.n_gef == Gef.numero
+    )
+    personnel = _child_list(
+        func.concat_ws('|', Personnel.nom, Personnel.prenom, Personnel.profile), Personnel.nom,
+        Personnel.n_gef == Gef.numero
+    )
+    equipements = _child_list(
+        func.concat(TypeEquipement.nom_type, ':', GefEquipement.quantite), TypeEquipement.nom_type,
+        GefEquipement.n_gef == Gef.numero,
+        from_=GefEquipement.__table__.join(TypeEquipement.__table__)
+    )
+    agrements = _child_list(
+        Agrement.nom, Agrement.nom,
+        GefAgrement.gef_n == Gef.numero,
+        from_=GefAgrement.__table__.join(Agrement.__table__)
+    )
+    columns = [
+        Gef.numero, Gef.n_p, Gef.email, Gef.adresse, Gef.statut_bureau, Gef.situation,
+        Gef.nim, Gef.nif, Gef.date_obt, Gef.date_naiss, Gef.observations, Gef.commune_c,
+        Commune.nom_commun.label('commune'), Wilaya.code.label('wilaya'), Wilaya.nom_wilaya,
+        func.ST_X(Gef.geom).label('lon'), func.ST_Y(Gef.geom).label('lat'),
+        telephones.label('telephones'), personnel.label('personnel'),
+        equipements.label('equipements'), agrements.label('agrements'),
+    ]
+    if with_geojson:
+        columns.append(func.ST_AsGeoJSON(Gef.geom).label('geometry'))
+    return (
+        select(*columns)
+        .select_from(Gef)
+        .outerjoin(Commune, Gef.commune_c == Commune.code_commu)
+        .outerjoin(Wilaya, Commune.code_wilaya == Wilaya.code)
+        .where(*filter_conditions(criteria))
+        .order_by(Gef.numero)
+    )
+
+
+def iter_export_rows(criteria, with_geojson=False):
+    # yield_per : curseur côté serveur, les lignes arrivent par lots de EXPORT_BATCH_SIZE
+    result = db.session.execute(
+        export_statement(criteria, with_geojson),
+        execution_options={'yield_per': EXPORT_BATCH_SIZE}
+    )
+    try:
+        for row in result:
+            yield row._mapping
+    finally:
+        result.close()
+
+
+def _value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def generate_csv(criteria):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM UTF-8 pour qu'Excel reconnaisse l'encodage
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for row in iter_export_rows(criteria):
+        writer.writerow([_value(row[name]) for name in EXPORT_COLUMNS])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_geojson(criteria):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for row in iter_export_rows(criteria, with_geojson=True):
+        properties = {name: _value(row[name]) for name in EXPORT_COLUMNS if name not in ('lon', 'lat')}
+        # La géométrie arrive déjà sérialisée par ST_AsGeoJSON : insérée telle quelle
+        yield (f'{separator}{{"type": "Feature", "geometry": {row["geometry"] or "null"}, '
+               f'"properties": {json.dumps(properties, ensure_ascii=False)}}}')
+        separator = ','
+    yield ']}'
+
+
+def generate_xlsx(criteria, chunk_size=64 * 1024):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("L'export XLSX nécessite le paquet 'openpyxl' (pip install openpyxl).")
+
+    def stream():
+        # Morceau vide : les en-têtes de la réponse partent avant la lecture des lignes
+        yield b''
+        # Classeur en mode write_only (lignes écrites au fil de l'eau sur disque),
+        # puis fichier renvoyé par morceaux : la mémoire reste constante.
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('GEFs')
+        sheet.append(EXPORT_COLUMNS)
+        for row in iter_export_rows(criteria):
+            sheet.append([row[name] for name in EXPORT_COLUMNS])
+
+        with tempfile.TemporaryFile() as spool:
+            workbook.save(spool)
+            spool.seek(0)
+            while True:
+                data = spool.read(chunk_size)
+                if not data:
+                    break
+                yield data
+    return stream()
+
+
+def export_generator(criteria, export_format):
+    if export_format == 'xlsx':
+        return generate_xlsx(criteria)
+    if export_format == 'geojson':
+        return generate_geojson(criteria)
+    return generate_csv(criteria)
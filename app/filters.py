@@ -0,0 +1,100 @@
+# app/filters.py
+from sqlalchemy import exists, select
+from sqlalchemy.orm import selectinload
+
+from .models import Gef, Commune, Personnel, GefAgrement, GefEquipement
+from .search import folded_contains, prefix_tsquery
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+# Tris autorisés : clé d'URL -> colonnes (le numéro départage toujours pour une pagination stable)
+SORT_OPTIONS = {
+    'numero': (Gef.numero,),
+    '-numero': (Gef.numero.desc(),),
+    'nom': (Gef.n_p, Gef.numero),
+    '-nom': (Gef.n_p.desc(), Gef.numero),
+    'situation': (Gef.situation, Gef.numero),
+    '-situation': (Gef.situation.desc(), Gef.numero),
+}
+DEFAULT_SORT = 'nom'
+
+
+def parse_filter_args(args):
+    """Lit les critères de /gef/filter depuis request.args (ou tout MultiDict équivalent)."""
+    return {
+        'q': (args.get('q') or '').strip() or None,
+        'wilaya': args.get('wilaya', type=int),
+        'commune': args.get('commune', type=int),
+        'agrements': args.getlist('agrements', type=int),
+        'equipements': args.getlist('equipements', type=int),
+        'statut_bureau': args.get('statut_bureau') or None,
+        'situation': args.get('situation') or None,
+        'personnel_nom': args.get('personnel_nom') or None,
+        'personnel_prenom': args.get('personnel_prenom') or None,
+        'personnel_profile': args.get('personnel_profile') or None,
+    }
+
+
+def filter_conditions(criteria):
+    """Traduit les critères en conditions sur `gef`.
+
+    Les tables enfants (agréments, équipements, personnel) sont filtrées par des
+    semi-jointures EXISTS : un GEF n'est jamais dupliqué, donc pas de DISTINCT.
+    """
+    conditions = []
+    if criteria.get('q'):
+        # Recherche libre : tous les mots (préfixes), dans le document indexé ix_gef_search_vector
+        tsquery = prefix_tsquery(criteria['q'])
+        if tsquery is not None:
+            conditions.append(Gef.search_vector.op('@@')(tsquery))
+    if criteria.get('wilaya'):
+        conditions.append(Gef.commune_c.in_(
+            select(Commune.code_commu).where(Commune.code_wilaya == criteria['wilaya'])
+        ))
+    if criteria.get('commune'):
+        conditions.append(Gef.commune_c == criteria['commune'])
+    if criteria.get('statut_bureau'):
+        conditions.append(Gef.statut_bureau == criteria['statut_bureau'])
+    if criteria.get('situation'):
+        conditions.append(Gef.situation == criteria['situation'])
+    if criteria.get('agrements'):
+        conditions.append(exists().where(
+            GefAgrement.gef_n == Gef.numero,
+            GefAgrement.agrement_id.in_(criteria['agrements'])
+        ))
+    if criteria.get('equipements'):
+        conditions.append(exists().where(
+            GefEquipement.n_gef == Gef.numero,
+            GefEquipement.id_type.in_(criteria['equipements'])
+        ))
+
+    # Les critères personnel portent sur une même ligne de personnel ; nom et prénom
+    # sont comparés sans casse ni accents (index trigrammes sur gef_fold(nom / prenom))
+    personnel_conditions = []
+    if criteria.get('personnel_nom'):
+        personnel_conditions.append(folded_contains(Personnel.nom, criteria['personnel_nom']))
+    if criteria.get('personnel_prenom'):
+        personnel_conditions.append(folded_contains(Personnel.prenom, criteria['personnel_prenom']))
+    if criteria.get('personnel_profile'):
+        personnel_conditions.append(Personnel.profile == criteria['personnel_profile'])
+    if personnel_conditions:
+        conditions.append(exists().where(Personnel.n_gef == Gef.numero, *personnel_conditions))
+
+    return conditions
+
+
+def filter_query(criteria, sort=DEFAULT_SORT):
+    return Gef.query.filter(*filter_conditions(criteria)).order_by(*SORT_OPTIONS.get(sort, SORT_OPTIONS[DEFAULT_SORT]))
+
+
+def paginate_gefs(criteria, page=1, per_page=DEFAULT_PER_PAGE, sort=DEFAULT_SORT):
+    """Page de résultats + total (requête COUNT séparée, sans chargement des relations).
+
+    Commune et wilaya ne sont chargées que pour les GEFs de la page, par lots (selectinload).
+    """
+    per_page = max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+    query = filter_query(criteria, sort).options(
+        selectinload(Gef.commune).selectinload(Commune.wilaya)
+    )
+    return query.paginate(page=page, per_page=per_page, error_out=False)
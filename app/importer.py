@@ -0,0 +1,360 @@
+# app/importer.py
+import csv
+import json
+import os
+from datetime import date, datetime
+
+import sqlalchemy as sa
+
+from .models import db, Gef, Personnel, Telephone, GefEquipement, GefAgrement
+from .refdata import load_reference_data
+
+# Format attendu : une ligne par GEF. Les colonnes portent le nom des champs du
+# modèle Gef (numero, n_p, email, adresse, commune_c, ...), plus :
+#   lon, lat      -> géométrie du bureau (SRID 4326)
+#   telephones    -> "Mobile:0550112233; Fixe:021445566"
+#   personnel     -> "Nom|Prénom|Profil; Nom|Prénom|Profil"
+#   equipements   -> "GPS:2; Station totale:1"   (nom du type d'équipement)
+#   agrements     -> "Cadastre; Topographie"      (nom de l'agrément)
+# La commune peut être donnée par son code (commune_c) ou par son nom
+# (commune) accompagné du code de la wilaya (wilaya).
+LIST_SEPARATOR = ';'
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+# Colonnes de gef gérées par l'application, jamais lues depuis le fichier
+EXCLUDED_COLUMNS = {'id', 'geom', 'photo_filename', 'updated_at', 'search_text', 'search_vector'}
+
+
+class RowError(ValueError):
+    pass
+
+
+# --- Lecture en flux ---
+
+def read_rows(path, delimiter=',', encoding='utf-8-sig'):
+    """Itère sur (numéro de ligne, dict) sans charger le fichier en mémoire."""
+    if path.lower().endswith('.xlsx'):
+        yield from _read_xlsx(path)
+        return
+    with open(path, newline='', encoding=encoding) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [_normalize_header(h) for h in next(reader, [])]
+        for line_no, values in enumerate(reader, start=2):
+            if any(v.strip() for v in values):
+                yield line_no, dict(zip(header, values))
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("L'import XLSX nécessite le paquet 'openpyxl' (pip install openpyxl).")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize_header(h) for h in next(rows, ())]
+        for line_no, values in enumerate(rows, start=2):
+            if any(v not in (None, '') for v in values):
+                yield line_no, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _normalize_header(value):
+    return str(value or '').strip().lower()
+
+
+# --- Validation d'une ligne ---
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _coerce(column, value):
+    value = _clean(value)
+    if value is None:
+        return None
+    if isinstance(column.type, sa.Integer):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        try:
+            return int(str(value))
+        except ValueError:
+            raise RowError(f"{column.name} : entier attendu, reçu '{value}'")
+    if isinstance(column.type, sa.Date):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(value), fmt).date()
+            except ValueError:
+                pass
+        raise RowError(f"{column.name} : date invalide '{value}'")
+    value = str(value)
+    length = getattr(column.type, 'length', None)
+    if length and len(value) > length:
+        raise RowError(f"{column.name} : {len(value)} caractères (maximum {length})")
+    return value
+
+
+def _split(value):
+    value = _clean(value)
+    if value is None:
+        return []
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+class RowParser:
+    """Valide une ligne contre les colonnes du modèle Gef et résout les références."""
+
+    def __init__(self, refdata):
+        self.columns = [c for c in Gef.__table__.columns if c.name not in EXCLUDED_COLUMNS]
+        self.communes_by_code = refdata.communes_by_code
+        self.communes_by_name = {
+            (c.code_wilaya, c.nom_commun.strip().lower()): c.code_commu
+            for c in refdata.communes if c.nom_commun
+        }
+        self.equipements_by_name = {t.nom_type.strip().lower(): t.id_type for t in refdata.type_equipements}
+        self.agrements_by_name = {a.nom.strip().lower(): a.id for a in refdata.agrements}
+
+    def parse(self, row):
+        gef = {}
+        for column in self.columns:
+            value = _coerce(column, row.get(column.name))
+            if value is None and column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+            if value is None and not column.nullable:
+                raise RowError(f"{column.name} : valeur obligatoire")
+            gef[column.name] = value
+        if gef['numero'] is None:
+            raise RowError("numero : valeur obligatoire")
+
+        gef['commune_c'] = self._resolve_commune(gef['commune_c'], row)
+        gef['geom'] = self._parse_geom(row)
+
+        numero = gef['numero']
+        return {
+            'gef': gef,
+            'telephones': [self._parse_telephone(numero, item) for item in _split(row.get('telephones'))],
+            'personnel': [self._parse_personnel(numero, item) for item in _split(row.get('personnel'))],
+            'equipements': self._parse_equipements(numero, _split(row.get('equipements'))),
+            'agrements': self._parse_agrements(numero, _split(row.get('agrements'))),
+        }
+
+    def _resolve_commune(self, code, row):
+        if code is not None:
+            if code not in self.communes_by_code:
+                raise RowError(f"commune_c : commune {code} inconnue")
+            return code
+        name = _clean(row.get('commune'))
+        if name is None:
+            return None
+        try:
+            wilaya = int(str(_clean(row.get('wilaya'))))
+        except ValueError:
+            raise RowError("wilaya : code wilaya requis pour résoudre la commune par son nom")
+        code = self.communes_by_name.get((wilaya, str(name).lower()))
+        if code is None:
+            raise RowError(f"commune : '{name}' introuvable dans la wilaya {wilaya}")
+        return code
+
+    def _parse_geom(self, row):
+        lon, lat = _clean(row.get('lon')), _clean(row.get('lat'))
+        if lon is None and lat is None:
+            return None
+        try:
+            lon, lat = float(lon), float(lat)
+        except (TypeError, ValueError):
+            raise RowError("lon/lat : coordonnées invalides")
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise RowError("lon/lat : coordonnées hors limites")
+        return f"SRID=4326;POINT({lon} {lat})"
+
+    def _parse_telephone(self, numero, item):
+        type_tel, _, num = item.rpartition(':')
+        if not num.strip():
+            raise RowError(f"telephones : numéro manquant dans '{item}'")
+        return {'type_tel': type_tel.strip() or None, 'num': num.strip(), 'n_gef': numero}
+
+    def _parse_personnel(self, numero, item):
+        parts = [p.strip() for p in item.split('|')]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            raise RowError(f"personnel : 'Nom|Prénom|Profil' attendu, reçu '{item}'")
+        profile = parts[2] if len(parts) > 2 and parts[2] else None
+        return {'nom': parts[0], 'prenom': parts[1], 'profile': profile, 'n_gef': numero}
+
+    def _parse_equipements(self, numero, items):
+        quantities = {}
+        for item in items:
+            name, _, quantite = item.partition(':')
+            id_type = self.equipements_by_name.get(name.strip().lower())
+            if id_type is None:
+                raise RowError(f"equipements : type '{name.strip()}' inconnu")
+            try:
+                quantite = int(quantite) if quantite.strip() else 1
+            except ValueError:
+                raise RowError(f"equipements : quantité invalide dans '{item}'")
+            # (n_gef, id_type) est la clé primaire : on cumule les doublons
+            quantities[id_type] = quantities.get(id_type, 0) + quantite
+        return [{'n_gef': numero, 'id_type': id_type, 'quantite': q} for id_type, q in quantities.items()]
+
+    def _parse_agrements(self, numero, items):
+        ids = []
+        for name in items:
+            agrement_id = self.agrements_by_name.get(name.lower())
+            if agrement_id is None:
+                raise RowError(f"agrements : agrément '{name}' inconnu")
+            if agrement_id not in ids:
+                ids.append(agrement_id)
+        return [{'gef_n': numero, 'agrement_id': agrement_id} for agrement_id in ids]
+
+
+# --- Écriture par lots ---
+
+def _insert_records(records):
+    gefs = [r['gef'] for r in records]
+    children = (
+        (Telephone, [c for r in records for c in r['telephones']]),
+        (Personnel, [c for r in records for c in r['personnel']]),
+        (GefEquipement, [c for r in records for c in r['equipements']]),
+        (GefAgrement, [c for r in records for c in r['agrements']]),
+    )
+    # executemany : SQLAlchemy regroupe les lignes en INSERT multi-lignes
+    db.session.execute(sa.insert(Gef), gefs)
+    for model, rows in children:
+        if rows:
+            db.session.execute(sa.insert(model), rows)
+
+
+class ImportProgress:
+    """Progression persistée à côté du fichier importé, pour reprendre après interruption."""
+
+    def __init__(self, path):
+        self.path = f"{path}.progress.json"
+        stat = os.stat(path)
+        self.signature = {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+        self.last_line = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('signature') == self.signature:
+            self.last_line = state.get('last_line', 0)
+
+    def save(self, last_line):
+        self.last_line = last_line
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'signature': self.signature, 'last_line': last_line}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ImportReport:
+    def __init__(self, errors_path):
+        self.imported = 0
+        self.failed = 0
+        self.skipped = 0
+        self._file = open(errors_path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(['ligne', 'numero', 'erreur'])
+
+    def error(self, line_no, numero, message):
+        self.failed += 1
+        self._writer.writerow([line_no, numero if numero is not None else '', message])
+
+    def close(self):
+        self._file.close()
+
+
+def import_gefs(path, batch_size=1000, errors_path=None, resume=True, delimiter=',', echo=print):
+    """Importe un fichier CSV/XLSX de GEFs par lots, une transaction par lot.
+
+    Les lignes invalides sont écrites dans le rapport d'erreurs et n'interrompent
+    pas l'import ; la progression est enregistrée après chaque lot validé.
+    """
+    parser = RowParser(load_reference_data())
+    progress = ImportProgress(path)
+    if resume:
+        progress.load()
+    else:
+        progress.clear()
+    report = ImportReport(errors_path or f"{path}.errors.csv")
+    if progress.last_line:
+        echo(f"Reprise après la ligne {progress.last_line}.")
+
+    seen = set()
+    chunk = []
+    try:
+        for line_no, row in read_rows(path, delimiter=delimiter):
+            if line_no <= progress.last_line:
+                report.skipped += 1
+                continue
+            numero = _clean(row.get('numero'))
+            try:
+                record = parser.parse(row)
+            except RowError as e:
+                report.error(line_no, numero, str(e))
+                continue
+            if record['gef']['numero'] in seen:
+                report.error(line_no, numero, "numero : doublon dans le fichier")
+                continue
+            seen.add(record['gef']['numero'])
+            chunk.append((line_no, record))
+            if len(chunk) >= batch_size:
+                _flush(chunk, report, progress, echo)
+                chunk = []
+        if chunk:
+            _flush(chunk, report, progress, echo)
+        progress.clear()
+    finally:
+        report.close()
+    return report
+
+
+def _flush(chunk, report, progress, echo):
+    # Les numéros déjà présents en base sont rejetés avant l'écriture du lot
+    numeros = [record['gef']['numero'] for _, record in chunk]
+    existing = set(db.session.execute(
+        sa.select(Gef.numero).where(Gef.numero.in_(numeros))
+    ).scalars())
+    pending = []
+    for line_no, record in chunk:
+        if record['gef']['numero'] in existing:
+            report.error(line_no, record['gef']['numero'], "numero : GEF déjà existant en base")
+        else:
+            pending.append((line_no, record))
+
+    try:
+        if pending:
+            _insert_records([record for _, record in pending])
+        db.session.commit()
+        report.imported += len(pending)
+    except Exception:
+        # Lot refusé : on rejoue ligne par ligne (savepoints) pour isoler les fautives
+        db.session.rollback()
+        for line_no, record in pending:
+            try:
+                with db.session.begin_nested():
+                    _insert_records([record])
+                report.imported += 1
+            except Exception as e:
+                report.error(line_no, record['gef']['numero'], str(getattr(e, 'orig', e)).strip())
+        db.session.commit()
+
+    progress.save(chunk[-1][0])
+    echo(f"Ligne {chunk[-1][0]} : {report.imported} GEF(s) importé(s), {report.failed} erreur(s).")
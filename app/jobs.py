@@ -0,0 +1,509 @@
+# app/jobs.py
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import secure_filename
+
+from .commune_match import check_communes, write_report
+from .coverage import refresh_coverage, invalidate_coverage
+from .duplicates import find_duplicate_pairs, write_duplicates_report, DEFAULT_MIN_SCORE
+from .export import export_generator, EXPORT_FORMATS
+from .filters import parse_filter_args
+from .importer import import_gefs
+from .models import db, Job
+from .photos import allowed_file, generate_variants, variant_path, PHOTO_VARIANTS
+from .spatial import clear_tile_cache
+from .sync import build_snapshot, snapshot_path
+
+# Tâches de fond (exports complets, retraitement des photos, imports, rapports) :
+# la table job sert de file d'attente, sans autre intermédiaire que Postgres.
+# "flask gef worker" lance un groupe de threads qui réservent les tâches en
+# attente (FOR UPDATE SKIP LOCKED : une tâche n'est prise que par un seul
+# thread, quel que soit le nombre de workers), les exécutent par lots et
+# enregistrent après chaque lot progression et point de reprise. Les fichiers
+# produits sont écrits dans instance/jobs/<id>/ et téléchargés via l'API.
+#
+# Une tâche dont le worker ne donne plus signe de vie (heartbeat) est remise en
+# file et reprend à son dernier point de reprise ; un arrêt propre du worker
+# (Ctrl+C, SIGTERM) remet de même en file les tâches en cours.
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+JOBS_SUBFOLDER = 'jobs'
+# Intervalle (secondes) du heartbeat, de la détection des tâches abandonnées et de la purge
+HEARTBEAT_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+CLAIM_JOB_SQL = text("""
+    UPDATE job SET status = 'running', worker = :worker, attempts = attempts + 1,
+                   started_at = COALESCE(started_at, now()), heartbeat_at = now()
+    WHERE id = (
+        SELECT id FROM job WHERE status = 'queued' ORDER BY id
+        FOR UPDATE SKIP LOCKED LIMIT 1
+    )
+    RETURNING id, kind, params, checkpoint
+""")
+
+# Verrou transactionnel par type de tâche (submit_unique_job), libéré au commit ou à l'annulation
+SUBMIT_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('job:' || :kind))")
+
+PROGRESS_SQL = text("""
+    UPDATE job SET progress_done = COALESCE(:done, progress_done),
+                   progress_total = COALESCE(:total, progress_total),
+                   checkpoint = COALESCE(CAST(:checkpoint AS jsonb), checkpoint),
+                   message = COALESCE(:message, message),
+                   heartbeat_at = now()
+    WHERE id = :id
+    RETURNING cancel_requested
+""")
+
+FINISH_SQL = text("""
+    UPDATE job SET status = :status, result = CAST(:result AS jsonb), artifact = :artifact,
+                   error = :error, message = COALESCE(:message, message), worker = NULL, finished_at = now()
+    WHERE id = :id
+""")
+
+REQUEUE_SQL = text("UPDATE job SET status = 'queued', worker = NULL WHERE id = :id AND status = 'running'")
+
+HEARTBEAT_SQL = text("UPDATE job SET heartbeat_at = now() WHERE worker = :worker AND status = 'running'")
+
+# Tâches dont le worker a disparu : remises en file, ou en échec après trop de tentatives
+REQUEUE_STALE_SQL = text("""
+    UPDATE job SET
+        status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'queued' END,
+        error = CASE WHEN attempts >= :max_attempts THEN 'Worker interrompu à chaque tentative' END,
+        finished_at = CASE WHEN attempts >= :max_attempts THEN now() END,
+        worker = NULL
+    WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => :stale_after)
+    RETURNING id, status
+""")
+
+PURGE_SQL = text("""
+    DELETE FROM job
+    WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < now() - make_interval(days => :days)
+    RETURNING id
+""")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobInterrupted(Exception):
+    pass
+
+
+# Type de tâche : libellé, fonction d'exécution run(context) -> résultat (dict),
+# validation des paramètres à la soumission (None si aucune)
+JobType = namedtuple('JobType', ['label', 'run', 'validate'])
+JOB_TYPES = {}
+
+
+def job_type(name, label, validate=None):
+    def register(run):
+        JOB_TYPES[name] = JobType(label, run, validate)
+        return run
+    return register
+
+
+def job_directory(job_id):
+    return os.path.join(current_app.instance_path, JOBS_SUBFOLDER, str(job_id))
+
+
+def artifact_path(job):
+    """Chemin du fichier produit par une tâche terminée, ou None."""
+    if job.status != STATUS_DONE or not job.artifact:
+        return None
+    path = os.path.join(job_directory(job.id), job.artifact)
+    return path if os.path.exists(path) else None
+
+
+class JobContext:
+    """Passé à la fonction d'exécution : paramètres, point de reprise, progression, fichiers."""
+
+    def __init__(self, job_id, params, checkpoint, stop_event=None):
+        self.job_id = job_id
+        self.params = params or {}
+        self.checkpoint = checkpoint
+        self.directory = job_directory(job_id)
+        self.artifact = None
+        self._stop_event = stop_event
+        os.makedirs(self.directory, exist_ok=True)
+
+    def artifact_path(self, filename):
+        """Déclare le fichier produit par la tâche et retourne son chemin."""
+        self.artifact = secure_filename(filename)
+        return os.path.join(self.directory, self.artifact)
+
+    def progress(self, done=None, total=None, checkpoint=None, message=None):
+        """Enregistre l'avancement (et le point de reprise) après un lot.
+
+        Enregistré sur une connexion distincte de la session de la tâche ;
+        lève JobCancelled si l'annulation a été demandée, JobInterrupted si le
+        worker s'arrête.
+        """
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        with db.engine.begin() as conn:
+            cancel_requested = conn.execute(PROGRESS_SQL, {
+                'id': self.job_id, 'done': done, 'total': total, 'message': message,
+                'checkpoint': json.dumps(checkpoint) if checkpoint is not None else None,
+            }).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+        if self._stop_event is not None and self._stop_event.is_set():
+            raise JobInterrupted()
+
+
+# --- Soumission et consultation ---
+
+def submit_job(kind, params=None, upload=None):
+    """Met une tâche en file ; `upload` (FileStorage) est enregistré dans le dossier de la tâche."""
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Type de tâche inconnu : {kind} (attendu : {', '.join(JOB_TYPES)})")
+    params = dict(params or {})
+    # Le fichier d'entrée ne peut venir que de l'envoi, jamais d'un chemin fourni par le client
+    params.pop('input', None)
+    job = Job(kind=kind, params=dict(params), status=STATUS_QUEUED, cancel_requested=False,
+              progress_done=0, attempts=0)
+    try:
+        db.session.add(job)
+        db.session.flush()
+        if upload is not None and upload.filename:
+            filename = secure_filename(upload.filename)
+            if not filename:
+                raise ValueError("Nom de fichier invalide")
+            os.makedirs(job_directory(job.id), exist_ok=True)
+            upload.save(os.path.join(job_directory(job.id), filename))
+            params['input'] = filename
+        if JOB_TYPES[kind].validate is not None:
+            JOB_TYPES[kind].validate(params)
+        job.params = params
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if job.id is not None:
+            shutil.rmtree(job_directory(job.id), ignore_errors=True)
+        raise
+    return job
+
+
+def get_job(job_id):
+    return db.session.get(Job, job_id)
+
+
+def submit_unique_job(kind, params=None):
+    """Comme submit_job, sauf si une tâche de ce type est déjà en attente ou en cours (retournée telle quelle)."""
+    # Vérification et insertion sous le même verrou : deux workers web ne peuvent
+    # pas constater ensemble l'absence de tâche (le commit de submit_job le libère)
+    db.session.execute(SUBMIT_LOCK_SQL, {'kind': kind})
+    job = Job.query.filter(Job.kind == kind, Job.status.in_((STATUS_QUEUED, STATUS_RUNNING))) \
+        .order_by(Job.id).first()
+    if job is not None:
+        db.session.rollback()
+        return job
+    return submit_job(kind, params)
+
+
+def list_jobs(status=None, limit=50):
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    return query.order_by(Job.id.desc()).limit(limit).all()
+
+
+def cancel_job(job_id):
+    """Annule une tâche en attente ; une tâche en cours s'arrête à son prochain lot."""
+    job = get_job(job_id)
+    if job is None or job.status in FINISHED_STATUSES:
+        return job
+    job.cancel_requested = True
+    if job.status == STATUS_QUEUED:
+        job.status = STATUS_CANCELLED
+        job.finished_at = db.func.now()
+    db.session.commit()
+    return get_job(job_id)
+
+
+def job_document(job):
+    percent = None
+    if job.progress_total:
+        percent = round(100.0 * job.progress_done / job.progress_total, 1)
+    return {
+        'id': job.id,
+        'type': job.kind,
+        'label': JOB_TYPES[job.kind].label if job.kind in JOB_TYPES else job.kind,
+        'status': job.status,
+        'params': job.params,
+        'progress': {'done': job.progress_done, 'total': job.progress_total, 'percent': percent},
+        'message': job.message,
+        'result': job.result,
+        'error': job.error,
+        'artifact': job.artifact if job.status == STATUS_DONE else None,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# --- Exécution ---
+
+def claim_job(worker_id):
+    with db.engine.begin() as conn:
+        return conn.execute(CLAIM_JOB_SQL, {'worker': worker_id}).first()
+
+
+def _finish(job_id, status, result=None, artifact=None, error=None, message=None):
+    with db.engine.begin() as conn:
+        conn.execute(FINISH_SQL, {
+            'id': job_id, 'status': status, 'result': json.dumps(result) if result is not None else None,
+            'artifact': artifact, 'error': error, 'message': message,
+        })
+
+
+def run_job(row, stop_event=None):
+    """Exécute une tâche réservée (ligne de CLAIM_JOB_SQL) et enregistre son issue."""
+    context = JobContext(row.id, row.params, row.checkpoint, stop_event)
+    try:
+        result = JOB_TYPES[row.kind].run(context)
+        db.session.commit()
+        _finish(row.id, STATUS_DONE, result=result, artifact=context.artifact, message="Terminé")
+        return STATUS_DONE
+    except JobCancelled:
+        db.session.rollback()
+        _finish(row.id, STATUS_CANCELLED, message="Annulée")
+        return STATUS_CANCELLED
+    except JobInterrupted:
+        # Reprise au dernier point de reprise par le prochain worker
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(REQUEUE_SQL, {'id': row.id})
+        return STATUS_QUEUED
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Tâche %s (%s) en échec", row.id, row.kind)
+        _finish(row.id, STATUS_FAILED, error=str(e) or e.__class__.__name__)
+        return STATUS_FAILED
+    finally:
+        db.session.remove()
+
+
+class JobWorker:
+    """Groupe de threads exécutant les tâches en file, avec heartbeat et reprise des tâches abandonnées."""
+
+    def __init__(self, app, threads=None, echo=print):
+        self.app = app
+        self.threads = threads or app.config.get('JOB_WORKERS', 2)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 2)
+        self.echo = echo
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, once=False):
+        """Traite la file jusqu'à stop() ; avec `once`, s'arrête quand la file est vide."""
+        threads = [
+            threading.Thread(target=self._loop, args=(once,), name=f'job-worker-{i}')
+            for i in range(self.threads)
+        ]
+        housekeeping = threading.Thread(target=self._housekeeping, name='job-heartbeat', daemon=True)
+        housekeeping.start()
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.echo("Arrêt demandé : les tâches en cours reprendront au dernier point de reprise.")
+            self.stop()
+            for thread in threads:
+                thread.join()
+        self.stop()
+
+    def _loop(self, once):
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                try:
+                    row = claim_job(self.worker_id)
+                except Exception as e:
+                    logger.warning("Réservation d'une tâche impossible : %s", e)
+                    row = None
+                if row is None:
+                    if once:
+                        return
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                self.echo(f"Tâche {row.id} ({row.kind}) démarrée.")
+                status = run_job(row, self.stop_event)
+                self.echo(f"Tâche {row.id} ({row.kind}) : {status}.")
+
+    def _housekeeping(self):
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    logger.warning("Heartbeat des tâches impossible : %s", e)
+                self.stop_event.wait(HEARTBEAT_INTERVAL)
+
+    def heartbeat(self):
+        config = self.app.config
+        with db.engine.begin() as conn:
+            conn.execute(HEARTBEAT_SQL, {'worker': self.worker_id})
+            for job_id, status in conn.execute(REQUEUE_STALE_SQL, {
+                'stale_after': config.get('JOB_STALE_AFTER', 300),
+                'max_attempts': config.get('JOB_MAX_ATTEMPTS', 3),
+            }):
+                self.echo(f"Tâche {job_id} abandonnée par son worker : {status}.")
+            purged = conn.execute(PURGE_SQL, {'days': config.get('JOB_RETENTION_DAYS', 7)}).scalars().all()
+        for job_id in purged:
+            shutil.rmtree(job_directory(job_id), ignore_errors=True)
+
+
+# --- Types de tâches ---
+
+# Lot de photos traitées entre deux points de reprise
+PHOTO_BATCH = 50
+# Nombre maximal d'échecs détaillés dans le résultat
+MAX_REPORTED_ERRORS = 100
+
+
+def _validate_export(params):
+    if params.get('format', 'csv') not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {params.get('format')}")
+
+
+@job_type('export', "Export du registre", validate=_validate_export)
+def run_export(context):
+    # Critères de /gef/filter (mêmes noms de paramètres) ; sans critère : tout le registre.
+    # Un export interrompu est repris du début (le fichier est réécrit).
+    export_format = context.params.get('format', 'csv')
+    criteria = parse_filter_args(MultiDict(context.params.get('criteria') or {}))
+    path = context.artifact_path(f"gefs.{EXPORT_FORMATS[export_format][1]}")
+    written = 0
+    with open(path, 'wb') as f:
+        for chunk in export_generator(criteria, export_format):
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            f.write(data)
+            previous, written = written, written + len(data)
+            # Avancement tous les 1 Mo environ
+            if written // 2 ** 20 != previous // 2 ** 20:
+                context.progress(done=written, message=f"{written / 2 ** 20:.0f} Mo écrits")
+    context.progress(done=written, total=written)
+    db.session.rollback()
+    return {'format': export_format, 'size': written}
+
+
+@job_type('photos', "Retraitement des photos")
+def run_photos(context):
+    # Recrée les variantes de toutes les photos de instance/uploads ;
+    # avec force=true, les variantes existantes sont d'abord supprimées.
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    force = bool(context.params.get('force'))
+    photos = sorted(name for name in os.listdir(upload_folder)
+                    if allowed_file(name) and os.path.isfile(os.path.join(upload_folder, name)))
+    state = context.checkpoint or {'after': '', 'processed': 0, 'errors': []}
+    pending = [name for name in photos if name > state['after']]
+    done = len(photos) - len(pending)
+
+    for start in range(0, len(pending), PHOTO_BATCH):
+        batch = pending[start:start + PHOTO_BATCH]
+        for filename in batch:
+            try:
+                if force:
+                    for variant in PHOTO_VARIANTS:
+                        target = variant_path(upload_folder, filename, variant)
+                        if os.path.exists(target):
+                            os.remove(target)
+                generate_variants(upload_folder, filename)
+                state['processed'] += 1
+            except ImportError:
+                raise RuntimeError("Le retraitement des photos nécessite le paquet 'Pillow' (pip install Pillow).")
+            except Exception as e:
+                if len(state['errors']) < MAX_REPORTED_ERRORS:
+                    state['errors'].append({'photo': filename, 'error': str(e)})
+        done += len(batch)
+        state['after'] = batch[-1]
+        context.progress(done=done, total=len(photos), checkpoint=state,
+                         message=f"{done} / {len(photos)} photo(s)")
+    return {'photos': len(photos), 'processed': state['processed'], 'errors': state['errors']}
+
+
+def _validate_import(params):
+    if not params.get('input'):
+        raise ValueError("Fichier à importer manquant (champ 'file')")
+    if not params['input'].lower().endswith(('.csv', '.xlsx')):
+        raise ValueError("Format d'import non pris en charge (CSV ou XLSX)")
+
+
+@job_type('import', "Import de GEFs", validate=_validate_import)
+def run_import(context):
+    # Le fichier est celui envoyé à la soumission ; la reprise s'appuie sur la
+    # progression enregistrée par l'importeur après chaque lot validé.
+    path = os.path.join(context.directory, context.params['input'])
+    errors_path = context.artifact_path('erreurs.csv')
+
+    def echo(message):
+        context.progress(message=message)
+
+    report = import_gefs(path, batch_size=int(context.params.get('batch_size') or 1000),
+                         errors_path=errors_path, resume=True,
+                         delimiter=context.params.get('delimiter') or ',', echo=echo)
+    if report.imported:
+        refresh_coverage()
+        db.session.commit()
+        invalidate_coverage()
+        clear_tile_cache()
+    return {'imported': report.imported, 'failed': report.failed, 'skipped': report.skipped}
+
+
+@job_type('communes_report', "Rapport de rattachement des communes")
+def run_communes_report(context):
+    # Contrôle spatial de tout le registre (ou d'une wilaya) : rapport CSV des GEFs non conformes
+    wilaya = context.params.get('wilaya')
+    context.progress(message="Jointure spatiale en cours")
+    summary, rows = check_communes(int(wilaya) if wilaya else None)
+    write_report(rows, context.artifact_path('communes.csv'))
+    db.session.rollback()
+    return summary
+
+
+@job_type('duplicates', "Rapport des doublons probables")
+def run_duplicates(context):
+    # Paires candidates par blocs (voir duplicates.py), puis score par lots de paires
+    min_score = float(context.params.get('min_score') or DEFAULT_MIN_SCORE)
+    context.progress(message="Recherche des paires candidates")
+
+    def progress(done, total):
+        context.progress(done=done, total=total, message=f"{done} / {total} paire(s) évaluée(s)")
+
+    pairs = find_duplicate_pairs(min_score, progress=progress)
+    write_duplicates_report(pairs, context.artifact_path('doublons.csv'))
+    db.session.rollback()
+    return {'pairs': len(pairs), 'min_score': min_score}
+
+
+@job_type('snapshot', "Instantané de synchronisation")
+def run_snapshot(context):
+    # Reconstruit le fichier servi par /api/sync/snapshot (remplacé d'un bloc à la fin)
+    context.progress(message="Écriture de l'instantané")
+    cursor, count = build_snapshot(snapshot_path())
+    return {'cursor': cursor, 'gefs': count}
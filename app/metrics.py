@@ -0,0 +1,268 @@
+# app/metrics.py
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, has_request_context, request, request_started
+from sqlalchemy import event
+
+from .models import db
+
+# Instrumentation : nombre de requêtes SQL, temps SQL et latence par endpoint,
+# journal des requêtes lentes, exposition au format texte Prometheus (/metrics)
+# et en-tête Server-Timing optionnel.
+# Les métriques sont tenues en mémoire, par processus. Avec plusieurs workers
+# (gunicorn), chacun recopie les siennes dans METRICS_DIR/<pid>.json au plus
+# toutes les METRICS_DUMP_INTERVAL secondes ; /metrics additionne les fichiers
+# de tous les workers, quel que soit celui qui répond.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger('app.sql.slow')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+        return total
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        items = sorted((self.snapshot() if values is None else values).items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # clé des étiquettes -> [compteurs par intervalle, somme, nombre]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for key, (counts, value_sum, count) in values.items():
+            entry = total.setdefault(key, [[0] * len(counts), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+            entry[2] += count
+        return total
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        items = sorted((self.snapshot() if values is None else values).items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    'gef_http_request_duration_seconds', "Durée de traitement des requêtes HTTP.",
+    ('endpoint', 'method', 'status')
+)
+REQUEST_QUERIES = Histogram(
+    'gef_http_request_sql_queries', "Nombre de requêtes SQL exécutées par requête HTTP.",
+    ('endpoint',), buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_SQL_TIME = Histogram(
+    'gef_http_request_sql_duration_seconds', "Temps SQL cumulé par requête HTTP.",
+    ('endpoint',)
+)
+SQL_QUERIES = Counter('gef_sql_queries_total', "Requêtes SQL exécutées (y compris hors requête HTTP).")
+SQL_SLOW_QUERIES = Counter('gef_sql_slow_queries_total', "Requêtes SQL dépassant SLOW_QUERY_THRESHOLD_MS.")
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_SQL_TIME, SQL_QUERIES, SQL_SLOW_QUERIES]
+
+
+_last_dump = 0.0
+
+
+def dump_metrics(directory):
+    """Recopie les métriques du processus dans <directory>/<pid>.json (remplacement atomique)."""
+    global _last_dump
+    _last_dump = time.monotonic()
+    document = {
+        metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+        for metric in REGISTRY
+    }
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(document, f)
+    os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+
+
+def _merged_values(directory):
+    merged = {metric.name: {} for metric in REGISTRY}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                document = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric in REGISTRY:
+            values = {tuple(key): value for key, value in document.get(metric.name, ())}
+            metric.merge(merged[metric.name], values)
+    return merged
+
+
+def render_metrics(directory=None):
+    """Toutes les métriques au format d'exposition texte Prometheus (version 0.0.4).
+
+    Avec `directory` (METRICS_DIR) : somme des métriques de tous les workers.
+    """
+    merged = None
+    if directory:
+        dump_metrics(directory)
+        merged = _merged_values(directory)
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(None if merged is None else merged[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+def clear_metrics_dir(directory):
+    """Supprime les métriques d'une exécution précédente (au démarrage du serveur)."""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _truncate(value, limit=1000):
+    value = str(value)
+    return value if len(value) <= limit else value[:limit] + '…'
+
+
+def init_metrics(app):
+    """Branche les événements du moteur SQLAlchemy et les signaux de requête Flask."""
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000.0
+    log_parameters = app.config.get('SLOW_QUERY_LOG_PARAMS', False)
+    server_timing = app.config.get('SERVER_TIMING', False)
+    metrics_dir = app.config.get('METRICS_DIR')
+    dump_interval = app.config.get('METRICS_DUMP_INTERVAL', 5)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        SQL_QUERIES.inc()
+        if has_request_context() and 'sql_query_count' in g:
+            g.sql_query_count += 1
+            g.sql_time += elapsed
+        if elapsed >= threshold:
+            SQL_SLOW_QUERIES.inc()
+            endpoint = request.endpoint if has_request_context() else None
+            if log_parameters:
+                slow_query_logger.warning(
+                    "Requête lente (%.1f ms, endpoint=%s) : %s | paramètres : %s",
+                    elapsed * 1000, endpoint, _truncate(statement), _truncate(parameters)
+                )
+            else:
+                slow_query_logger.warning(
+                    "Requête lente (%.1f ms, endpoint=%s) : %s", elapsed * 1000, endpoint, _truncate(statement)
+                )
+
+    def on_request_started(sender, **extra):
+        g.request_start_time = time.perf_counter()
+        g.sql_query_count = 0
+        g.sql_time = 0.0
+
+    def after_request(response):
+        if 'request_start_time' not in g:
+            return response
+        # Pour les réponses en flux (exports), seule la préparation de la réponse est mesurée
+        elapsed = time.perf_counter() - g.request_start_time
+        endpoint = request.endpoint or 'inconnu'
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+        REQUEST_QUERIES.observe(g.sql_query_count, endpoint=endpoint)
+        REQUEST_SQL_TIME.observe(g.sql_time, endpoint=endpoint)
+        if metrics_dir and time.monotonic() - _last_dump >= dump_interval:
+            try:
+                dump_metrics(metrics_dir)
+            except OSError as e:
+                app.logger.warning(f"Écriture des métriques impossible : {e}")
+        if server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'sql;dur={g.sql_time * 1000:.1f};desc="{g.sql_query_count} SQL", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    request_started.connect(on_request_started, app, weak=False)
+    app.after_request(after_request)
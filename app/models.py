@@ -1,6 +1,7 @@
 # app/models.py
 from flask_sqlalchemy import SQLAlchemy
 from geoalchemy2 import Geometry
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -20,7 +21,9 @@ class Commune(db.Model):
     __tablename__ = 'commune'
     code_commu = db.Column(db.Integer, primary_key=True)
     nom_commun = db.Column(db.String(100))
-    code_wilaya = db.Column(db.Integer, db.ForeignKey('wilaya.code'))
+    code_wilaya = db.Column(db.Integer, db.ForeignKey('wilaya.code'), index=True)
+    # Limites communales (flask gef commune-boundaries) ; différées : jamais chargées avec la commune
+    geom = db.deferred(db.Column(Geometry(geometry_type='MULTIPOLYGON', srid=4326)))
     
     # Many-to-1: This Commune belongs to one Wilaya
     wilaya = db.relationship('Wilaya', back_populates='communes')
@@ -31,6 +34,22 @@ class Commune(db.Model):
 
 class Gef(db.Model):
     __tablename__ = 'gef'
+    __table_args__ = (
+        # Recherche par sous-chaîne du nom (pg_trgm) et pagination par clé (n_p, numero)
+        db.Index('ix_gef_n_p_trgm', 'n_p', postgresql_using='gin', postgresql_ops={'n_p': 'gin_trgm_ops'}),
+        db.Index('ix_gef_n_p_numero', 'n_p', 'numero'),
+        # Recherche par préfixe du numéro
+        db.Index('ix_gef_numero_text', db.text('(numero::text) text_pattern_ops')),
+        # Recherche plein texte (tsvector pondéré) et approchée (trigrammes, sans accents)
+        db.Index('ix_gef_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_gef_search_text_trgm', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        # Clés de blocage de la détection des doublons (voir duplicates.py)
+        db.Index('ix_gef_name_key_trgm', db.text('gef_name_key(n_p) gin_trgm_ops'), postgresql_using='gin'),
+        db.Index('ix_gef_nif', 'nif', postgresql_where=db.text('nif IS NOT NULL')),
+        db.Index('ix_gef_nim', 'nim', postgresql_where=db.text('nim IS NOT NULL')),
+        db.Index('ix_gef_commune_c', 'commune_c'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     numero = db.Column(db.Integer, unique=True)
     n_p = db.Column(db.String(100), nullable=False)
@@ -50,6 +69,14 @@ class Gef(db.Model):
     
     # ✅ AJOUTÉ : Champ pour la photo
     photo_filename = db.Column(db.String(255), nullable=True)
+
+    # Horodatage de la dernière modification (sert d'ETag / Last-Modified pour l'API)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+
+    # Documents de recherche, maintenus par les triggers gef_search_refresh / personnel_search_refresh
+    # (jamais écrits par l'application, chargés uniquement à la demande)
+    search_text = db.deferred(db.Column(db.Text))
+    search_vector = db.deferred(db.Column(TSVECTOR))
     
     # Many-to-1: This Gef belongs to one Commune
     commune = db.relationship('Commune', back_populates='gefs')
@@ -69,22 +96,31 @@ class Gef(db.Model):
 
 class Telephone(db.Model):
     __tablename__ = 'telephones'
+    __table_args__ = (
+        # Numéro normalisé (chiffres, 9 derniers) : détection des doublons
+        db.Index('ix_telephones_phone_key', db.text('gef_phone_key(num)')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     type_tel = db.Column(db.String(30))
     num = db.Column(db.String(50), nullable=False)
-    n_gef = db.Column(db.Integer, db.ForeignKey('gef.numero'))
+    n_gef = db.Column(db.Integer, db.ForeignKey('gef.numero'), index=True)
     
     # Many-to-1: This Telephone belongs to one Gef
     gef = db.relationship('Gef', back_populates='telephones')
 
 class Personnel(db.Model):
     __tablename__ = 'personnel'
+    __table_args__ = (
+        # Recherche par sous-chaîne insensible à la casse et aux accents (gef_fold, pg_trgm)
+        db.Index('ix_personnel_nom_trgm', db.text('gef_fold(nom) gin_trgm_ops'), postgresql_using='gin'),
+        db.Index('ix_personnel_prenom_trgm', db.text('gef_fold(prenom) gin_trgm_ops'), postgresql_using='gin'),
+    )
     id_personnel = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False)
     prenom = db.Column(db.String(100), nullable=False)
     date_debut_travail = db.Column(db.Date)
     profile = db.Column(db.String(200))
-    n_gef = db.Column(db.Integer, db.ForeignKey('gef.numero'))
+    n_gef = db.Column(db.Integer, db.ForeignKey('gef.numero'), index=True)
     
     # Many-to-1: This Personnel belongs to one Gef
     gef = db.relationship('Gef', back_populates='personnels')
@@ -103,7 +139,7 @@ class TypeEquipement(db.Model):
 class GefEquipement(db.Model):
     __tablename__ = 'gef_equipement'
     n_gef = db.Column(db.Integer, db.ForeignKey('gef.numero'), primary_key=True)
-    id_type = db.Column(db.Integer, db.ForeignKey('type_equipement.id_type'), primary_key=True)
+    id_type = db.Column(db.Integer, db.ForeignKey('type_equipement.id_type'), primary_key=True, index=True)
     quantite = db.Column(db.Integer, default=1)
     
     # Many-to-1: This link object points to one Gef
@@ -124,11 +160,88 @@ class Agrement(db.Model):
 
 class GefAgrement(db.Model):
     __tablename__ = 'gef_agrements'
+    __table_args__ = (
+        # Un agrément n'est attribué qu'une fois à un GEF (index des lectures par gef_n)
+        db.UniqueConstraint('gef_n', 'agrement_id', name='uq_gef_agrements_gef_n_agrement_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     gef_n = db.Column(db.Integer, db.ForeignKey('gef.numero'))
-    agrement_id = db.Column(db.Integer, db.ForeignKey('agrements.id'))
+    agrement_id = db.Column(db.Integer, db.ForeignKey('agrements.id'), index=True)
     
     # Many-to-1: This link object points to one Gef
     gef_link = db.relationship('Gef', back_populates='agrement_links', foreign_keys=[gef_n])
     # Many-to-1: This link object points to one Agrement
-    agrement_link = db.relationship('Agrement', back_populates='gef_links', foreign_keys=[agrement_id])
\ No newline at end of file
+    agrement_link = db.relationship('Agrement', back_populates='gef_links', foreign_keys=[agrement_id])
+# --- Statistiques pré-agrégées (tenues à jour par app/coverage.py) ---
+
+class CoverageCommune(db.Model):
+    __tablename__ = 'coverage_commune'
+    # Une ligne par commune, y compris celles sans aucun GEF (lacunes de couverture)
+    code_commune = db.Column(db.Integer, db.ForeignKey('commune.code_commu', ondelete='CASCADE'), primary_key=True)
+    code_wilaya = db.Column(db.Integer, index=True)
+    gef_count = db.Column(db.Integer, nullable=False, default=0)
+    gef_actif_count = db.Column(db.Integer, nullable=False, default=0)
+    personnel_count = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+class CoverageAgrement(db.Model):
+    __tablename__ = 'coverage_agrement'
+    code_commune = db.Column(db.Integer, db.ForeignKey('commune.code_commu', ondelete='CASCADE'), primary_key=True)
+    agrement_id = db.Column(db.Integer, db.ForeignKey('agrements.id', ondelete='CASCADE'), primary_key=True)
+    code_wilaya = db.Column(db.Integer, index=True)
+    gef_count = db.Column(db.Integer, nullable=False, default=0)
+    gef_actif_count = db.Column(db.Integer, nullable=False, default=0)
+
+class CoverageEquipement(db.Model):
+    __tablename__ = 'coverage_equipement'
+    code_commune = db.Column(db.Integer, db.ForeignKey('commune.code_commu', ondelete='CASCADE'), primary_key=True)
+    id_type = db.Column(db.Integer, db.ForeignKey('type_equipement.id_type', ondelete='CASCADE'), primary_key=True)
+    code_wilaya = db.Column(db.Integer, index=True)
+    gef_count = db.Column(db.Integer, nullable=False, default=0)
+    quantite = db.Column(db.Integer, nullable=False, default=0)
+
+class GefSync(db.Model):
+    __tablename__ = 'gef_sync'
+    # Dernière modification de chaque GEF (lui-même ou ses tables enfants), tenue
+    # par triggers ; les GEFs supprimés restent en « tombstone » (deleted = true)
+    numero = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False)
+    # Transaction de la modification (pg_current_xact_id) : voir sync.py
+    txid = db.Column(db.BigInteger, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+    __table_args__ = (
+        db.Index('ix_gef_sync_cursor', 'txid', 'seq'),
+    )
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    # Tâche de fond exécutée par "flask gef worker" (voir app/jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(JSONB, nullable=False, default=dict)
+    # queued, running, done, failed, cancelled
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    progress_done = db.Column(db.BigInteger, nullable=False, default=0)
+    progress_total = db.Column(db.BigInteger)
+    # Point de reprise enregistré après chaque lot (reprise après arrêt du worker)
+    checkpoint = db.Column(JSONB)
+    message = db.Column(db.Text)
+    result = db.Column(JSONB)
+    # Fichier produit, dans instance/jobs/<id>/
+    artifact = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    started_at = db.Column(db.DateTime(timezone=True))
+    heartbeat_at = db.Column(db.DateTime(timezone=True))
+    finished_at = db.Column(db.DateTime(timezone=True))
+
+    __table_args__ = (
+        # File d'attente : seules les tâches en attente sont indexées
+        db.Index('ix_job_queued', 'id', postgresql_where=db.text("status = 'queued'")),
+        db.Index('ix_job_status', 'status'),
+    )
@@ -0,0 +1,138 @@
+# app/notify.py
+import logging
+import os
+import select
+import threading
+
+from .coverage import invalidate_coverage
+from .details import invalidate_gef_details
+from .models import db
+from .refdata import invalidate_reference_data
+from .stats import invalidate_dashboard_counts
+
+# Invalidation des caches entre workers : les triggers posés par la migration
+# « change notifications » envoient NOTIFY gef_changes avec la clé modifiée :
+#   gef:<numero>   un GEF ou l'une de ses tables enfants a changé
+#   gef:*          tables GEF vidées (TRUNCATE)
+#   ref:<table>    wilaya, commune, type_equipement ou agrements a changé
+# Chaque worker écoute le canal dans un thread et évince les entrées concernées.
+
+NOTIFY_CHANNEL = 'gef_changes'
+# Délai maximal d'attente d'une notification avant de vérifier la demande d'arrêt
+POLL_TIMEOUT = 5.0
+MAX_RECONNECT_DELAY = 60
+
+logger = logging.getLogger(__name__)
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def handle_notification(payload):
+    kind, _, key = payload.partition(':')
+    if kind == 'gef':
+        invalidate_gef_details(None if key == '*' else int(key))
+        invalidate_dashboard_counts()
+        invalidate_coverage()
+    elif kind == 'ref':
+        # Les documents de détail et les statistiques reprennent les libellés de référence
+        invalidate_reference_data()
+        invalidate_gef_details()
+        invalidate_coverage()
+    else:
+        logger.warning("Notification inconnue sur %s : %s", NOTIFY_CHANNEL, payload)
+
+
+def invalidate_all():
+    invalidate_gef_details()
+    invalidate_dashboard_counts()
+    invalidate_coverage()
+    invalidate_reference_data()
+
+
+class ChangeListener(threading.Thread):
+    """Thread d'écoute LISTEN gef_changes sur une connexion dédiée (hors pool)."""
+
+    def __init__(self, engine):
+        super().__init__(name='gef-change-listener', daemon=True)
+        self.engine = engine
+        self._stop_event = threading.Event()
+        # Positionné après la première écoute (et le vidage des caches qui la suit)
+        self.listening = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        delay = 1
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                delay = 1
+            except Exception as e:
+                logger.warning("Écoute de %s interrompue (%s), nouvelle tentative dans %s s", NOTIFY_CHANNEL, e, delay)
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _listen(self):
+        fairy = self.engine.raw_connection()
+        connection = fairy.driver_connection
+        # Connexion retirée du pool : elle reste ouverte en permanence pour ce thread
+        fairy.detach()
+        try:
+            connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            cursor.close()
+            # Des notifications ont pu être perdues pendant la coupure, ou depuis le
+            # préchauffage du maître (worker recyclé par gunicorn, forké bien après) :
+            # les caches sont rechargés à chaque nouvelle écoute, première comprise.
+            invalidate_all()
+            self.listening.set()
+            if callable(getattr(connection, 'notifies', None)):
+                self._wait_psycopg(connection)
+            else:
+                self._wait_psycopg2(connection)
+        finally:
+            connection.close()
+
+    def _wait_psycopg(self, connection):
+        while not self._stop_event.is_set():
+            for notification in connection.notifies(timeout=POLL_TIMEOUT):
+                handle_notification(notification.payload)
+
+    def _wait_psycopg2(self, connection):
+        while not self._stop_event.is_set():
+            if select.select([connection], [], [], POLL_TIMEOUT) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                handle_notification(connection.notifies.pop(0).payload)
+
+
+def ensure_listener(app):
+    """Démarre le thread d'écoute du processus courant (une fois par worker, après le fork)."""
+    global _listener, _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid and _listener is not None and _listener.is_alive():
+        return _listener
+    with _listener_lock:
+        if _listener_pid != pid or _listener is None or not _listener.is_alive():
+            with app.app_context():
+                engine = db.engine
+            _listener = ChangeListener(engine)
+            _listener.start()
+            _listener_pid = pid
+    return _listener
+
+
+def init_notify(app):
+    if not app.config.get('CACHE_NOTIFY_ENABLED', True):
+        return
+
+    # Démarrage à la première requête : un thread lancé avant le fork (preload)
+    # n'existerait pas dans les workers
+    @app.before_request
+    def _start_change_listener():
+        ensure_listener(app)
@@ -0,0 +1,143 @@
+# app/photos.py
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from .models import Gef
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+# Variantes redimensionnées : nom -> (plus grand côté en pixels, qualité JPEG)
+PHOTO_VARIANTS = {
+    'thumb': (160, 80),
+    'medium': (600, 85),
+}
+VARIANTS_SUBFOLDER = 'variants'
+
+# Les noms de fichiers sont dérivés du contenu : une URL ne change jamais de contenu
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_executor = None
+
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config.get('PHOTO_WORKERS', 2),
+            thread_name_prefix='photo-variants'
+        )
+    return _executor
+
+
+def variant_path(upload_folder, filename, variant):
+    stem = filename.rsplit('.', 1)[0]
+    return os.path.join(upload_folder, VARIANTS_SUBFOLDER, f"{stem}_{variant}.jpg")
+
+
+def save_photo(file_storage):
+    """Enregistre l'original sous <sha256>.<ext> et lance la création des variantes en tâche de fond."""
+    if not file_storage or file_storage.filename == '':
+        return None
+    filename = secure_filename(file_storage.filename)
+    if not allowed_file(filename):
+        return None
+    extension = filename.rsplit('.', 1)[1].lower()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+
+    # Écriture dans un fichier temporaire en calculant l'empreinte au passage
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+            f.write(chunk)
+
+    unique_filename = f"{digest.hexdigest()[:32]}.{extension}"
+    save_path = os.path.join(upload_folder, unique_filename)
+    if os.path.exists(save_path):
+        # Même contenu déjà présent (et donc mêmes variantes)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, save_path)
+
+    _get_executor().submit(_generate_variants_safely, current_app.logger, upload_folder, unique_filename)
+    return unique_filename
+
+
+def _generate_variants_safely(logger, upload_folder, filename):
+    try:
+        generate_variants(upload_folder, filename)
+    except Exception as e:
+        logger.warning(f"Création des variantes de la photo {filename} impossible : {e}")
+
+
+def generate_variants(upload_folder, filename, variants=None):
+    """Crée les variantes JPEG manquantes d'une photo. Nécessite Pillow."""
+    from PIL import Image, ImageOps
+
+    source = os.path.join(upload_folder, filename)
+    os.makedirs(os.path.join(upload_folder, VARIANTS_SUBFOLDER), exist_ok=True)
+    with Image.open(source) as image:
+        # Respecte l'orientation EXIF des photos prises au téléphone
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for variant in variants or PHOTO_VARIANTS:
+            target = variant_path(upload_folder, filename, variant)
+            if os.path.exists(target):
+                continue
+            size, quality = PHOTO_VARIANTS[variant]
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                resized.save(f, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, target)
+
+
+def ensure_variant(filename, variant):
+    """Chemin de la variante demandée, créée à la volée si besoin (photos anciennes).
+
+    Retourne None si la variante ne peut pas être produite (Pillow absent, image illisible).
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    target = variant_path(upload_folder, filename, variant)
+    if os.path.exists(target):
+        return target
+    if not os.path.exists(os.path.join(upload_folder, filename)):
+        return None
+    try:
+        generate_variants(upload_folder, filename, variants=[variant])
+    except ImportError:
+        current_app.logger.warning("Pillow n'est pas installé : les variantes de photos sont désactivées.")
+        return None
+    except Exception as e:
+        current_app.logger.warning(f"Création de la variante {variant} de {filename} impossible : {e}")
+        return None
+    return target
+
+
+def delete_photo(filename, gef_numero=None):
+    """Supprime l'original et ses variantes, sauf si un autre GEF utilise la même photo."""
+    if not filename:
+        return
+    try:
+        shared = Gef.query.filter(Gef.photo_filename == filename, Gef.numero != gef_numero).first()
+        if shared is not None:
+            return
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        paths = [os.path.join(upload_folder, filename)]
+        paths += [variant_path(upload_folder, filename, variant) for variant in PHOTO_VARIANTS]
+        for file_path in paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    except Exception as e:
+        print(f"Erreur lors de la suppression de l'ancienne photo {filename}: {e}")
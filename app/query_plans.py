@@ -0,0 +1,198 @@
+# app/query_plans.py
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .bulk import DELETE_CHILDREN_SQL, DELETE_GEF_SQL
+from .details import GEF_DETAILS_SQL
+from .filters import filter_conditions, filter_query, DEFAULT_PER_PAGE
+from .models import db, Gef, Personnel, Telephone, GefEquipement, GefAgrement
+from .search import search_gefs_statement
+from .sync import CHANGES_SQL
+
+# Non-régression des plans d'exécution des requêtes les plus fréquentes.
+# Chaque requête est exécutée sous EXPLAIN (ANALYZE, BUFFERS) sur la base
+# courante (jeu réel ou "flask gef seed") ; un plan est en régression s'il
+# parcourt séquentiellement une table volumineuse (index manquant ou ignoré)
+# ou si son coût estimé dépasse le budget de la requête. Les requêtes sont
+# exécutées dans une transaction annulée : les suppressions ne modifient rien.
+
+# En dessous de ce nombre de lignes (pg_class.reltuples), un parcours
+# séquentiel est normal (wilayas, agréments, types d'équipement...)
+SEQ_SCAN_MIN_ROWS = 1000
+
+# Budgets de coût (unités du planificateur), calibrés sur "flask gef seed"
+# (10 000 GEFs), avec une marge d'un facteur 5 à 10 sur les plans indexés
+COST_BUDGETS = {
+    'gef_details': 500,
+    'edit_gef.gef': 50,
+    'edit_gef.personnel': 50,
+    'edit_gef.telephones': 50,
+    'edit_gef.equipements': 50,
+    'edit_gef.agrements': 50,
+    'filter_gefs.wilaya': 200,
+    'filter_gefs.wilaya.count': 1000,
+    'filter_gefs.commune_situation': 100,
+    'filter_gefs.agrement_wilaya': 500,
+    'filter_gefs.equipement_commune': 400,
+    'filter_gefs.personnel_nom': 2000,
+    'api_gefs.prefix': 500,
+    'api_gefs.numero': 500,
+    'api_sync_changes': 2000,
+    'delete_gef.children': 100,
+    'delete_gef': 100,
+}
+
+SAMPLE_SQL = text("""
+    SELECT g.numero, g.n_p, g.commune_c, c.code_wilaya,
+           (SELECT min(agrement_id) FROM gef_agrements WHERE gef_n = g.numero) AS agrement_id,
+           (SELECT min(id_type) FROM gef_equipement WHERE n_gef = g.numero) AS id_type,
+           (SELECT min(nom) FROM personnel WHERE n_gef = g.numero) AS personnel_nom
+    FROM gef g
+    LEFT JOIN commune c ON c.code_commu = g.commune_c
+    WHERE g.numero IS NOT NULL
+    ORDER BY g.numero
+    OFFSET (SELECT count(*) / 2 FROM gef) LIMIT 1
+""")
+
+TABLE_ROWS_SQL = text("""
+    SELECT relname, reltuples FROM pg_class
+    WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace
+""")
+
+ANALYZE_SQL = "ANALYZE gef, personnel, telephones, gef_equipement, gef_agrements, commune, gef_sync"
+
+
+def _sample_values():
+    """GEF de rang médian (et ses valeurs liées) : paramètres des requêtes."""
+    row = db.session.execute(SAMPLE_SQL).mappings().first()
+    db.session.rollback()
+    if row is None:
+        raise RuntimeError("Aucun GEF en base : lancez d'abord 'flask gef seed'.")
+    return dict(row)
+
+
+def build_plan_queries(values):
+    """Requêtes contrôlées : nom -> (instruction, paramètres), telles qu'émises par l'application."""
+    numero = values['numero']
+    numeros = {'numeros': [numero]}
+
+    def page(criteria):
+        return filter_query(criteria).limit(DEFAULT_PER_PAGE).statement, {}
+
+    queries = {
+        'gef_details': (GEF_DETAILS_SQL, {'numero': numero}),
+        'edit_gef.gef': (select(Gef).where(Gef.numero == numero), {}),
+        'edit_gef.personnel': (select(Personnel).where(Personnel.n_gef == numero), {}),
+        'edit_gef.telephones': (select(Telephone).where(Telephone.n_gef == numero), {}),
+        'edit_gef.equipements': (select(GefEquipement).where(GefEquipement.n_gef == numero), {}),
+        'edit_gef.agrements': (select(GefAgrement).where(GefAgrement.gef_n == numero), {}),
+        'filter_gefs.wilaya': page({'wilaya': values['code_wilaya']}),
+        'filter_gefs.wilaya.count': (
+            select(func.count()).select_from(Gef).where(*filter_conditions({'wilaya': values['code_wilaya']})), {}
+        ),
+        'filter_gefs.commune_situation': page({'commune': values['commune_c'], 'situation': 'actif'}),
+        'filter_gefs.agrement_wilaya': page({'wilaya': values['code_wilaya'], 'agrements': [values['agrement_id']]}),
+        'filter_gefs.equipement_commune': page({'commune': values['commune_c'], 'equipements': [values['id_type']]}),
+        'filter_gefs.personnel_nom': page({'personnel_nom': (values['personnel_nom'] or 'a')[:4]}),
+        'api_gefs.prefix': (search_gefs_statement(q=values['n_p'][:3])[0], {}),
+        'api_gefs.numero': (search_gefs_statement(q=str(numero)[:2])[0], {}),
+        'api_sync_changes': (CHANGES_SQL, {'txid': 0, 'seq': 0, 'horizon': 2 ** 62, 'limit': 500}),
+    }
+    # Suppression d'un GEF (delete_gef, opérations groupées) : enfants puis GEF,
+    # dont les contrôles de clés étrangères des tables enfants
+    for table, stmt in DELETE_CHILDREN_SQL:
+        queries[f'delete_gef.children.{table}'] = (_numeros_param(stmt), numeros)
+    queries['delete_gef'] = (_numeros_param(DELETE_GEF_SQL), numeros)
+    return queries
+
+
+def _numeros_param(stmt):
+    return stmt.bindparams(bindparam('numeros', type_=ARRAY(Integer)))
+
+
+def _cost_budget(name):
+    if name in COST_BUDGETS:
+        return COST_BUDGETS[name]
+    return COST_BUDGETS.get(name.rsplit('.', 1)[0])
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def explain(stmt, params=None):
+    """EXPLAIN (ANALYZE, BUFFERS) de l'instruction, dans la transaction courante : plan JSON."""
+    # Listes IN (...) développées dans le SQL, comme à l'exécution
+    compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    sql = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled}"
+    result = db.session.connection().exec_driver_sql(sql, {**compiled.params, **(params or {})})
+    document = result.scalar()
+    return (json.loads(document) if isinstance(document, str) else document)[0]
+
+
+def check_plan(explained, budget, large_tables):
+    """Régressions d'un plan : parcours séquentiels de tables volumineuses, dépassement du budget."""
+    plan = explained['Plan']
+    problems = [
+        f"Seq Scan sur {node['Relation Name']}"
+        for node in _plan_nodes(plan)
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in large_tables
+    ]
+    if budget is not None and plan['Total Cost'] > budget:
+        problems.append(f"coût {plan['Total Cost']:.0f} > budget {budget}")
+    return problems
+
+
+def run_plan_checks(only=None, analyze=True, echo=print):
+    """Contrôle les plans des requêtes fréquentes et retourne un dict de résultats sérialisable en JSON."""
+    values = _sample_values()
+    if analyze:
+        # Statistiques à jour (jeu tout juste généré) : sinon les plans ne sont pas représentatifs
+        db.session.execute(text(ANALYZE_SQL))
+        db.session.commit()
+    large_tables = {name for name, rows in db.session.execute(TABLE_ROWS_SQL) if rows >= SEQ_SCAN_MIN_ROWS}
+
+    queries = build_plan_queries(values)
+    if only:
+        queries = {name: query for name, query in queries.items() if any(name.startswith(o) for o in only)}
+
+    results = {}
+    try:
+        # psycopg décode les plans JSON en UTF-8, quel que soit l'encodage client de la connexion
+        db.session.execute(text("SET LOCAL client_encoding = 'UTF8'"))
+        for name, (stmt, params) in queries.items():
+            explained = explain(stmt, params)
+            budget = _cost_budget(name)
+            problems = check_plan(explained, budget, large_tables)
+            plan = explained['Plan']
+            results[name] = {
+                'cost': plan['Total Cost'],
+                'budget': budget,
+                'rows': plan['Actual Rows'],
+                'time_ms': round(explained['Execution Time'], 3),
+                'triggers_ms': round(sum(t['Time'] for t in explained.get('Triggers', ())), 3),
+                'buffers': {'hit': plan.get('Shared Hit Blocks', 0), 'read': plan.get('Shared Read Blocks', 0)},
+                'problems': problems,
+                'plan': plan,
+            }
+            echo(f"{name:40} coût {plan['Total Cost']:9.1f} / {budget or '-':>5}  "
+                 f"{explained['Execution Time']:8.2f} ms  tampons {results[name]['buffers']['hit']:5}"
+                 f"+{results[name]['buffers']['read']:<5} {'; '.join(problems) or 'OK'}")
+    finally:
+        # Les suppressions contrôlées ne sont jamais validées
+        db.session.rollback()
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'sample': values,
+        'large_tables': sorted(large_tables),
+        'queries': results,
+        'failures': sorted(name for name, result in results.items() if result['problems']),
+    }
+
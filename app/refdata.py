@@ -0,0 +1,87 @@
+# app/refdata.py
+import hashlib
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from .cache import TTLCache
+from .models import db, Wilaya, Commune, TypeEquipement, Agrement
+
+# Structures immuables reprenant les noms d'attributs des modèles :
+# les templates peuvent les utiliser à la place des objets ORM.
+WilayaRef = namedtuple('WilayaRef', ['code', 'nom_wilaya'])
+CommuneRef = namedtuple('CommuneRef', ['code_commu', 'nom_commun', 'code_wilaya'])
+TypeEquipementRef = namedtuple('TypeEquipementRef', ['id_type', 'nom_type'])
+AgrementRef = namedtuple('AgrementRef', ['id', 'nom'])
+
+
+class ReferenceData:
+    """Instantané des tables de référence (wilayas, communes, équipements, agréments)."""
+
+    def __init__(self, wilayas, communes, type_equipements, agrements):
+        self.wilayas = tuple(wilayas)
+        self.communes = tuple(communes)
+        self.type_equipements = tuple(type_equipements)
+        self.agrements = tuple(agrements)
+
+        # Communes pré-indexées par wilaya (déjà triées par nom) et par code
+        by_wilaya = {}
+        for commune in self.communes:
+            by_wilaya.setdefault(commune.code_wilaya, []).append(commune)
+        self.communes_by_wilaya = {code: tuple(items) for code, items in by_wilaya.items()}
+        self.communes_by_code = {commune.code_commu: commune for commune in self.communes}
+
+        # Version dérivée du contenu : identique d'un worker à l'autre, sert d'ETag
+        content = repr((self.wilayas, self.communes, self.type_equipements, self.agrements))
+        self.version = hashlib.sha1(content.encode()).hexdigest()[:16]
+
+    def communes_for(self, code_wilaya):
+        return self.communes_by_wilaya.get(code_wilaya, ())
+
+
+_refdata_cache = TTLCache()
+
+
+# Requêtes des tables de référence (partagées avec l'API asynchrone)
+REFERENCE_STATEMENTS = {
+    'wilayas': select(Wilaya.code, Wilaya.nom_wilaya).order_by(Wilaya.nom_wilaya),
+    'communes': select(Commune.code_commu, Commune.nom_commun, Commune.code_wilaya).order_by(Commune.nom_commun),
+    'type_equipements': select(TypeEquipement.id_type, TypeEquipement.nom_type).order_by(TypeEquipement.nom_type),
+    'agrements': select(Agrement.id, Agrement.nom).order_by(Agrement.nom),
+}
+
+
+def build_reference_data(rows):
+    """Lignes de REFERENCE_STATEMENTS (même clés) -> ReferenceData."""
+    return ReferenceData(
+        wilayas=(WilayaRef(*row) for row in rows['wilayas']),
+        communes=(CommuneRef(*row) for row in rows['communes']),
+        type_equipements=(TypeEquipementRef(*row) for row in rows['type_equipements']),
+        agrements=(AgrementRef(*row) for row in rows['agrements']),
+    )
+
+
+def load_reference_data():
+    return build_reference_data({name: db.session.execute(stmt).all() for name, stmt in REFERENCE_STATEMENTS.items()})
+
+
+def get_reference_data():
+    ttl = current_app.config.get('REFDATA_TTL', 3600)
+    return _refdata_cache.get('refdata', load_reference_data, ttl=ttl)
+
+
+def invalidate_reference_data():
+    _refdata_cache.invalidate()
+
+
+def warm_reference_data(app):
+    # Chargé au démarrage pour que le premier formulaire ne paie pas les requêtes
+    with app.app_context():
+        try:
+            get_reference_data()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Préchargement des données de référence impossible : {e}")
+        finally:
+            db.session.remove()
@@ -0,0 +1,136 @@
+# app/search.py
+import base64
+import json
+import re
+
+from sqlalchemy import String, Text, cast, func, literal, or_, select, tuple_
+
+from .models import db, Gef, Commune
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+# En dessous, la recherche plein texte n'est pas lancée (préfixes trop peu sélectifs)
+FULLTEXT_MIN_LENGTH = 2
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def encode_cursor(n_p, numero):
+    raw = json.dumps([n_p, numero]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        n_p, numero = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(n_p), int(numero)
+    except (ValueError, TypeError):
+        raise ValueError("Curseur de pagination invalide")
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def fold(value):
+    """Forme repliée (minuscules, sans accents) calculée par Postgres : gef_fold(value)."""
+    return func.gef_fold(literal(value, String), type_=String)
+
+
+def folded_contains(column, value):
+    """`column` contient `value`, sans tenir compte de la casse ni des accents.
+
+    Utilise les index trigrammes définis sur gef_fold(column).
+    """
+    pattern = literal('%', String) + fold(_escape_like(value)) + '%'
+    return func.gef_fold(column, type_=String).like(pattern, escape='\\')
+
+
+def prefix_tsquery(q):
+    """Requête tsquery où chaque mot saisi est un préfixe : "ben kar" -> ben:* & kar:*.
+
+    Retourne None si la saisie ne contient aucun mot.
+    """
+    words = WORD_PATTERN.findall(q or '')
+    if not words:
+        return None
+    return func.to_tsquery('simple', fold(' & '.join(f"{word}:*" for word in words)))
+
+
+def search_gefs_statement(q=None, after=None, limit=SEARCH_PAGE_SIZE):
+    """Requête de search_gefs (partagée avec l'API asynchrone) : (select, taille de page)."""
+    limit = max(1, min(limit or SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE))
+    stmt = select(Gef.numero, Gef.n_p)
+
+    q = (q or '').strip()
+    if q:
+        conditions = [Gef.n_p.ilike(f"%{_escape_like(q)}%", escape='\\')]
+        if q.isdigit():
+            conditions.append(cast(Gef.numero, Text).like(f"{q}%"))
+        stmt = stmt.where(or_(*conditions))
+
+    if after:
+        after_n_p, after_numero = decode_cursor(after)
+        stmt = stmt.where(tuple_(Gef.n_p, Gef.numero) > tuple_(after_n_p, after_numero))
+    return stmt.order_by(Gef.n_p, Gef.numero).limit(limit + 1), limit
+
+
+def search_gefs_page(rows, limit):
+    """Lignes (numero, n_p) -> (liste de GEFs, curseur de la page suivante ou None)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    return [{'numero': numero, 'nom': n_p} for numero, n_p in rows], next_cursor
+
+
+def search_gefs(q=None, after=None, limit=SEARCH_PAGE_SIZE):
+    """Recherche de GEFs par nom (sous-chaîne) ou numéro (préfixe), paginée par clé.
+
+    Le tri (n_p, numero) suit l'index ix_gef_n_p_numero ; le filtre sur le nom
+    s'appuie sur l'index trigramme ix_gef_n_p_trgm et celui sur le numéro sur
+    l'index d'expression ix_gef_numero_text.
+    Retourne (liste de GEFs, curseur de la page suivante ou None).
+    """
+    stmt, limit = search_gefs_statement(q, after, limit)
+    return search_gefs_page(db.session.execute(stmt).all(), limit)
+
+
+def fulltext_search(q, page=1, limit=SEARCH_PAGE_SIZE):
+    """Recherche libre sur le nom, l'adresse, les observations et le personnel des GEFs.
+
+    Un GEF correspond si son document (search_vector) contient tous les mots
+    saisis en préfixe, ou si le texte replié du nom et du personnel
+    (search_text) est proche de la saisie (trigrammes, tolère les fautes de
+    frappe et les variantes de translittération). Les deux conditions
+    s'appuient sur les index GIN ix_gef_search_vector et ix_gef_search_text_trgm.
+    Les résultats sont triés par pertinence : rang plein texte pondéré
+    (nom > personnel > adresse > observations) plus similarité trigramme.
+    Retourne (liste de résultats, page suivante disponible).
+    """
+    q = (q or '').strip()
+    tsquery = prefix_tsquery(q)
+    if len(q) < FULLTEXT_MIN_LENGTH or tsquery is None:
+        return [], False
+    limit = max(1, min(limit or SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE))
+    page = max(1, page or 1)
+
+    folded = fold(q)
+    score = (func.ts_rank(Gef.search_vector, tsquery)
+             + func.word_similarity(folded, Gef.search_text)).label('score')
+    stmt = (
+        select(Gef.numero, Gef.n_p, Gef.situation, Gef.commune_c, Commune.nom_commun, score)
+        .outerjoin(Commune, Gef.commune_c == Commune.code_commu)
+        .where(or_(Gef.search_vector.op('@@')(tsquery), folded.op('<%')(Gef.search_text)))
+        .order_by(score.desc(), Gef.numero)
+        .offset((page - 1) * limit)
+        .limit(limit + 1)
+    )
+    rows = db.session.execute(stmt).all()
+    results = [
+        {
+            'numero': row.numero, 'nom': row.n_p, 'situation': row.situation,
+            'commune_c': row.commune_c, 'commune': row.nom_commun, 'score': round(row.score, 4),
+        }
+        for row in rows[:limit]
+    ]
+    return results, len(rows) > limit
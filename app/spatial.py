@@ -0,0 +1,292 @@
+# app/spatial.py
+import json
+import math
+import os
+import tempfile
+import time
+
+from flask import current_app
+from geoalchemy2 import Geography
+from sqlalchemy import cast, func, select, text
+
+from .filters import filter_conditions
+from .models import db, Gef, Commune
+
+# En dessous de ce zoom, les points sont regroupés côté serveur
+CLUSTER_MAX_ZOOM = 12
+# Taille d'une cellule de regroupement, en pixels d'écran (tuiles de 256 px)
+CLUSTER_CELL_PIXELS = 64
+MAX_POINT_FEATURES = 5000
+
+# Recherche des plus proches voisins
+NEAREST_DEFAULT_K = 10
+NEAREST_MAX_K = 100
+# Candidats lus par l'index (<->, distance en degrés) avant re-tri en mètres
+NEAREST_CANDIDATE_FACTOR = 4
+
+# Paramètres des tuiles vectorielles (ST_AsMVTGeom / ST_AsMVT)
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_LAYER = 'gefs'
+
+MVT_TILE_SQL = text("""
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS geom_3857
+    ),
+    mvtgeom AS (
+        SELECT ST_AsMVTGeom(ST_Transform(g.geom, 3857), bounds.geom_3857, :extent, :buffer, true) AS geom,
+               g.numero, g.n_p, g.situation
+        FROM gef g, bounds
+        WHERE g.geom && ST_Transform(ST_Expand(bounds.geom_3857, :margin), 4326)
+    )
+    SELECT ST_AsMVT(mvtgeom.*, :layer, :extent, 'geom') FROM mvtgeom
+""")
+
+
+def point_ewkt(lon, lat):
+    return f"SRID=4326;POINT({lon} {lat})"
+
+
+def parse_lonlat(lon, lat):
+    """Coordonnées saisies -> (lon, lat) en flottants, ou None si les deux champs sont vides."""
+    lon, lat = (lon or '').strip(), (lat or '').strip()
+    if not lon and not lat:
+        return None
+    try:
+        lon, lat = float(lon.replace(',', '.')), float(lat.replace(',', '.'))
+    except ValueError:
+        raise ValueError("Coordonnées invalides : longitude et latitude décimales attendues.")
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError("Coordonnées hors limites.")
+    return lon, lat
+
+
+def gef_lonlat(gef_numero):
+    row = db.session.execute(
+        select(func.ST_X(Gef.geom), func.ST_Y(Gef.geom)).where(Gef.numero == gef_numero)
+    ).first()
+    if row is None or row[0] is None:
+        return None
+    return row[0], row[1]
+
+
+def parse_bbox(value):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox attendu : min_lon,min_lat,max_lon,max_lat")
+    if min_lon >= max_lon or min_lat >= max_lat:
+        raise ValueError("bbox vide ou inversée")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# --- Plus proches voisins (KNN) ---
+
+def nearest_gefs(lon, lat, k, criteria):
+    """Les k GEFs les plus proches du point, avec leur distance géodésique en mètres.
+
+    L'opérateur <-> parcourt l'index GiST idx_gef_geom dans l'ordre des distances
+    (en degrés) sans trier toute la table ; les candidats sont ensuite re-triés
+    selon la distance réelle sur l'ellipsoïde (cast en geography).
+    """
+    k = max(1, min(k or NEAREST_DEFAULT_K, NEAREST_MAX_K))
+    point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+    candidates = (
+        select(Gef.numero, Gef.n_p, Gef.situation, Gef.commune_c, Gef.geom)
+        .where(Gef.geom.isnot(None), *filter_conditions(criteria))
+        .order_by(Gef.geom.distance_centroid(point))
+        .limit(k * NEAREST_CANDIDATE_FACTOR)
+        .subquery()
+    )
+    geography = Geography(geometry_type='POINT', srid=4326)
+    distance = func.ST_Distance(cast(candidates.c.geom, geography), cast(point, geography))
+    stmt = (
+        select(
+            candidates.c.numero, candidates.c.n_p, candidates.c.situation, candidates.c.commune_c,
+            Commune.nom_commun, func.ST_X(candidates.c.geom).label('lon'),
+            func.ST_Y(candidates.c.geom).label('lat'), distance.label('distance_m'),
+        )
+        .outerjoin(Commune, Commune.code_commu == candidates.c.commune_c)
+        .order_by(distance)
+        .limit(k)
+    )
+    return [
+        {
+            'numero': row.numero, 'nom': row.n_p, 'situation': row.situation,
+            'commune_c': row.commune_c, 'commune': row.nom_commun,
+            'lon': row.lon, 'lat': row.lat, 'distance_m': round(row.distance_m, 1),
+        }
+        for row in db.session.execute(stmt)
+    ]
+
+
+# --- GeoJSON filtré par emprise ---
+
+def map_features(bbox, zoom, criteria):
+    """FeatureCollection GeoJSON (texte) des GEFs dans l'emprise.
+
+    Le filtre && sur l'emprise utilise l'index GiST idx_gef_geom. Aux petits
+    zooms, les points sont agrégés par cellule de grille (ST_SnapToGrid).
+    """
+    envelope = func.ST_MakeEnvelope(*bbox, 4326)
+    conditions = [Gef.geom.intersects(envelope), *filter_conditions(criteria)]
+
+    if zoom < CLUSTER_MAX_ZOOM:
+        cell = 360.0 / (2 ** zoom) * CLUSTER_CELL_PIXELS / 256
+        grid = func.ST_SnapToGrid(Gef.geom, cell)
+        stmt = (
+            select(
+                func.count().label('count'),
+                func.min(Gef.numero).label('numero'),
+                func.ST_AsGeoJSON(func.ST_Centroid(func.ST_Collect(Gef.geom)), 6).label('geometry'),
+            )
+            .where(*conditions)
+            .group_by(grid)
+        )
+        features = (
+            (row.geometry, {'cluster': row.count > 1, 'count': row.count,
+                            'numero': row.numero if row.count == 1 else None})
+            for row in db.session.execute(stmt)
+        )
+    else:
+        stmt = (
+            select(Gef.numero, Gef.n_p, Gef.situation, func.ST_AsGeoJSON(Gef.geom, 6).label('geometry'))
+            .where(*conditions)
+            .limit(MAX_POINT_FEATURES)
+        )
+        features = (
+            (row.geometry, {'cluster': False, 'count': 1, 'numero': row.numero,
+                            'nom': row.n_p, 'situation': row.situation})
+            for row in db.session.execute(stmt)
+        )
+
+    parts = [
+        f'{{"type": "Feature", "geometry": {geometry}, "properties": {json.dumps(properties, ensure_ascii=False)}}}'
+        for geometry, properties in features
+    ]
+    return '{"type": "FeatureCollection", "features": [' + ','.join(parts) + ']}'
+
+
+# --- Tuiles vectorielles (MVT) avec cache disque ---
+
+# Repères partagés par les workers (date de modification du fichier) :
+# - CLEARED_MARKER : toute tuile écrite avant est périmée (import, jeu synthétique) ;
+# - INVALIDATED_MARKER : dernière invalidation, de tout ou partie du cache ; une
+#   tuile calculée avant cette date n'est pas mise en cache (elle a pu lire la
+#   base avant le commit de l'écriture qui l'invalide).
+CLEARED_MARKER = '.cleared'
+INVALIDATED_MARKER = '.invalidated'
+
+
+def _tile_path(z, x, y):
+    return os.path.join(current_app.config['TILE_CACHE_FOLDER'], str(z), str(x), f"{y}.pbf")
+
+
+def _marker_time(name):
+    try:
+        return os.stat(os.path.join(current_app.config['TILE_CACHE_FOLDER'], name)).st_mtime
+    except OSError:
+        return 0
+
+
+def _touch_markers(*names):
+    folder = current_app.config['TILE_CACHE_FOLDER']
+    # Date explicite : l'horloge des fichiers est moins précise que time.time()
+    now = time.time()
+    try:
+        os.makedirs(folder, exist_ok=True)
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, 'a'):
+                os.utime(path, (now, now))
+    except OSError as e:
+        current_app.logger.warning(f"Invalidation du cache de tuiles impossible : {e}")
+
+
+def _read_cached_tile(path):
+    """Tuile en cache, ou None si absente, plus ancienne que TILE_CACHE_TTL ou que le dernier vidage."""
+    try:
+        with open(path, 'rb') as f:
+            written = os.fstat(f.fileno()).st_mtime
+            ttl = current_app.config.get('TILE_CACHE_TTL', 3600)
+            if (ttl and time.time() - written > ttl) or written < _marker_time(CLEARED_MARKER):
+                return None
+            return f.read()
+    except OSError:
+        return None
+
+
+def _tile_margin(z):
+    # Marge (en mètres, EPSG:3857) correspondant au buffer MVT, pour la sélection des points
+    tile_size = 2 * math.pi * 6378137 / (2 ** z)
+    return tile_size * MVT_BUFFER / MVT_EXTENT
+
+
+def get_tile(z, x, y):
+    """Tuile MVT (bytes) lue depuis le cache disque, ou générée par ST_AsMVT puis mise en cache."""
+    cacheable = z <= current_app.config.get('TILE_CACHE_MAX_ZOOM', 14)
+    path = _tile_path(z, x, y)
+    if cacheable:
+        tile = _read_cached_tile(path)
+        if tile is not None:
+            return tile
+
+    started = time.time()
+    tile = db.session.execute(MVT_TILE_SQL, {
+        'z': z, 'x': x, 'y': y, 'extent': MVT_EXTENT, 'buffer': MVT_BUFFER,
+        'margin': _tile_margin(z), 'layer': MVT_LAYER,
+    }).scalar()
+    tile = bytes(tile or b'')
+
+    if cacheable and _marker_time(INVALIDATED_MARKER) < started:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(tile)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            current_app.logger.warning(f"Mise en cache de la tuile {z}/{x}/{y} impossible : {e}")
+    return tile
+
+
+def _tiles_containing(lon, lat, z):
+    """Tuiles du zoom z dont l'emprise (buffer MVT compris) contient le point."""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    fx = (lon + 180.0) / 360.0 * n
+    fy = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    margin = MVT_BUFFER / MVT_EXTENT
+    tiles = set()
+    for x in range(math.floor(fx - margin), math.floor(fx + margin) + 1):
+        for y in range(math.floor(fy - margin), math.floor(fy + margin) + 1):
+            if 0 <= x < n and 0 <= y < n:
+                tiles.add((x, y))
+    return tiles
+
+
+def invalidate_tiles(*points):
+    """Supprime du cache les tuiles contenant les points (lon, lat) donnés (après le commit)."""
+    points = [point for point in points if point is not None]
+    if not points:
+        return
+    _touch_markers(INVALIDATED_MARKER)
+    max_zoom = current_app.config.get('TILE_CACHE_MAX_ZOOM', 14)
+    for lon, lat in points:
+        for z in range(max_zoom + 1):
+            for x, y in _tiles_containing(lon, lat, z):
+                try:
+                    os.remove(_tile_path(z, x, y))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    current_app.logger.warning(f"Suppression de la tuile {z}/{x}/{y} impossible : {e}")
+
+
+def clear_tile_cache():
+    """Périme toutes les tuiles en cache (chargements en masse : import, jeu synthétique).
+
+    Les fichiers ne sont pas supprimés : chaque tuile est recalculée, puis
+    réécrite, à sa prochaine lecture.
+    """
+    _touch_markers(CLEARED_MARKER, INVALIDATED_MARKER)
@@ -0,0 +1,32 @@
+# app/stats.py
+from flask import current_app
+from sqlalchemy import text
+
+from .cache import TTLCache
+from .models import db
+
+# Les trois compteurs du dashboard en une seule requête, via le pool SQLAlchemy.
+DASHBOARD_COUNTS_SQL = text("""
+    SELECT
+        (SELECT COUNT(*) FROM gef) AS gef_count,
+        (SELECT COUNT(*) FROM personnel) AS personnel_count,
+        (SELECT COUNT(DISTINCT c.code_wilaya)
+           FROM commune c JOIN gef g ON c.code_commu = g.commune_c) AS wilaya_count
+""")
+
+_dashboard_cache = TTLCache()
+
+
+def _load_dashboard_counts():
+    row = db.session.execute(DASHBOARD_COUNTS_SQL).mappings().one()
+    return dict(row)
+
+
+def get_dashboard_counts():
+    ttl = current_app.config.get('DASHBOARD_STATS_TTL', 60)
+    return _dashboard_cache.get('dashboard', _load_dashboard_counts, ttl=ttl)
+
+
+def invalidate_dashboard_counts():
+    # Appelé après chaque écriture (ajout, mise à jour, suppression d'un GEF)
+    _dashboard_cache.invalidate()
@@ -0,0 +1,145 @@
+# app/sync.py
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import text
+
+from .details import load_gef_documents
+from .models import db
+
+# Synchronisation des clients hors ligne (portables de terrain).
+# La table gef_sync, tenue par triggers, porte pour chaque GEF le couple
+# (txid, seq) de sa dernière modification ; les suppressions restent en
+# tombstone. Un client garde le curseur renvoyé et ne demande que la suite.
+#
+# Les séquences sont attribuées avant le commit : une transaction encore en
+# cours peut donc avoir un seq inférieur à des lignes déjà visibles. Seules les
+# lignes des transactions antérieures au xmin du snapshot courant (toutes
+# terminées) sont servies, triées par (txid, seq) : aucune modification ne peut
+# plus apparaître derrière un curseur déjà renvoyé.
+
+SYNC_DEFAULT_PAGE_SIZE = 500
+SNAPSHOT_BATCH = 1000
+SNAPSHOT_FILENAME = 'gef-snapshot.json.gz'
+
+HORIZON_SQL = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+CHANGES_SQL = text("""
+    SELECT numero, txid, seq, deleted
+    FROM gef_sync
+    WHERE (txid, seq) > (:txid, :seq) AND txid < :horizon
+    ORDER BY txid, seq
+    LIMIT :limit
+""")
+
+SNAPSHOT_NUMEROS_SQL = text("SELECT numero FROM gef WHERE numero IS NOT NULL ORDER BY numero")
+
+_snapshot_lock = threading.Lock()
+
+
+def format_cursor(txid, seq):
+    return f"{txid}-{seq}"
+
+
+def parse_cursor(value):
+    """Curseur opaque "txid-seq" ; vide = depuis le début."""
+    if not value:
+        return 0, 0
+    try:
+        txid, seq = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise ValueError(f"Curseur invalide : {value}")
+    return txid, seq
+
+
+def get_changes(cursor=None, limit=SYNC_DEFAULT_PAGE_SIZE):
+    """GEFs modifiés et supprimés après `cursor`.
+
+    Retourne (liste de (numero, document JSON texte), numéros supprimés,
+    curseur suivant, has_more).
+    """
+    txid, seq = parse_cursor(cursor)
+    horizon = db.session.execute(HORIZON_SQL).scalar()
+    rows = db.session.execute(
+        CHANGES_SQL, {'txid': txid, 'seq': seq, 'horizon': horizon, 'limit': limit + 1}
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    documents, missing = load_gef_documents([row.numero for row in rows if not row.deleted])
+    # Un GEF supprimé entre la lecture du journal et celle des documents
+    deleted = [row.numero for row in rows if row.deleted] + missing
+
+    if has_more:
+        next_cursor = (rows[-1].txid, rows[-1].seq)
+    else:
+        # Tout ce qui précède l'horizon a été servi
+        next_cursor = max((horizon, 0), (txid, seq))
+    return documents, deleted, format_cursor(*next_cursor), has_more
+
+
+def snapshot_path():
+    return os.path.join(current_app.instance_path, 'sync', SNAPSHOT_FILENAME)
+
+
+def build_snapshot(path=None):
+    """Écrit l'instantané complet compressé (gzip) de tous les GEFs.
+
+    Le fichier contient {"cursor", "created_at", "gefs": [...]} : le client
+    charge les documents puis poursuit avec /api/sync/changes?cursor=...
+    Retourne (curseur, nombre de GEFs).
+    """
+    path = path or snapshot_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Lecture cohérente : tous les lots voient le même état de la base
+    db.session.rollback()
+    db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        horizon = db.session.execute(HORIZON_SQL).scalar()
+        numeros = list(db.session.execute(SNAPSHOT_NUMEROS_SQL).scalars())
+        cursor = format_cursor(horizon, 0)
+        created_at = datetime.now(timezone.utc).isoformat()
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+            f.write(f'{{"cursor": {json.dumps(cursor)}, "created_at": {json.dumps(created_at)}, "gefs": ['.encode())
+            first = True
+            for start in range(0, len(numeros), SNAPSHOT_BATCH):
+                documents, _ = load_gef_documents(numeros[start:start + SNAPSHOT_BATCH])
+                for _, document in documents:
+                    if not first:
+                        f.write(b',')
+                    f.write(document.encode('utf-8'))
+                    first = False
+            f.write(b']}')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        db.session.rollback()
+    return cursor, len(numeros)
+
+
+def get_snapshot_path():
+    """Chemin de l'instantané, construit sur place uniquement s'il n'existe pas encore.
+
+    Un instantané trop ancien est servi tel quel : sa reconstruction (un passage
+    sur tout le registre) est confiée à une tâche de fond, voir snapshot_is_stale().
+    """
+    path = snapshot_path()
+    with _snapshot_lock:
+        if not os.path.exists(path):
+            build_snapshot(path)
+    return path
+
+
+def snapshot_is_stale(path, max_age=None):
+    return bool(max_age) and datetime.now().timestamp() - os.path.getmtime(path) > max_age
@@ -0,0 +1,208 @@
+# app/synthetic.py
+import random
+import unicodedata
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+
+from .coverage import refresh_coverage, invalidate_coverage
+from .models import (
+    db, Gef, Wilaya, Commune, Telephone, Personnel, TypeEquipement, GefEquipement, Agrement, GefAgrement
+)
+from .refdata import invalidate_reference_data
+from .spatial import clear_tile_cache
+from .stats import invalidate_dashboard_counts
+
+# Jeu de données synthétique à l'échelle nationale, pour les benchmarks
+# (flask gef seed / flask gef bench). Tirages reproductibles (graine fixe).
+
+DEFAULT_WILAYAS = 58
+DEFAULT_COMMUNES = 1541
+DEFAULT_GEFS = 10000
+
+# Emprise des chefs-lieux : le nord du pays concentre la majorité des communes et des GEFs
+NORTH_BOX = (-1.8, 34.5, 8.6, 37.0)
+SOUTH_BOX = (-1.0, 22.0, 9.5, 34.5)
+NORTH_SHARE = 0.8
+
+FAMILY_NAMES = [
+    'Benali', 'Bouzid', 'Haddad', 'Kaci', 'Zerrouki', 'Belkacem', 'Benmoussa', 'Boudiaf', 'Cherif', 'Djebbar',
+    'Ferhat', 'Guerfi', 'Hamidi', 'Khelifi', 'Lounis', 'Mansouri', 'Meziane', 'Nait Ali', 'Ouali', 'Rahmani',
+    'Saadi', 'Slimani', 'Taleb', 'Yahiaoui', 'Zitouni', 'Amrani', 'Bensalem', 'Chabane', 'Derradji', 'Bouteflika',
+    'Aït Ahmed', 'Benaïssa', 'Ghezali', 'Hadj Ahmed', 'Lakhdari', 'Messaoudi', 'Ould Kaddour', 'Sahraoui',
+    'Tebboune', 'Belaïd', 'Brahimi', 'Chérifi', 'Djaballah', 'Guendouz', 'Ikhlef', 'Mokrani', 'Rezig', 'Touati',
+]
+FIRST_NAMES = [
+    'Karim', 'Amel', 'Sami', 'Lina', 'Omar', 'Yacine', 'Nadia', 'Mohamed', 'Fatima', 'Rachid', 'Samira', 'Walid',
+    'Meriem', 'Sofiane', 'Leïla', 'Hocine', 'Souad', 'Nabil', 'Yasmina', 'Mourad', 'Zineb', 'Farid', 'Hanane',
+    'Abdelkader', 'Kheira', 'Redouane', 'Imène', 'Bilal', 'Aïcha', 'Djamel', 'Nour', 'Amine', 'Sabrina', 'Réda',
+]
+PROFILES = ['Ingénieur', 'Topographe', 'Technicien', 'Dessinateur', 'Secrétaire', 'Stagiaire', 'Chauffeur']
+SITUATIONS = [('actif', 0.85), ('mise en dispo', 0.08), ('suspendu', 0.07)]
+TELEPHONE_TYPES = ['Mobile', 'Fixe', 'Fax']
+STREETS = ['Rue', 'Boulevard', 'Avenue', 'Cité', 'Lotissement']
+OBSERVATIONS = [
+    None, None, None, "Dossier complet.", "Changement d'adresse en cours.", "Bureau partagé avec un confrère.",
+    "Relevés topographiques récents.", "Renouvellement d'agrément demandé.",
+]
+DEFAULT_AGREMENTS = ['Cadastre', 'Topographie', 'Expertise foncière', 'Génie civil', 'Bornage', 'Lotissement']
+DEFAULT_EQUIPEMENTS = ['GPS', 'Station totale', 'Niveau', 'Drone', 'Scanner 3D', 'Théodolite']
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _ascii(value):
+    return unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode()
+
+
+def _random_center(rng):
+    box = NORTH_BOX if rng.random() < NORTH_SHARE else SOUTH_BOX
+    return rng.uniform(box[0], box[2]), rng.uniform(box[1], box[3])
+
+
+def ensure_reference_data(rng, wilayas=DEFAULT_WILAYAS, communes=DEFAULT_COMMUNES, echo=print):
+    """Crée wilayas, communes, agréments et types d'équipement s'ils sont absents.
+
+    Les tables déjà remplies (données réelles) sont conservées telles quelles.
+    Retourne {code_commune: (lon, lat)} : centre approximatif de chaque commune.
+    """
+    if not db.session.query(Wilaya.id).first():
+        db.session.execute(sa.insert(Wilaya), [
+            {'code': code, 'nom_wilaya': f"Wilaya {code:02d}"} for code in range(1, wilayas + 1)
+        ])
+        echo(f"{wilayas} wilayas créées.")
+    wilaya_codes = [code for (code,) in db.session.query(Wilaya.code).order_by(Wilaya.code)]
+
+    if not db.session.query(Commune.code_commu).first():
+        rows, ranks = [], {}
+        per_wilaya = max(1, communes // len(wilaya_codes))
+        for index in range(communes):
+            code_wilaya = wilaya_codes[min(index // per_wilaya, len(wilaya_codes) - 1)]
+            rank = ranks[code_wilaya] = ranks.get(code_wilaya, 0) + 1
+            rows.append({
+                'code_commu': code_wilaya * 100 + rank,
+                'nom_commun': f"Commune {code_wilaya:02d}-{rank:02d}",
+                'code_wilaya': code_wilaya,
+            })
+        db.session.execute(sa.insert(Commune), rows)
+        echo(f"{len(rows)} communes créées.")
+
+    existing = {name for (name,) in db.session.query(Agrement.nom)}
+    missing = [{'nom': name} for name in DEFAULT_AGREMENTS if name not in existing]
+    if missing:
+        db.session.execute(sa.insert(Agrement), missing)
+    existing = {name for (name,) in db.session.query(TypeEquipement.nom_type)}
+    missing = [{'nom_type': name} for name in DEFAULT_EQUIPEMENTS if name not in existing]
+    if missing:
+        db.session.execute(sa.insert(TypeEquipement), missing)
+
+    # Les communes d'une même wilaya sont regroupées autour du chef-lieu
+    wilaya_centers = {code: _random_center(rng) for code in wilaya_codes}
+    centers = {}
+    for code_commu, code_wilaya in db.session.query(Commune.code_commu, Commune.code_wilaya).order_by(Commune.code_commu):
+        lon, lat = wilaya_centers.get(code_wilaya) or _random_center(rng)
+        centers[code_commu] = (lon + rng.gauss(0, 0.25), lat + rng.gauss(0, 0.2))
+    return centers
+
+
+def _synthetic_record(rng, numero, commune_code, center, agrement_ids, equipement_ids):
+    lon, lat = center
+    family = rng.choice(FAMILY_NAMES)
+    birth = date(1950, 1, 1) + timedelta(days=rng.randrange(0, 365 * 45))
+    gef = {
+        'numero': numero,
+        'n_p': f"{family} {rng.choice(FIRST_NAMES)}",
+        'email': f"{_ascii(family).lower().replace(' ', '')}{numero}@exemple.dz",
+        'adresse': f"{rng.randint(1, 200)} {rng.choice(STREETS)} {rng.choice(FAMILY_NAMES)}",
+        'statut_bureau': rng.choice(['Prop', 'Loc']),
+        'commune_c': commune_code,
+        'geom': f"SRID=4326;POINT({lon + rng.gauss(0, 0.03):.6f} {lat + rng.gauss(0, 0.03):.6f})",
+        'situation': _weighted(rng, SITUATIONS),
+        'nim': rng.randint(100000, 999999),
+        'nif': rng.randint(100000, 999999),
+        'observations': rng.choice(OBSERVATIONS),
+        'date_naiss': birth,
+        'date_obt': birth + timedelta(days=rng.randrange(365 * 25, 365 * 40)),
+    }
+    personnel = [
+        {'nom': rng.choice(FAMILY_NAMES), 'prenom': rng.choice(FIRST_NAMES),
+         'profile': rng.choice(PROFILES), 'n_gef': numero}
+        for _ in range(rng.choices(range(9), weights=[5, 15, 20, 20, 15, 10, 7, 5, 3])[0])
+    ]
+    telephones = [
+        {'type_tel': rng.choice(TELEPHONE_TYPES), 'num': f"0{rng.randint(500000000, 799999999)}", 'n_gef': numero}
+        for _ in range(rng.randint(1, 3))
+    ]
+    equipements = [
+        {'n_gef': numero, 'id_type': id_type, 'quantite': rng.randint(1, 4)}
+        for id_type in rng.sample(equipement_ids, rng.randint(1, min(4, len(equipement_ids))))
+    ]
+    agrements = [
+        {'gef_n': numero, 'agrement_id': agrement_id}
+        for agrement_id in rng.sample(agrement_ids, rng.randint(1, min(3, len(agrement_ids))))
+    ]
+    return gef, personnel, telephones, equipements, agrements
+
+
+def _insert_batch(records):
+    # Même écriture groupée que l'import : un INSERT multi-lignes par table et par lot
+    db.session.execute(sa.insert(Gef), [r[0] for r in records])
+    for index, model in enumerate((Personnel, Telephone, GefEquipement, GefAgrement), start=1):
+        rows = [row for r in records for row in r[index]]
+        if rows:
+            db.session.execute(sa.insert(model), rows)
+
+
+def clear_gefs():
+    """Vide les GEFs et leurs tables enfants (les données de référence sont conservées)."""
+    db.session.execute(sa.text(
+        "TRUNCATE gef_agrements, gef_equipement, telephones, personnel, gef RESTART IDENTITY CASCADE"
+    ))
+
+
+def generate_dataset(gefs=DEFAULT_GEFS, wilayas=DEFAULT_WILAYAS, communes=DEFAULT_COMMUNES,
+                     seed=42, batch_size=5000, reset=False, echo=print):
+    """Remplit la base avec `gefs` GEFs synthétiques (et leurs enfants), par lots d'une transaction.
+
+    Les numéros suivent le plus grand numéro existant ; avec `reset`, les GEFs
+    existants sont d'abord supprimés. Retourne le nombre de GEFs créés.
+    """
+    rng = random.Random(seed)
+    if reset:
+        clear_gefs()
+    centers = ensure_reference_data(rng, wilayas=wilayas, communes=communes, echo=echo)
+    db.session.commit()
+
+    # Densité inégale : quelques communes urbaines regroupent beaucoup de GEFs
+    commune_codes = list(centers)
+    commune_weights = [rng.paretovariate(1.2) for _ in commune_codes]
+    agrement_ids = [agrement_id for (agrement_id,) in db.session.query(Agrement.id)]
+    equipement_ids = [id_type for (id_type,) in db.session.query(TypeEquipement.id_type)]
+    next_numero = (db.session.query(sa.func.max(Gef.numero)).scalar() or 0) + 1
+
+    created = 0
+    while created < gefs:
+        size = min(batch_size, gefs - created)
+        records = []
+        for commune_code in rng.choices(commune_codes, weights=commune_weights, k=size):
+            records.append(_synthetic_record(
+                rng, next_numero, commune_code, centers[commune_code], agrement_ids, equipement_ids
+            ))
+            next_numero += 1
+        _insert_batch(records)
+        db.session.commit()
+        created += size
+        echo(f"{created}/{gefs} GEFs générés.")
+
+    refresh_coverage()
+    db.session.commit()
+    db.session.execute(sa.text("ANALYZE"))
+    db.session.commit()
+    invalidate_dashboard_counts()
+    invalidate_coverage()
+    invalidate_reference_data()
+    clear_tile_cache()
+    return created
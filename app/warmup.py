@@ -0,0 +1,67 @@
+# app/warmup.py
+from sqlalchemy import text
+
+from .coverage import get_coverage
+from .models import db
+from .notify import ensure_listener
+from .refdata import get_reference_data
+from .stats import get_dashboard_counts
+
+# Démarrage en production (gunicorn --preload, voir gunicorn.conf.py) :
+# le maître charge l'application et préchauffe ce qui survit au fork
+# (dialecte initialisé, caches de requêtes compilées, caches de données,
+# templates compilés), puis ferme ses connexions ; chaque worker repart
+# d'un pool vide et ouvre ses propres connexions. Les caches de données
+# hérités sont vidés dès que l'écoute des invalidations est en place (un
+# worker recyclé est forké longtemps après le préchauffage), puis rechargés
+# par le worker avant sa première requête.
+
+# Attente maximale de l'écoute des invalidations au démarrage d'un worker (secondes)
+LISTENER_WAIT = 5
+
+
+def warm_up(app):
+    """Préchauffe le processus courant ; à appeler avant le fork des workers."""
+    with app.app_context():
+        _load_data_caches(app)
+
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+
+        # Aucune connexion ouverte ne doit être partagée avec les workers
+        db.engine.dispose()
+
+
+def _load_data_caches(app):
+    try:
+        # Première connexion : initialisation du dialecte (version du serveur, types)
+        db.session.execute(text('SELECT 1'))
+        get_reference_data()
+        get_dashboard_counts()
+        get_coverage()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning(f"Préchauffage incomplet : {e}")
+    finally:
+        db.session.remove()
+
+
+def init_worker(app):
+    """À appeler dans chaque worker juste après le fork."""
+    with app.app_context():
+        # Oublie les connexions héritées du maître sans les fermer (elles lui appartiennent)
+        db.engine.dispose(close=False)
+        if app.config.get('CACHE_NOTIFY_ENABLED', True):
+            listener = ensure_listener(app)
+            # Les caches hérités sont vidés à la première écoute : rechargés ensuite,
+            # ce qui laisse aussi une connexion prête dans le pool
+            if listener.listening.wait(LISTENER_WAIT):
+                _load_data_caches(app)
+                return
+            app.logger.warning("Écoute des invalidations non établie : caches rechargés à la demande")
+        try:
+            # Une connexion prête dans le pool avant la première requête
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            app.logger.warning(f"Connexion initiale du worker impossible : {e}")
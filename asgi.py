@@ -0,0 +1,14 @@
+# asgi.py
+# Point d'entrée ASGI : API en lecture asynchrone (app/async_api.py) montée
+# devant l'application Flask, qui reçoit toutes les autres requêtes.
+#   uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+# (nécessite psycopg-pool, asgiref et uvicorn)
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from app.async_api import create_async_api
+from app.warmup import warm_up
+
+flask_app = create_app()
+warm_up(flask_app)
+app = create_async_api(flask_app.config, fallback=WsgiToAsgi(flask_app))
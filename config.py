@@ -16,10 +16,83 @@ class Config:
     # Turn off a feature we don't need
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de connexions (par processus) : en production, prévoir
+    # workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) + 1 connexion d'écoute par worker
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    # Durée maximale (ms) d'une instruction SQL ; 0 = illimitée (valeur fixée à 30 s par gunicorn.conf.py)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+
     # Database connection settings for better encoding support
     SQLALCHEMY_ENGINE_OPTIONS = {
         'connect_args': {
             'client_encoding': 'latin1',  # Use latin1 to read existing data
-            'options': '-c client_encoding=latin1'
-        }
-    }
\ No newline at end of file
+            'options': f'-c client_encoding=latin1 -c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+        },
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+    # Durée de vie (secondes) du cache des compteurs du dashboard
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', 60))
+    # Durée de vie du cache des statistiques de couverture (les tables coverage_* sont à jour à chaque écriture)
+    COVERAGE_STATS_TTL = int(os.environ.get('COVERAGE_STATS_TTL', 300))
+
+    # Cache des tables de référence (wilayas, communes, équipements, agréments)
+    REFDATA_TTL = int(os.environ.get('REFDATA_TTL', 3600))
+    # Durée de cache navigateur pour /api/communes/<wilaya_code>
+    REFDATA_HTTP_MAX_AGE = int(os.environ.get('REFDATA_HTTP_MAX_AGE', 86400))
+
+    # Tuiles vectorielles : zoom maximal mis en cache sur disque, durée de vie d'une
+    # tuile en cache (secondes, 0 = jusqu'à invalidation), durée de cache navigateur
+    TILE_CACHE_MAX_ZOOM = int(os.environ.get('TILE_CACHE_MAX_ZOOM', 14))
+    TILE_CACHE_TTL = int(os.environ.get('TILE_CACHE_TTL', 3600))
+    TILE_HTTP_MAX_AGE = int(os.environ.get('TILE_HTTP_MAX_AGE', 300))
+
+    # Nombre de threads dédiés à la création des miniatures de photos
+    PHOTO_WORKERS = int(os.environ.get('PHOTO_WORKERS', 2))
+
+    # Nombre maximal de GEFs par appel à /api/gefs/details
+    DETAILS_BATCH_MAX = int(os.environ.get('DETAILS_BATCH_MAX', 200))
+    # Nombre maximal de GEFs modifiés par une opération groupée (/gef/bulk, /api/gefs/bulk)
+    BULK_MAX_GEFS = int(os.environ.get('BULK_MAX_GEFS', 5000))
+    # Synchronisation hors ligne : GEFs par lot de /api/sync/changes, âge (s) au-delà duquel l'instantané
+    # complet est reconstruit en tâche de fond (flask gef worker)
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+    SYNC_SNAPSHOT_MAX_AGE = int(os.environ.get('SYNC_SNAPSHOT_MAX_AGE', 3600))
+    # Pool de connexions asynchrones de l'API en lecture (asgi.py), distinct du pool SQLAlchemy
+    ASYNC_API_POOL_MIN = int(os.environ.get('ASYNC_API_POOL_MIN', 1))
+    ASYNC_API_POOL_MAX = int(os.environ.get('ASYNC_API_POOL_MAX', 20))
+    # Durée de vie du cache des fiches GEF (/api/gef/<numero>)
+    DETAILS_CACHE_TTL = int(os.environ.get('DETAILS_CACHE_TTL', 300))
+    # Invalidation des caches entre workers par LISTEN/NOTIFY (canal gef_changes)
+    CACHE_NOTIFY_ENABLED = os.environ.get('CACHE_NOTIFY_ENABLED', '1') == '1'
+
+    # Tâches de fond (flask gef worker) : threads par worker, attente entre deux lectures de la file (s),
+    # délai sans heartbeat avant reprise (s), tentatives maximales, conservation des tâches terminées (jours)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 300))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+    # Instrumentation : seuil (ms) du journal des requêtes SQL lentes, journalisation des paramètres
+    # (désactivée par défaut : noms, NIF/NIM et téléphones se retrouveraient dans les journaux)
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', '0') == '1'
+    # En-tête Server-Timing (temps SQL / total) sur chaque réponse, et exposition de /metrics
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    # Jeton exigé par /metrics (en-tête "Authorization: Bearer <jeton>") ; sans jeton,
+    # /metrics ne répond qu'aux requêtes locales (127.0.0.1, ::1)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # Dossier partagé des métriques des workers (défini par gunicorn.conf.py) ; vide : par processus.
+    # Délai maximal (s) avant qu'un worker ne recopie ses métriques dans ce dossier.
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_DUMP_INTERVAL = float(os.environ.get('METRICS_DUMP_INTERVAL', 5))
@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+# Configuration de production : gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+# Limite par défaut des instructions SQL pour le serveur web (les commandes
+# "flask gef ..." restent sans limite). Lu par config.py au chargement de wsgi.
+os.environ.setdefault('DB_STATEMENT_TIMEOUT_MS', '30000')
+# Métriques additionnées entre workers : /metrics peut être servi par n'importe lequel
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Threads par worker : à garder inférieur ou égal à DB_POOL_SIZE
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recyclage périodique des workers (fuites mémoire), décalé pour éviter un redémarrage simultané
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+# L'application est chargée et préchauffée une seule fois dans le maître (wsgi.py)
+preload_app = True
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    # Compteurs repartant de zéro à chaque démarrage du serveur
+    from app.metrics import clear_metrics_dir
+    clear_metrics_dir(os.environ['METRICS_DIR'])
+
+
+def post_fork(server, worker):
+    # Pool propre au worker, écoute des invalidations de cache (voir app/warmup.py)
+    from app.warmup import init_worker
+    from wsgi import app
+    init_worker(app)
@@ -0,0 +1,25 @@
+"""gef geom gist index
+
+Revision ID: 552a6661d022
+Revises: 6d15687ad295
+Create Date: 2026-10-18 17:42:55.196646
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '552a6661d022'
+down_revision = '6d15687ad295'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Même nom que l'index créé par GeoAlchemy2 (spatial_index=True) : sans effet s'il existe déjà
+    op.execute('CREATE INDEX IF NOT EXISTS idx_gef_geom ON gef USING gist (geom)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS idx_gef_geom')
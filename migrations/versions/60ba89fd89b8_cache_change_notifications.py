@@ -0,0 +1,136 @@
+"""cache change notifications
+
+Revision ID: 60ba89fd89b8
+Revises: d9b0cb8bc3af
+Create Date: 2026-10-18 17:56:33.152645
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '60ba89fd89b8'
+down_revision = 'd9b0cb8bc3af'
+branch_labels = None
+depends_on = None
+
+
+# Canal écouté par chaque worker (voir app/notify.py). Les notifications ne
+# partent qu'au commit et les doublons d'une même transaction sont fusionnés.
+CHANNEL = 'gef_changes'
+
+# Au-delà de ce nombre de GEFs touchés par une instruction (import, seed),
+# une seule notification « gef:* » remplace les notifications individuelles.
+MAX_KEYS = 100
+
+# Tables GEF : (table, colonne portant le numéro du GEF)
+GEF_TABLES = [
+    ('gef', 'numero'),
+    ('personnel', 'n_gef'),
+    ('telephones', 'n_gef'),
+    ('gef_equipement', 'n_gef'),
+    ('gef_agrements', 'gef_n'),
+]
+REFERENCE_TABLES = ['wilaya', 'commune', 'type_equipement', 'agrements']
+
+# Triggers par instruction avec tables de transition : la colonne clé est
+# passée en argument (TG_ARGV[0]) et lue via to_jsonb pour servir toutes les tables.
+GEF_NOTIFY_SQL = f"""
+CREATE OR REPLACE FUNCTION gef_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    keys text[];
+    key text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT to_jsonb(r) ->> TG_ARGV[0]) INTO keys FROM new_rows r;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT to_jsonb(r) ->> TG_ARGV[0]) INTO keys FROM old_rows r;
+    ELSE
+        SELECT array_agg(DISTINCT k) INTO keys FROM (
+            SELECT to_jsonb(r) ->> TG_ARGV[0] AS k FROM new_rows r
+            UNION SELECT to_jsonb(r) ->> TG_ARGV[0] FROM old_rows r
+        ) s;
+    END IF;
+
+    IF keys IS NULL THEN
+        RETURN NULL;
+    ELSIF cardinality(keys) > {MAX_KEYS} THEN
+        PERFORM pg_notify('{CHANNEL}', 'gef:*');
+    ELSE
+        FOREACH key IN ARRAY keys LOOP
+            IF key IS NOT NULL THEN
+                PERFORM pg_notify('{CHANNEL}', 'gef:' || key);
+            END IF;
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+GEF_TRUNCATE_NOTIFY_SQL = f"""
+CREATE OR REPLACE FUNCTION gef_notify_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', 'gef:*');
+    RETURN NULL;
+END
+$$
+"""
+
+REFERENCE_NOTIFY_SQL = f"""
+CREATE OR REPLACE FUNCTION reference_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', 'ref:' || TG_TABLE_NAME);
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade():
+    op.execute(GEF_NOTIFY_SQL)
+    op.execute(GEF_TRUNCATE_NOTIFY_SQL)
+    op.execute(REFERENCE_NOTIFY_SQL)
+
+    for table, column in GEF_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_insert AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_notify_change('{column}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_update AFTER UPDATE ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_notify_change('{column}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_delete AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_notify_change('{column}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_truncate AFTER TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_notify_truncate()"
+        )
+
+    for table in REFERENCE_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_change AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION reference_notify_change()"
+        )
+
+
+def downgrade():
+    for table in REFERENCE_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+    for table, column in GEF_TABLES:
+        for suffix in ('insert', 'update', 'delete', 'truncate'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_{suffix} ON {table}")
+
+    op.execute('DROP FUNCTION IF EXISTS reference_notify_change()')
+    op.execute('DROP FUNCTION IF EXISTS gef_notify_truncate()')
+    op.execute('DROP FUNCTION IF EXISTS gef_notify_change()')
@@ -0,0 +1,30 @@
+"""commune boundaries
+
+Revision ID: 66744bce9a49
+Revises: afb3d74f2d28
+Create Date: 2026-10-18 18:02:07.877348
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+
+# revision identifiers, used by Alembic.
+revision = '66744bce9a49'
+down_revision = 'afb3d74f2d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('commune', sa.Column(
+        'geom', Geometry(geometry_type='MULTIPOLYGON', srid=4326, spatial_index=False), nullable=True
+    ))
+    # Index GiST : jointure spatiale point-dans-polygone GEF / commune
+    op.execute('CREATE INDEX IF NOT EXISTS idx_commune_geom ON commune USING gist (geom)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS idx_commune_geom')
+    op.drop_column('commune', 'geom')
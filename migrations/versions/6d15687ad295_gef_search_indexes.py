@@ -0,0 +1,30 @@
+"""gef search indexes
+
+Revision ID: 6d15687ad295
+Revises: 78040be5241d
+Create Date: 2026-10-18 17:37:50.941429
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d15687ad295'
+down_revision = '78040be5241d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_gef_n_p_trgm', 'gef', ['n_p'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'n_p': 'gin_trgm_ops'})
+    op.create_index('ix_gef_n_p_numero', 'gef', ['n_p', 'numero'], unique=False)
+    op.create_index('ix_gef_numero_text', 'gef', [sa.text('(numero::text) text_pattern_ops')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_gef_numero_text', table_name='gef')
+    op.drop_index('ix_gef_n_p_numero', table_name='gef')
+    op.drop_index('ix_gef_n_p_trgm', table_name='gef')
@@ -0,0 +1,26 @@
+"""add gef updated_at
+
+Revision ID: 78040be5241d
+Revises: 
+Create Date: 2026-10-18 17:36:41.009515
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '78040be5241d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('gef', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('gef', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
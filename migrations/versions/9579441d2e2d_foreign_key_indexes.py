@@ -0,0 +1,62 @@
+"""foreign key indexes and agrement uniqueness
+
+Revision ID: 9579441d2e2d
+Revises: ee7b76af55e5
+Create Date: 2026-10-18 18:17:08.340810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9579441d2e2d'
+down_revision = 'ee7b76af55e5'
+branch_labels = None
+depends_on = None
+
+
+# Un agrément n'est attribué qu'une fois à un GEF : les doublons existants sont
+# fusionnés sur la première ligne (qui reprend la date d'obtention si elle n'en a pas)
+MERGE_DUPLICATE_AGREMENTS_SQL = """
+UPDATE gef_agrements kept
+SET date_obtention = dup.date_obtention
+FROM (
+    SELECT gef_n, agrement_id, min(id) AS id, min(date_obtention) AS date_obtention
+    FROM gef_agrements GROUP BY gef_n, agrement_id HAVING count(*) > 1
+) dup
+WHERE kept.id = dup.id AND kept.date_obtention IS NULL
+"""
+
+DELETE_DUPLICATE_AGREMENTS_SQL = """
+DELETE FROM gef_agrements a
+USING gef_agrements b
+WHERE a.gef_n = b.gef_n AND a.agrement_id = b.agrement_id AND a.id > b.id
+"""
+
+
+def upgrade():
+    # Clés étrangères sans index : lectures des enfants d'un GEF (edit_gef, fiche
+    # détaillée), semi-jointures des filtres, suppressions (et contrôles des clés
+    # étrangères à la suppression d'un GEF) sans parcours complet des tables.
+    # gef.commune_c est déjà indexée (ix_gef_commune_c) ; gef_equipement a pour
+    # clé primaire (n_gef, id_type).
+    op.create_index(op.f('ix_personnel_n_gef'), 'personnel', ['n_gef'], unique=False)
+    op.create_index(op.f('ix_telephones_n_gef'), 'telephones', ['n_gef'], unique=False)
+    op.create_index(op.f('ix_gef_equipement_id_type'), 'gef_equipement', ['id_type'], unique=False)
+    op.create_index(op.f('ix_gef_agrements_agrement_id'), 'gef_agrements', ['agrement_id'], unique=False)
+    op.create_index(op.f('ix_commune_code_wilaya'), 'commune', ['code_wilaya'], unique=False)
+
+    # (gef_n, agrement_id) unique : sert aussi d'index pour les lectures par gef_n
+    op.execute(MERGE_DUPLICATE_AGREMENTS_SQL)
+    op.execute(DELETE_DUPLICATE_AGREMENTS_SQL)
+    op.create_unique_constraint('uq_gef_agrements_gef_n_agrement_id', 'gef_agrements', ['gef_n', 'agrement_id'])
+
+
+def downgrade():
+    op.drop_constraint('uq_gef_agrements_gef_n_agrement_id', 'gef_agrements', type_='unique')
+    op.drop_index(op.f('ix_commune_code_wilaya'), table_name='commune')
+    op.drop_index(op.f('ix_gef_agrements_agrement_id'), table_name='gef_agrements')
+    op.drop_index(op.f('ix_gef_equipement_id_type'), table_name='gef_equipement')
+    op.drop_index(op.f('ix_telephones_n_gef'), table_name='telephones')
+    op.drop_index(op.f('ix_personnel_n_gef'), table_name='personnel')
@@ -0,0 +1,127 @@
+"""gef sync change log
+
+Revision ID: afb3d74f2d28
+Revises: 60ba89fd89b8
+Create Date: 2026-10-18 18:00:19.731698
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'afb3d74f2d28'
+down_revision = '60ba89fd89b8'
+branch_labels = None
+depends_on = None
+
+
+# Journal de synchronisation (voir app/sync.py) : une ligne par GEF, renumérotée
+# (seq, txid) à chaque modification du GEF ou de ses tables enfants. deleted
+# est recalculé d'après l'existence du GEF : sa suppression laisse un tombstone.
+GEF_SYNC_TRACK_SQL = """
+CREATE OR REPLACE FUNCTION gef_sync_track() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    keys integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT (to_jsonb(r) ->> TG_ARGV[0])::integer) INTO keys FROM new_rows r;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT (to_jsonb(r) ->> TG_ARGV[0])::integer) INTO keys FROM old_rows r;
+    ELSE
+        SELECT array_agg(DISTINCT k) INTO keys FROM (
+            SELECT (to_jsonb(r) ->> TG_ARGV[0])::integer AS k FROM new_rows r
+            UNION SELECT (to_jsonb(r) ->> TG_ARGV[0])::integer FROM old_rows r
+        ) s;
+    END IF;
+
+    INSERT INTO gef_sync AS s (numero, seq, txid, deleted, changed_at)
+    SELECT k.numero, nextval('gef_sync_seq'), pg_current_xact_id()::text::bigint,
+           NOT EXISTS (SELECT 1 FROM gef g WHERE g.numero = k.numero), now()
+    FROM unnest(keys) AS k(numero)
+    WHERE k.numero IS NOT NULL
+    ON CONFLICT (numero) DO UPDATE SET
+        seq = EXCLUDED.seq, txid = EXCLUDED.txid, deleted = EXCLUDED.deleted, changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END
+$$
+"""
+
+# TRUNCATE de gef : tous les GEFs connus deviennent des tombstones
+GEF_SYNC_TRUNCATE_SQL = """
+CREATE OR REPLACE FUNCTION gef_sync_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE gef_sync SET seq = nextval('gef_sync_seq'), txid = pg_current_xact_id()::text::bigint,
+                        deleted = true, changed_at = now()
+    WHERE NOT deleted;
+    RETURN NULL;
+END
+$$
+"""
+
+# Tables suivies : (table, colonne portant le numéro du GEF)
+SYNC_TABLES = [
+    ('gef', 'numero'),
+    ('personnel', 'n_gef'),
+    ('telephones', 'n_gef'),
+    ('gef_equipement', 'n_gef'),
+    ('gef_agrements', 'gef_n'),
+]
+
+
+def upgrade():
+    op.execute('CREATE SEQUENCE gef_sync_seq')
+    op.create_table('gef_sync',
+        sa.Column('numero', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('txid', sa.BigInteger(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('numero')
+    )
+    op.create_index('ix_gef_sync_cursor', 'gef_sync', ['txid', 'seq'], unique=False)
+
+    op.execute(GEF_SYNC_TRACK_SQL)
+    op.execute(GEF_SYNC_TRUNCATE_SQL)
+    for table, column in SYNC_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_sync_insert AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_sync_track('{column}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_sync_update AFTER UPDATE ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_sync_track('{column}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_sync_delete AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION gef_sync_track('{column}')"
+        )
+    op.execute(
+        "CREATE TRIGGER gef_sync_truncate AFTER TRUNCATE ON gef "
+        "FOR EACH STATEMENT EXECUTE FUNCTION gef_sync_truncate()"
+    )
+
+    # GEFs existants : une première version chacun
+    op.execute("""
+        INSERT INTO gef_sync (numero, seq, txid, deleted)
+        SELECT numero, nextval('gef_sync_seq'), pg_current_xact_id()::text::bigint, false
+        FROM gef WHERE numero IS NOT NULL ORDER BY numero
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS gef_sync_truncate ON gef')
+    for table, column in SYNC_TABLES:
+        for suffix in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_sync_{suffix} ON {table}")
+    op.execute('DROP FUNCTION IF EXISTS gef_sync_truncate()')
+    op.execute('DROP FUNCTION IF EXISTS gef_sync_track()')
+
+    op.drop_index('ix_gef_sync_cursor', table_name='gef_sync')
+    op.drop_table('gef_sync')
+    op.execute('DROP SEQUENCE IF EXISTS gef_sync_seq')
@@ -0,0 +1,50 @@
+"""background jobs
+
+Revision ID: c782b498b24e
+Revises: 66744bce9a49
+Create Date: 2026-10-18 18:09:36.287503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c782b498b24e'
+down_revision = '66744bce9a49'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # File des tâches de fond (voir app/jobs.py)
+    op.create_table('job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+        sa.Column('progress_done', sa.BigInteger(), nullable=False),
+        sa.Column('progress_total', sa.BigInteger(), nullable=True),
+        sa.Column('checkpoint', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('artifact', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_queued', 'job', ['id'], unique=False, postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_job_status', 'job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_status', table_name='job')
+    op.drop_index('ix_job_queued', table_name='job', postgresql_where=sa.text("status = 'queued'"))
+    op.drop_table('job')
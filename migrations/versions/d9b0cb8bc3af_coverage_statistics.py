@@ -0,0 +1,85 @@
+"""coverage statistics
+
+Revision ID: d9b0cb8bc3af
+Revises: e80ab9322f55
+Create Date: 2026-10-18 17:48:57.555186
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b0cb8bc3af'
+down_revision = 'e80ab9322f55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('coverage_commune',
+        sa.Column('code_commune', sa.Integer(), nullable=False),
+        sa.Column('code_wilaya', sa.Integer(), nullable=True),
+        sa.Column('gef_count', sa.Integer(), nullable=False),
+        sa.Column('gef_actif_count', sa.Integer(), nullable=False),
+        sa.Column('personnel_count', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['code_commune'], ['commune.code_commu'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('code_commune')
+    )
+    op.create_index(op.f('ix_coverage_commune_code_wilaya'), 'coverage_commune', ['code_wilaya'], unique=False)
+    op.create_table('coverage_agrement',
+        sa.Column('code_commune', sa.Integer(), nullable=False),
+        sa.Column('agrement_id', sa.Integer(), nullable=False),
+        sa.Column('code_wilaya', sa.Integer(), nullable=True),
+        sa.Column('gef_count', sa.Integer(), nullable=False),
+        sa.Column('gef_actif_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['agrement_id'], ['agrements.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['code_commune'], ['commune.code_commu'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('code_commune', 'agrement_id')
+    )
+    op.create_index(op.f('ix_coverage_agrement_code_wilaya'), 'coverage_agrement', ['code_wilaya'], unique=False)
+    op.create_table('coverage_equipement',
+        sa.Column('code_commune', sa.Integer(), nullable=False),
+        sa.Column('id_type', sa.Integer(), nullable=False),
+        sa.Column('code_wilaya', sa.Integer(), nullable=True),
+        sa.Column('gef_count', sa.Integer(), nullable=False),
+        sa.Column('quantite', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['code_commune'], ['commune.code_commu'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['id_type'], ['type_equipement.id_type'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('code_commune', 'id_type')
+    )
+    op.create_index(op.f('ix_coverage_equipement_code_wilaya'), 'coverage_equipement', ['code_wilaya'], unique=False)
+
+    # Remplissage initial (ensuite tenu à jour par app/coverage.py ; "flask gef coverage" pour tout recalculer)
+    op.execute("""
+        INSERT INTO coverage_commune (code_commune, code_wilaya, gef_count, gef_actif_count, personnel_count)
+        SELECT c.code_commu, c.code_wilaya, count(g.numero),
+               count(g.numero) FILTER (WHERE g.situation = 'actif'),
+               coalesce(sum((SELECT count(*) FROM personnel p WHERE p.n_gef = g.numero)), 0)
+        FROM commune c LEFT JOIN gef g ON g.commune_c = c.code_commu
+        GROUP BY c.code_commu, c.code_wilaya
+    """)
+    op.execute("""
+        INSERT INTO coverage_agrement (code_commune, agrement_id, code_wilaya, gef_count, gef_actif_count)
+        SELECT c.code_commu, ga.agrement_id, c.code_wilaya, count(DISTINCT g.numero),
+               count(DISTINCT g.numero) FILTER (WHERE g.situation = 'actif')
+        FROM gef g JOIN commune c ON c.code_commu = g.commune_c JOIN gef_agrements ga ON ga.gef_n = g.numero
+        WHERE ga.agrement_id IS NOT NULL
+        GROUP BY c.code_commu, ga.agrement_id, c.code_wilaya
+    """)
+    op.execute("""
+        INSERT INTO coverage_equipement (code_commune, id_type, code_wilaya, gef_count, quantite)
+        SELECT c.code_commu, ge.id_type, c.code_wilaya, count(*), coalesce(sum(ge.quantite), 0)
+        FROM gef g JOIN commune c ON c.code_commu = g.commune_c JOIN gef_equipement ge ON ge.n_gef = g.numero
+        GROUP BY c.code_commu, ge.id_type, c.code_wilaya
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_coverage_equipement_code_wilaya'), table_name='coverage_equipement')
+    op.drop_table('coverage_equipement')
+    op.drop_index(op.f('ix_coverage_agrement_code_wilaya'), table_name='coverage_agrement')
+    op.drop_table('coverage_agrement')
+    op.drop_index(op.f('ix_coverage_commune_code_wilaya'), table_name='coverage_commune')
+    op.drop_table('coverage_commune')
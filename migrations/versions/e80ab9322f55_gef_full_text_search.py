@@ -0,0 +1,123 @@
+"""gef full text search
+
+Revision ID: e80ab9322f55
+Revises: 552a6661d022
+Create Date: 2026-10-18 17:47:18.271408
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e80ab9322f55'
+down_revision = '552a6661d022'
+branch_labels = None
+depends_on = None
+
+
+# Forme « repliée » (minuscules, sans accents) utilisée par les index et les requêtes.
+# unaccent() n'est pas IMMUTABLE : l'enveloppe fixe le dictionnaire pour pouvoir l'indexer.
+GEF_FOLD_SQL = """
+CREATE OR REPLACE FUNCTION gef_fold(text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$
+"""
+
+# Document de recherche d'un GEF : nom (poids A), personnel (B), adresse (C), observations (D)
+GEF_SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION gef_search_refresh() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    personnel_names text;
+BEGIN
+    SELECT string_agg(concat_ws(' ', p.nom, p.prenom), ' ') INTO personnel_names
+    FROM personnel p WHERE p.n_gef = NEW.numero;
+
+    NEW.search_text := gef_fold(concat_ws(' ', NEW.n_p, personnel_names));
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(gef_fold(NEW.n_p), '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(gef_fold(personnel_names), '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(gef_fold(NEW.adresse), '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(gef_fold(NEW.observations), '')), 'D');
+    RETURN NEW;
+END
+$$
+"""
+
+# Toute modification du personnel recalcule le document des GEFs concernés
+# (UPDATE de n_p sur lui-même : déclenche gef_search_refresh). Triggers par
+# instruction avec tables de transition : un seul UPDATE de gef par lot importé.
+PERSONNEL_SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION personnel_search_refresh() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE gef SET n_p = n_p WHERE numero IN (SELECT n_gef FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE gef SET n_p = n_p WHERE numero IN (SELECT n_gef FROM old_rows);
+    ELSE
+        UPDATE gef SET n_p = n_p
+        WHERE numero IN (SELECT n_gef FROM new_rows UNION SELECT n_gef FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(GEF_FOLD_SQL)
+
+    op.add_column('gef', sa.Column('search_text', sa.Text(), nullable=True))
+    op.add_column('gef', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    op.execute(GEF_SEARCH_TRIGGER_SQL)
+    op.execute(
+        'CREATE TRIGGER gef_search_refresh BEFORE INSERT OR UPDATE OF numero, n_p, adresse, observations '
+        'ON gef FOR EACH ROW EXECUTE FUNCTION gef_search_refresh()'
+    )
+    op.execute(PERSONNEL_SEARCH_TRIGGER_SQL)
+    op.execute(
+        'CREATE TRIGGER personnel_search_insert AFTER INSERT ON personnel '
+        'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION personnel_search_refresh()'
+    )
+    op.execute(
+        'CREATE TRIGGER personnel_search_update AFTER UPDATE ON personnel '
+        'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION personnel_search_refresh()'
+    )
+    op.execute(
+        'CREATE TRIGGER personnel_search_delete AFTER DELETE ON personnel '
+        'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION personnel_search_refresh()'
+    )
+
+    # Remplissage initial des documents existants
+    op.execute('UPDATE gef SET n_p = n_p')
+
+    op.create_index('ix_gef_search_vector', 'gef', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_gef_search_text_trgm', 'gef', ['search_text'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+    op.create_index('ix_personnel_nom_trgm', 'personnel', [sa.text('gef_fold(nom) gin_trgm_ops')],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_personnel_prenom_trgm', 'personnel', [sa.text('gef_fold(prenom) gin_trgm_ops')],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_personnel_prenom_trgm', table_name='personnel')
+    op.drop_index('ix_personnel_nom_trgm', table_name='personnel')
+    op.drop_index('ix_gef_search_text_trgm', table_name='gef')
+    op.drop_index('ix_gef_search_vector', table_name='gef')
+    op.execute('DROP TRIGGER IF EXISTS personnel_search_delete ON personnel')
+    op.execute('DROP TRIGGER IF EXISTS personnel_search_update ON personnel')
+    op.execute('DROP TRIGGER IF EXISTS personnel_search_insert ON personnel')
+    op.execute('DROP FUNCTION IF EXISTS personnel_search_refresh()')
+    op.execute('DROP TRIGGER IF EXISTS gef_search_refresh ON gef')
+    op.execute('DROP FUNCTION IF EXISTS gef_search_refresh()')
+    op.drop_column('gef', 'search_vector')
+    op.drop_column('gef', 'search_text')
+    op.execute('DROP FUNCTION IF EXISTS gef_fold(text)')
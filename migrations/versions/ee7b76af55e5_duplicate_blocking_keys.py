@@ -0,0 +1,55 @@
+"""duplicate blocking keys
+
+Revision ID: ee7b76af55e5
+Revises: c782b498b24e
+Create Date: 2026-10-18 18:12:54.900542
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ee7b76af55e5'
+down_revision = 'c782b498b24e'
+branch_labels = None
+depends_on = None
+
+
+# Clés de blocage de la détection des doublons (voir app/duplicates.py).
+# Nom : forme repliée (gef_fold) dont la ponctuation est ramenée à des espaces,
+# comparée par trigrammes ("Ben-Ali  Karim" ~ "benali karim").
+GEF_NAME_KEY_SQL = """
+CREATE OR REPLACE FUNCTION gef_name_key(text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+AS $$ SELECT btrim(regexp_replace(gef_fold($1), '[^a-z0-9]+', ' ', 'g')) $$
+"""
+
+# Téléphone : chiffres seuls, 9 derniers (0550 11 22 33 = +213 550 11 22 33) ;
+# NULL en dessous de 6 chiffres (numéro incomplet, non significatif)
+GEF_PHONE_KEY_SQL = """
+CREATE OR REPLACE FUNCTION gef_phone_key(text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+AS $$ SELECT CASE WHEN length(d) >= 6 THEN right(d, 9) END FROM regexp_replace($1, '\\D', '', 'g') AS d $$
+"""
+
+
+def upgrade():
+    op.execute(GEF_NAME_KEY_SQL)
+    op.execute(GEF_PHONE_KEY_SQL)
+    op.create_index('ix_gef_name_key_trgm', 'gef', [sa.text('gef_name_key(n_p) gin_trgm_ops')],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_gef_nif', 'gef', ['nif'], unique=False, postgresql_where=sa.text('nif IS NOT NULL'))
+    op.create_index('ix_gef_nim', 'gef', ['nim'], unique=False, postgresql_where=sa.text('nim IS NOT NULL'))
+    op.create_index('ix_gef_commune_c', 'gef', ['commune_c'], unique=False)
+    op.create_index('ix_telephones_phone_key', 'telephones', [sa.text('gef_phone_key(num)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_telephones_phone_key', table_name='telephones')
+    op.drop_index('ix_gef_commune_c', table_name='gef')
+    op.drop_index('ix_gef_nim', table_name='gef')
+    op.drop_index('ix_gef_nif', table_name='gef')
+    op.drop_index('ix_gef_name_key_trgm', table_name='gef')
+    op.execute('DROP FUNCTION IF EXISTS gef_phone_key(text)')
+    op.execute('DROP FUNCTION IF EXISTS gef_name_key(text)')
@@ -0,0 +1,8 @@
+# wsgi.py
+# Point d'entrée WSGI de production : gunicorn -c gunicorn.conf.py wsgi:app
+# (le serveur de développement reste "flask run" / start.bat)
+from app import create_app
+from app.warmup import warm_up
+
+app = create_app()
+warm_up(app)